@@ -1,137 +1,37 @@
+import io
 import os
-import json
-import uuid
-import threading
-from datetime import datetime
-from decimal import Decimal
-
-# Load .env if present (optional convenience)
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except Exception:
-    pass
-
-# --- Config from env ---
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tribal_marketplace.db")
-STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
-STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
-STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
-APP_URL = os.getenv("APP_URL", "http://localhost:8501")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+import time
+import tempfile
+from contextlib import ExitStack
 
 # --- Imports for web / db / stripe / streamlit ---
 import streamlit as st
-from flask import Flask, request, jsonify
-import stripe
-
-from sqlalchemy import (create_engine, Column, Integer, String, DateTime,
-                        ForeignKey, Text, JSON, Boolean)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-import bcrypt
-
-# Initialize Stripe
-if STRIPE_SECRET_KEY:
-    stripe.api_key = STRIPE_SECRET_KEY
-
-# --- Database setup (SQLAlchemy) ---
-Base = declarative_base()
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
-SessionLocal = sessionmaker(bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-# Models
-class User(Base):
-    __tablename__ = "users"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String)
-    email = Column(String, unique=True, index=True)
-    password_hash = Column(String)
-    is_admin = Column(Boolean, default=False)
-    vendor = relationship("Vendor", uselist=False, back_populates="owner")
-    addresses = relationship("Address", back_populates="user")
-
-class Vendor(Base):
-    __tablename__ = "vendors"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    owner_id = Column(String, ForeignKey("users.id"))
-    name = Column(String)
-    description = Column(Text)
-    status = Column(String, default="PENDING")  # PENDING / APPROVED / REJECTED
-    payout_info = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    owner = relationship("User", back_populates="vendor")
-    products = relationship("Product", back_populates="vendor")
-
-class Product(Base):
-    __tablename__ = "products"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    vendor_id = Column(String, ForeignKey("vendors.id"))
-    title = Column(JSON)    # {'en': 'Bamboo Basket', 'te': '...', 'hi': '...'}
-    description = Column(JSON)
-    price_cents = Column(Integer, default=0)
-    currency = Column(String, default="USD")
-    stock = Column(Integer, default=0)
-    images = Column(JSON, default=[])  # list of paths/URLs
-    created_at = Column(DateTime, default=datetime.utcnow)
-    vendor = relationship("Vendor", back_populates="products")
-
-class Address(Base):
-    __tablename__ = "addresses"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    line1 = Column(String)
-    city = Column(String)
-    state = Column(String)
-    postal_code = Column(String)
-    country = Column(String)
-    is_default = Column(Boolean, default=False)
-    user = relationship("User", back_populates="addresses")
-
-class CartItem(Base):
-    __tablename__ = "cart_items"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    product_id = Column(String, ForeignKey("products.id"))
-    qty = Column(Integer, default=1)
-
-class WishlistItem(Base):
-    __tablename__ = "wishlist_items"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    product_id = Column(String, ForeignKey("products.id"))
-
-class Order(Base):
-    __tablename__ = "orders"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"))
-    vendor_id = Column(String, ForeignKey("vendors.id"), nullable=True)
-    items = Column(JSON)
-    total_cents = Column(Integer)
-    currency = Column(String)
-    status = Column(String, default="PENDING")  # PENDING / PAID / FULFILLING / SHIPPED / DELIVERED / CANCELLED
-    payment_metadata = Column(JSON, nullable=True)
-    fulfillment = Column(JSON, nullable=True)
-    address = Column(JSON)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-class Payout(Base):
-    __tablename__ = "payouts"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    vendor_id = Column(String, ForeignKey("vendors.id"))
-    amount_cents = Column(Integer)
-    currency = Column(String)
-    status = Column(String, default="PENDING")
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-Base.metadata.create_all(bind=engine)
+
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.orm import load_only
+
+from config import OPENAI_API_KEY
+from db import session_scope, pool_metrics
+from instrumentation import span, start_metrics_server_once
+from rates import rate_provider, price_lines, RatesUnavailable, UnknownCurrency
+from search import search_products
+from product_views import SUPPORTED_LOCALES, get_views, save_product, delete_product
+from assistant import ask, AssistantTimeout
+from checkout import create_checkout
+from stripe_gateway import start_checkout_session, checkout_session_status, STRIPE_POLL_INTERVAL
+from cart import add_to_cart, add_to_wishlist, move_wishlist_to_cart
+from catalog_io import import_products, export_products, export_orders, detect_format
+from images import save_image, thumbnail_html, InvalidImage
+from payouts import run_settlement
+from vendor_stats import vendor_summary, mark_order_shipped, VENDOR_STATS_DAYS
+from auth import hash_password, authenticate, AuthBusy, LoginThrottled
+from models import User, Vendor, Product, Address, Order, Payout, SettlementRun, WebhookEvent, Checkout
+from queries import (load_cart_lines, load_wishlist_lines, line_views, query_catalog, query_vendor_orders,
+                     query_vendor_products, vendor_applications, approved_vendor_names, search_orders,
+                     find_user_id, status_counts)
+from vendor_review import review_vendors
+from page_cache import page_cache, cached, invalidate_on_commit, user_scope, vendor_scope, CATALOG, ADMIN
+from webhook import start_webhook_thread_once, requeue_dead_webhook_events
 
 # ------------------------------
 # Simple localization dictionary
@@ -211,123 +111,161 @@ LOCALES = {
 # ------------------------------
 # Utility helpers
 # ------------------------------
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-def verify_password(password: str, hashed: str) -> bool:
-    try:
-        return bcrypt.checkpw(password.encode(), hashed.encode())
-    except Exception:
-        return False
-
 def to_float(cents: int) -> float:
     return cents / 100.0
 
-# Exchange rates placeholder (USD base). Replace with live API in production
-EXCHANGE_RATES = {"USD": 1.0, "INR": 82.0, "EUR": 0.92}
 
 # ------------------------------
-# Stripe helpers
+# Page data, cached across reruns (see page_cache.py)
 # ------------------------------
-def create_stripe_checkout_session(items, order_id, currency="USD"):
+# Loaders return plain dicts/tuples so entries outlive the session that
+# read them. Writes below call invalidate_on_commit() for what they touch.
+def load_profile(db, user_id):
+    user = db.get(User, user_id)
+    if user is None:
+        return None
+    vendor = user.vendor
+    return {"id": user.id, "email": user.email, "name": user.name, "is_admin": user.is_admin,
+            "vendor_id": vendor.id if vendor else None, "vendor_status": vendor.status if vendor else None}
+
+def load_cart(db, user_id, locale):
+    lines = [it for it in load_cart_lines(db, user_id) if it.product]
+    views = line_views(db, lines, locale)
+    return [{"product_id": it.product.id, "vendor_id": it.product.vendor_id, "qty": it.qty,
+             "price_cents": it.product.price_cents, "currency": it.product.currency,
+             "title": views[it.product.id]["title"], "price_label": views[it.product.id]["price_label"]}
+            for it in lines]
+
+def load_wishlist(db, user_id, locale):
+    lines = [w for w in load_wishlist_lines(db, user_id) if w.product]
+    views = line_views(db, lines, locale)
+    return [{"product_id": w.product.id, "title": views[w.product.id]["title"]} for w in lines]
+
+def load_addresses(db, user_id):
+    return [(a.id, f"{a.line1}, {a.city}, {a.state}, {a.postal_code}, {a.country}")
+            for a in db.query(Address).filter(Address.user_id == user_id).all()]
+
+def product_cards(db, products, locale):
+    views = get_views(db, [(p.id, p.version) for p in products], locale)
+    return [dict(views[p.id], id=p.id, stock=p.stock, images=list(p.images or [])) for p in products]
+
+def load_catalog_page(db, locale, direction, cursor, filters):
+    products, next_cursor, prev_cursor = query_catalog(
+        db, after=cursor if direction == "after" else None,
+        before=cursor if direction == "before" else None, **dict(filters))
+    return product_cards(db, products, locale), next_cursor, prev_cursor
+
+def load_search_page(db, locale, q, page):
+    ids, has_more = search_products(db, q, page=page)
+    by_id = {p.id: p for p in db.query(Product).options(load_only(Product.id, Product.version, Product.stock, Product.images))
+             .filter(Product.id.in_(ids))}
+    return product_cards(db, [by_id[i] for i in ids if i in by_id], locale), has_more
+
+def load_vendor_names(db):
+    return {v.id: v.name for v in approved_vendor_names(db)}
+
+def load_vendor_dashboard(db, vendor_id, locale):
+    stats = vendor_summary(db, vendor_id)
+    sold_ids = [pid for pid, _ in stats["units_by_product"]]
+    sold_views = get_views(db, db.query(Product.id, Product.version).filter(Product.id.in_(sold_ids)).all(), locale) if sold_ids else {}
+    stats["units_by_title"] = [(sold_views[pid]["title"] if pid in sold_views else "(deleted product)", units)
+                               for pid, units in stats["units_by_product"]]
+    return stats
+
+def load_vendor_products(db, vendor_id, locale, direction, cursor):
+    products, next_cursor, prev_cursor = query_vendor_products(
+        db, vendor_id, after=cursor if direction == "after" else None,
+        before=cursor if direction == "before" else None)
+    return product_cards(db, products, locale), next_cursor, prev_cursor
+
+def load_vendor_orders(db, vendor_id, direction, cursor):
+    orders, next_cursor, prev_cursor = query_vendor_orders(
+        db, vendor_id, after=cursor if direction == "after" else None,
+        before=cursor if direction == "before" else None)
+    return [{"id": o.id, "status": o.status, "total_cents": o.total_cents, "currency": o.currency,
+             "fulfillment": o.fulfillment} for o in orders], next_cursor, prev_cursor
+
+def load_admin(db):
+    last_run = db.query(SettlementRun).order_by(SettlementRun.created_at.desc()).first()
+    return {
+        "vendors": status_counts(db, Vendor),
+        "orders": status_counts(db, Order),
+        "webhook_inbox": status_counts(db, WebhookEvent),
+        "payouts": status_counts(db, Payout),
+        "last_run": (last_run.created_at, last_run.status, last_run.payouts_settled) if last_run else None,
+    }
+
+def load_vendor_applications(db, direction, cursor):
+    vendors, next_cursor, prev_cursor = vendor_applications(
+        db, after=cursor if direction == "after" else None, before=cursor if direction == "before" else None)
+    return [{"id": v.id, "name": v.name, "description": v.description, "owner_id": v.owner_id,
+             "owner_email": v.owner.email if v.owner else "-", "created_at": v.created_at}
+            for v in vendors], next_cursor, prev_cursor
+
+def load_admin_orders(db, filters, direction, cursor):
+    """filters: (name, value) pairs for search_orders; "customer" is an email or user id."""
+    params = dict(filters)
+    customer = params.pop("customer", None)
+    if customer:
+        params["user_id"] = find_user_id(db, customer)
+        if params["user_id"] is None:
+            return [], None, None
+    orders, next_cursor, prev_cursor = search_orders(
+        db, **params, after=cursor if direction == "after" else None, before=cursor if direction == "before" else None)
+    emails = dict(db.query(User.id, User.email).filter(User.id.in_({o.user_id for o in orders})).all()) if orders else {}
+    return [{"id": o.id, "placed": o.created_at, "customer": emails.get(o.user_id, o.user_id), "vendor_id": o.vendor_id,
+             "status": o.status, "total_cents": o.total_cents, "currency": o.currency}
+            for o in orders], next_cursor, prev_cursor
+
+def catalog_io_panel(vendor_id=None, key="catalog_io"):
     """
-    items: list of dicts with keys: name, unit_amount (in cents), quantity
+    Bulk import into vendor_id's catalog (when given) and CSV/JSONL exports,
+    scoped to it or to everything. Both run in a session of their own: they
+    commit and expunge per chunk, which must not touch the page's objects.
     """
-    if not STRIPE_SECRET_KEY:
-        raise RuntimeError("Missing STRIPE_SECRET_KEY env var.")
-    line_items = []
-    for it in items:
-        line_items.append({
-            "price_data": {
-                "currency": currency.lower(),
-                "product_data": {"name": it["name"]},
-                "unit_amount": int(it["unit_amount"])
-            },
-            "quantity": int(it.get("quantity", 1))
-        })
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=line_items,
-        mode="payment",
-        metadata={"order_id": order_id},
-        success_url=f"{APP_URL}?checkout=success",
-        cancel_url=f"{APP_URL}?checkout=cancel"
-    )
-    return session
-
-# ------------------------------
-# Embedded Flask webhook server
-# ------------------------------
-app = Flask("webhook_server")
-
-@app.route("/webhook", methods=["POST"])
-def stripe_webhook():
-    payload = request.data
-    sig_header = request.headers.get("Stripe-Signature")
-    if not STRIPE_WEBHOOK_SECRET:
-        return jsonify({"error":"STRIPE_WEBHOOK_SECRET not configured"}), 400
-    try:
-        event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
-    except ValueError:
-        return jsonify({"error":"Invalid payload"}), 400
-    except stripe.error.SignatureVerificationError:
-        return jsonify({"error":"Invalid signature"}), 400
-
-    db = next(get_db())
-    try:
-        etype = event["type"]
-        data = event["data"]["object"]
-        if etype == "checkout.session.completed":
-            metadata = data.get("metadata") or {}
-            order_id = metadata.get("order_id")
-            if order_id:
-                order = db.query(Order).filter_by(id=order_id).first()
-                if order and order.status != "PAID":
-                    order.status = "PAID"
-                    order.payment_metadata = dict(data)
-                    order.fulfillment = {"status":"QUEUED", "notes":"Ready for vendor fulfillment"}
-                    db.add(order)
-                    db.commit()
-                    # decrement inventory
-                    for it in order.items:
-                        pid = it.get("product_id")
-                        qty = int(it.get("qty",1))
-                        if pid:
-                            prod = db.query(Product).filter_by(id=pid).first()
-                            if prod:
-                                prod.stock = max(0, prod.stock - qty)
-                                db.add(prod)
-                    db.commit()
-                    # create payout entry for vendor (example: 90% to vendor)
-                    payout_amount = int(order.total_cents * 0.9)
-                    payout = Payout(vendor_id=order.vendor_id, amount_cents=payout_amount, currency=order.currency, status="PENDING")
-                    db.add(payout)
-                    db.commit()
-        elif etype == "payment_intent.payment_failed":
-            # handle failed payment if needed
-            pass
-    finally:
-        db.close()
-
-    return jsonify({"received": True}), 200
-
-def run_webhook_server():
-    # Start Flask in threaded mode on port 5000
-    app.run(port=5000, debug=False, use_reloader=False)
+    if vendor_id:
+        upload = st.file_uploader("Import products (CSV or JSONL, upserted by SKU)", type=["csv", "jsonl", "ndjson"],
+                                  key=f"{key}_upload")
+        if upload is not None and st.button("Import", key=f"{key}_import"):
+            try:
+                with session_scope() as import_db:
+                    report = import_products(import_db, vendor_id,
+                                             io.TextIOWrapper(upload, encoding="utf-8-sig", newline=""),
+                                             detect_format(upload.name))
+            except RatesUnavailable:
+                st.error("Exchange rates are unavailable right now, so currencies can't be checked. "
+                         "Please try the import again in a minute.")
+            else:
+                st.success(f"Imported {report['imported']} of {report['rows']} rows: "
+                           f"{report['created']} new, {report['updated']} updated products")
+                if report["errors_total"]:
+                    st.warning(f"{report['errors_total']} rows skipped")
+                    st.dataframe(report["errors"])
+    fmt = st.radio("Export format", ["csv", "jsonl"], horizontal=True, key=f"{key}_format")
+    c1, c2 = st.columns(2)
+    for col, what, export in ((c1, "products", export_products), (c2, "orders", export_orders)):
+        if col.button(f"Export {what}", key=f"{key}_export_{what}"):
+            # spooled to disk past 8 MB; download_button then holds the file's bytes once
+            with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+                out = io.TextIOWrapper(spool, encoding="utf-8", newline="")
+                with session_scope() as export_db:
+                    n = export(export_db, out, fmt, vendor_id=vendor_id)
+                out.flush()
+                out.detach()
+                spool.seek(0)
+                col.download_button(f"Download {n} {what}", spool.read(), file_name=f"{what}.{fmt}",
+                                    mime="text/csv" if fmt == "csv" else "application/x-ndjson",
+                                    key=f"{key}_dl_{what}")
 
 # ------------------------------
 # Streamlit UI
 # ------------------------------
-# Start webhook thread when module is run
-def start_webhook_thread_once():
-    if os.getenv("DISABLE_WEBHOOK_THREAD") == "1":
-        return
-    if not getattr(start_webhook_thread_once, "started", False):
-        thread = threading.Thread(target=run_webhook_server, daemon=True)
-        thread.start()
-        start_webhook_thread_once.started = True
-
-start_webhook_thread_once()
+# Start webhook thread when module is run (development). In production the
+# webhook runs under gunicorn (see gunicorn.conf.py) with DISABLE_WEBHOOK_THREAD=1.
+if os.getenv("DISABLE_WEBHOOK_THREAD") != "1":
+    start_webhook_thread_once()
+else:
+    start_metrics_server_once()  # this process's /metrics, on METRICS_PORT if set
 
 st.set_page_config(page_title="Tribal Marketplace", layout="wide")
 
@@ -363,267 +301,493 @@ with cols[2]:
             st.session_state.clear()
             st.experimental_rerun()
 
-# Sidebar: Auth & account actions
-with st.sidebar:
-    if not st.session_state.get("user_id"):
-        st.header("Account")
-        tab = st.radio("", ["Login", "Sign up"])
-        if tab == "Login":
-            email = st.text_input(strings["email"], key="login_email")
-            password = st.text_input(strings["password"], type="password", key="login_password")
-            if st.button(strings["login"]):
-                db = next(get_db())
-                user = db.query(User).filter_by(email=email).first()
-                if user and verify_password(password, user.password_hash):
-                    st.session_state["user_id"] = user.id
-                    st.session_state["user_email"] = user.email
-                    st.session_state["user_name"] = user.name
-                    st.session_state["user_is_admin"] = user.is_admin
-                    st.success("Logged in")
-                    st.experimental_rerun()
-                else:
-                    st.error("Invalid credentials")
+# One DB session for the whole script run, closed when the run ends (or reruns)
+with session_scope() as db, ExitStack() as page_span:
+    # Sidebar: Auth & account actions
+    with st.sidebar, span("sidebar"):
+        if not st.session_state.get("user_id"):
+            st.header("Account")
+            tab = st.radio("", ["Login", "Sign up"])
+            if tab == "Login":
+                email = st.text_input(strings["email"], key="login_email")
+                password = st.text_input(strings["password"], type="password", key="login_password")
+                if st.button(strings["login"]):
+                    try:
+                        user = authenticate(db, email, password)
+                    except (LoginThrottled, AuthBusy) as e:
+                        st.error(str(e))
+                        user = False
+                    if user:
+                        st.session_state["user_id"] = user.id
+                        st.session_state["user_email"] = user.email
+                        st.session_state["user_name"] = user.name
+                        st.session_state["user_is_admin"] = user.is_admin
+                        st.success("Logged in")
+                        st.experimental_rerun()
+                    elif user is None:
+                        st.error("Invalid credentials")
+            else:
+                st.subheader(strings["signup"])
+                s_name = st.text_input(strings["name"], key="signup_name")
+                s_email = st.text_input(strings["email"], key="signup_email")
+                s_password = st.text_input(strings["password"], type="password", key="signup_password")
+                if st.button(strings["signup"]):
+                    if db.query(User).filter_by(email=s_email).first():
+                        st.error("Email already registered")
+                    else:
+                        try:
+                            h = hash_password(s_password)
+                        except AuthBusy as e:
+                            st.error(str(e))
+                        else:
+                            user = User(name=s_name, email=s_email, password_hash=h)
+                            db.add(user); db.commit()
+                            st.success("Account created. Please login.")
         else:
-            st.subheader(strings["signup"])
-            s_name = st.text_input(strings["name"], key="signup_name")
-            s_email = st.text_input(strings["email"], key="signup_email")
-            s_password = st.text_input(strings["password"], type="password", key="signup_password")
-            if st.button(strings["signup"]):
-                db = next(get_db())
-                if db.query(User).filter_by(email=s_email).first():
-                    st.error("Email already registered")
-                else:
-                    h = hash_password(s_password)
-                    user = User(name=s_name, email=s_email, password_hash=h)
-                    db.add(user); db.commit()
-                    st.success("Account created. Please login.")
-    else:
-        st.subheader(strings["profile"])
-        db = next(get_db())
-        user = db.query(User).filter_by(id=st.session_state["user_id"]).first()
-        st.write("Logged in as:", user.email)
-        new_name = st.text_input(strings["name"], value=user.name)
-        if st.button("Update profile"):
-            user.name = new_name
-            db.add(user); db.commit(); st.success("Profile updated")
-
-    st.write("---")
-    st.subheader(strings["cart"])
-    if st.session_state.get("user_id"):
-        db = next(get_db())
-        cart_items = db.query(CartItem).filter_by(user_id=st.session_state["user_id"]).all()
-        for it in cart_items:
-            prod = db.query(Product).filter_by(id=it.product_id).first()
-            if prod:
-                st.write(f"{prod.title.get(locale, prod.title.get('en'))} x {it.qty} -> {to_float(prod.price_cents):.2f} {prod.currency}")
-        if st.button("Go to checkout"):
-            st.session_state["page"] = "checkout"
-    else:
-        st.write("Login to see cart")
+            st.subheader(strings["profile"])
+            profile = cached(db, "profile", [user_scope(st.session_state["user_id"])], load_profile, st.session_state["user_id"])
+            st.write("Logged in as:", profile["email"])
+            new_name = st.text_input(strings["name"], value=profile["name"])
+            if st.button("Update profile"):
+                db.query(User).filter(User.id == profile["id"]).update({User.name: new_name}, synchronize_session=False)
+                invalidate_on_commit(db, user_scope(profile["id"]))
+                db.commit(); st.success("Profile updated")
+
+        st.write("---")
+        st.subheader(strings["cart"])
+        # loaded once per run and reused by the checkout page below
+        cart_lines = []
+        if st.session_state.get("user_id"):
+            cart_lines = cached(db, "cart", [user_scope(st.session_state["user_id"]), CATALOG], load_cart,
+                                st.session_state["user_id"], locale)
+            for it in cart_lines:
+                st.write(f"{it['title']} x {it['qty']} -> {it['price_label']}")
+            if st.button("Go to checkout"):
+                st.session_state["page"] = "checkout"
+        else:
+            st.write("Login to see cart")
+
+        st.write("---")
+        st.subheader(strings["wishlist"])
+        if st.session_state.get("user_id"):
+            wishlist = cached(db, "wishlist", [user_scope(st.session_state["user_id"]), CATALOG], load_wishlist,
+                              st.session_state["user_id"], locale)
+            for w in wishlist:
+                st.write(w["title"])
+            if wishlist and st.button("Move all to cart"):
+                move_wishlist_to_cart(db, st.session_state["user_id"])
+                db.commit(); st.experimental_rerun()
+        else:
+            st.write("Login to see wishlist")
 
-    st.write("---")
-    st.subheader(strings["wishlist"])
-    if st.session_state.get("user_id"):
-        db = next(get_db())
-        wishlist = db.query(WishlistItem).filter_by(user_id=st.session_state["user_id"]).all()
-        for w in wishlist:
-            prod = db.query(Product).filter_by(id=w.product_id).first()
-            if prod:
-                st.write(prod.title.get(locale, prod.title.get("en")))
-    else:
-        st.write("Login to see wishlist")
+        # Vendor apply
+        st.write("---")
+        if st.session_state.get("user_id"):
+            if st.button(strings["apply_vendor"]):
+                st.session_state["page"] = "apply_vendor"
+        else:
+            st.info("Login to apply as vendor")
+
+        # Admin panel link visible for admin users
+        if st.session_state.get("user_is_admin"):
+            if st.button(strings["admin_panel"]):
+                st.session_state["page"] = "admin"
+
+    # --- Main pages ---
+    page = st.session_state["page"]
+    page_span.enter_context(span(f"page:{page}"))  # timed until the end of the run's DB session
+
+    if page == "home":
+        st.header(strings["products"])
+        search_q = st.text_input("Search products", key="search_q").strip()
+        if search_q:
+            if st.session_state.get("search_for") != search_q:
+                st.session_state["search_for"] = search_q
+                st.session_state["search_page"] = 0
+            search_page = st.session_state.get("search_page", 0)
+            products, has_more = cached(db, "search", [CATALOG], load_search_page, locale, search_q, search_page)
+            if not products:
+                st.info("No matching products")
+            nav1, _, nav2 = st.columns([1, 4, 1])
+            if search_page > 0 and nav1.button("← Previous"):
+                st.session_state["search_page"] = search_page - 1
+                st.experimental_rerun()
+            if has_more and nav2.button("Next →"):
+                st.session_state["search_page"] = search_page + 1
+                st.experimental_rerun()
+        else:
+            with st.expander("Filters"):
+                f1, f2, f3, f4, f5 = st.columns(5)
+                vendor_names = cached(db, "vendor_names", [CATALOG], load_vendor_names)
+                f_vendor = f1.selectbox("Vendor", options=[None] + list(vendor_names.keys()), format_func=lambda k: "All" if k is None else vendor_names[k])
+                try:
+                    currency_options = rate_provider.currencies()
+                except RatesUnavailable:
+                    currency_options = []
+                f_currency = f2.selectbox("Currency", options=[None] + currency_options, format_func=lambda k: "All" if k is None else k)
+                f_min = f3.number_input("Min price", min_value=0.0, value=0.0)
+                f_max = f4.number_input("Max price", min_value=0.0, value=0.0, help="0 = no limit")
+                f_stock = f5.checkbox("In stock only")
+            filters = {
+                "vendor_id": f_vendor,
+                "currency": f_currency,
+                "min_price_cents": int(f_min * 100) if f_min else None,
+                "max_price_cents": int(f_max * 100) if f_max else None,
+                "in_stock": f_stock,
+            }
+            # a filter change invalidates the cursor, start again from the first page
+            if st.session_state.get("catalog_filters") != filters:
+                st.session_state["catalog_filters"] = filters
+                st.session_state["catalog_cursor"] = (None, None)
+            direction, cursor = st.session_state.get("catalog_cursor", (None, None))
+            products, next_cursor, prev_cursor = cached(db, "catalog", [CATALOG], load_catalog_page, locale,
+                                                        direction, cursor, tuple(sorted(filters.items())))
+            if not products:
+                st.info("No products yet")
+            nav1, _, nav2 = st.columns([1, 4, 1])
+            if prev_cursor and nav1.button("← Previous"):
+                st.session_state["catalog_cursor"] = ("before", prev_cursor)
+                st.experimental_rerun()
+            if next_cursor and nav2.button("Next →"):
+                st.session_state["catalog_cursor"] = ("after", next_cursor)
+                st.experimental_rerun()
+        cols2 = st.columns(3)
+        for idx, p in enumerate(products):
+            c = cols2[idx % 3]
+            with c:
+                thumbnail = thumbnail_html(p["images"][0], p["title"]) if p["images"] else ""
+                if thumbnail:
+                    st.markdown(thumbnail, unsafe_allow_html=True)
+                st.subheader(p["title"])
+                st.write(p["description"])
+                st.write(f"Price: {p['price_label']} | Stock: {p['stock']}")
+                qty = st.number_input("Qty", min_value=1, max_value=100, value=1, key=f"qty_{p['id']}")
+                if st.button(strings["add_to_cart"], key=f"cart_{p['id']}"):
+                    if not st.session_state.get("user_id"):
+                        st.warning("Please login to add to cart")
+                    else:
+                        add_to_cart(db, st.session_state["user_id"], p["id"], qty)
+                        db.commit(); st.success("Added to cart")
+                if st.button(strings["add_to_wishlist"], key=f"wish_{p['id']}"):
+                    if not st.session_state.get("user_id"):
+                        st.warning("Please login to add to wishlist")
+                    else:
+                        add_to_wishlist(db, st.session_state["user_id"], p["id"])
+                        db.commit(); st.success("Added to wishlist")
+
+    elif page == "apply_vendor":
+        st.header(strings["apply_vendor"])
+        if not st.session_state.get("user_id"):
+            st.warning("Please login to apply")
+        else:
+            with st.form("vendor_apply"):
+                store_name = st.text_input("Store name")
+                store_desc = st.text_area("Short description")
+                payout_info = st.text_input("Payout info (bank/UPI/Stripe account id) - optional")
+                kyc = st.file_uploader("KYC doc (image/pdf) - optional")
+                submitted = st.form_submit_button("Submit application")
+                if submitted:
+                    v = Vendor(owner_id=st.session_state["user_id"], name=store_name, description=store_desc, payout_info={"raw": payout_info})
+                    db.add(v)
+                    invalidate_on_commit(db, ADMIN, user_scope(st.session_state["user_id"]))
+                    db.commit()
+                    st.success("Vendor application submitted. Admin will review.")
+                    st.session_state["page"] = "home"
 
-    # Vendor apply
-    st.write("---")
-    if st.session_state.get("user_id"):
-        if st.button(strings["apply_vendor"]):
-            st.session_state["page"] = "apply_vendor"
-    else:
-        st.info("Login to apply as vendor")
-
-    # Admin panel link visible for admin users
-    if st.session_state.get("user_is_admin"):
-        if st.button(strings["admin_panel"]):
-            st.session_state["page"] = "admin"
-
-# --- Main pages ---
-page = st.session_state["page"]
-
-if page == "home":
-    st.header(strings["products"])
-    db = next(get_db())
-    products = db.query(Product).all()
-    if not products:
-        st.info("No products yet")
-    cols2 = st.columns(3)
-    for idx, p in enumerate(products):
-        c = cols2[idx % 3]
-        with c:
-            st.subheader(p.title.get(locale, p.title.get("en")))
-            st.write(p.description.get(locale, p.description.get("en")))
-            st.write(f"Price: {to_float(p.price_cents):.2f} {p.currency} | Stock: {p.stock}")
-            qty = st.number_input("Qty", min_value=1, max_value=100, value=1, key=f"qty_{p.id}")
-            if st.button(strings["add_to_cart"], key=f"cart_{p.id}"):
-                if not st.session_state.get("user_id"):
-                    st.warning("Please login to add to cart")
-                else:
-                    db = next(get_db())
-                    ci = CartItem(user_id=st.session_state["user_id"], product_id=p.id, qty=qty)
-                    db.add(ci); db.commit(); st.success("Added to cart")
-            if st.button(strings["add_to_wishlist"], key=f"wish_{p.id}"):
-                if not st.session_state.get("user_id"):
-                    st.warning("Please login to add to wishlist")
-                else:
-                    db = next(get_db())
-                    wi = WishlistItem(user_id=st.session_state["user_id"], product_id=p.id)
-                    db.add(wi); db.commit(); st.success("Added to wishlist")
-
-elif page == "apply_vendor":
-    st.header(strings["apply_vendor"])
-    if not st.session_state.get("user_id"):
-        st.warning("Please login to apply")
-    else:
-        with st.form("vendor_apply"):
-            store_name = st.text_input("Store name")
-            store_desc = st.text_area("Short description")
-            payout_info = st.text_input("Payout info (bank/UPI/Stripe account id) - optional")
-            kyc = st.file_uploader("KYC doc (image/pdf) - optional")
-            submitted = st.form_submit_button("Submit application")
-            if submitted:
-                db = next(get_db())
-                me = db.query(User).filter_by(id=st.session_state["user_id"]).first()
-                v = Vendor(owner_id=me.id, name=store_name, description=store_desc, payout_info={"raw": payout_info})
-                db.add(v); db.commit()
-                st.success("Vendor application submitted. Admin will review.")
-                st.session_state["page"] = "home"
-
-elif page == "admin":
-    st.header("Admin: Vendor Approvals & Orders")
-    if not st.session_state.get("user_is_admin"):
-        st.warning("Admin access required")
-    else:
-        db = next(get_db())
-        pending = db.query(Vendor).filter_by(status="PENDING").all()
-        st.subheader("Pending vendor applications")
-        for v in pending:
-            owner = db.query(User).filter_by(id=v.owner_id).first()
-            st.write(f"Store: {v.name} | Owner: {owner.email} | Desc: {v.description}")
-            c1, c2 = st.columns(2)
-            if c1.button("Approve", key=f"approve_{v.id}"):
-                v.status = "APPROVED"
-                db.add(v); db.commit(); st.success("Vendor approved")
-            if c2.button("Reject", key=f"reject_{v.id}"):
-                v.status = "REJECTED"
-                db.add(v); db.commit(); st.info("Vendor rejected")
-
-        st.subheader("Recent orders")
-        recent_orders = db.query(Order).order_by(Order.created_at.desc()).limit(20).all()
-        for o in recent_orders:
-            st.write(f"Order {o.id} | User {o.user_id} | Status: {o.status} | Total: {to_float(o.total_cents)} {o.currency}")
-
-elif page == "vendor_dashboard":
-    st.header(strings["vendor_dashboard"])
-    if not st.session_state.get("user_id"):
-        st.warning("Please login")
-    else:
-        db = next(get_db())
-        me = db.query(User).filter_by(id=st.session_state["user_id"]).first()
-        vendor = me.vendor
-        if not vendor or vendor.status != "APPROVED":
-            st.info("No approved vendor found. Apply and wait for admin approval.")
+    elif page == "admin":
+        st.header("Admin: Vendor Approvals & Orders")
+        if not st.session_state.get("user_is_admin"):
+            st.warning("Admin access required")
         else:
-            st.subheader("My products")
-            for p in vendor.products:
-                st.write(f"{p.title.get(locale,'-')} | {to_float(p.price_cents):.2f} {p.currency} | Stock {p.stock}")
+            admin = cached(db, "admin", [ADMIN], load_admin)
+            vendor_names = cached(db, "vendor_names", [CATALOG], load_vendor_names)
+            st.write("Vendors: " + " | ".join(f"{k}: {n}" for k, n in sorted(admin["vendors"].items())))
+            st.write("Orders: " + " | ".join(f"{k}: {n}" for k, n in sorted(admin["orders"].items())))
+
+            st.subheader("Pending vendor applications")
+            apps_dir, apps_cursor = st.session_state.get("admin_vendors_cursor", (None, None))
+            apps, next_apps, prev_apps = cached(db, "admin_vendors", [ADMIN], load_vendor_applications,
+                                                apps_dir, apps_cursor)
+            if not apps:
+                st.info("No pending applications")
+            else:
+                select_all = st.checkbox("Select all on this page", key=f"review_all_{apps_cursor}")
+                picked = st.data_editor([{"select": select_all, "store": v["name"], "owner": v["owner_email"],
+                                          "description": v["description"], "applied": v["created_at"]} for v in apps],
+                                        disabled=["store", "owner", "description", "applied"], hide_index=True,
+                                        key=f"review_{apps_cursor}_{select_all}")
+                chosen = [v["id"] for v, row in zip(apps, picked) if row["select"]]
                 c1, c2 = st.columns(2)
-                if c1.button("Edit", key=f"edit_{p.id}"):
-                    st.session_state["editing_product"] = p.id
-                if c2.button("Delete", key=f"del_{p.id}"):
-                    db.delete(p); db.commit(); st.success("Deleted")
-
-            st.subheader("Create product")
-            with st.form("create_prod"):
-                t_en = st.text_input("Title (EN)")
-                t_te = st.text_input("Title (TE)")
-                d_en = st.text_area("Desc (EN)")
-                price = st.number_input("Price (USD)", value=10.0)
-                stock = st.number_input("Stock", value=10)
-                submitted = st.form_submit_button("Create")
-                if submitted:
-                    prod = Product(vendor_id=vendor.id, title={"en":t_en,"te":t_te}, description={"en":d_en}, price_cents=int(price*100), currency="USD", stock=stock)
-                    db.add(prod); db.commit(); st.success("Product created")
-
-            st.subheader("Orders for my products")
-            my_orders = db.query(Order).filter_by(vendor_id=vendor.id).order_by(Order.created_at.desc()).all()
-            for o in my_orders:
-                st.write(f"Order {o.id} | Status: {o.status} | Total: {to_float(o.total_cents)} {o.currency}")
-                if o.fulfillment and o.fulfillment.get("status") == "QUEUED":
-                    if st.button("Mark as shipped", key=f"ship_{o.id}"):
-                        o.fulfillment = {"status":"SHIPPED", "tracking": "TBD", "notes": "Shipped by vendor"}
-                        o.status = "SHIPPED"
-                        db.add(o); db.commit(); st.success("Marked shipped")
-
-elif page == "checkout":
-    st.header(strings["checkout"])
-    if not st.session_state.get("user_id"):
-        st.warning("Please login to checkout")
-    else:
-        db = next(get_db())
-        user = db.query(User).filter_by(id=st.session_state["user_id"]).first()
-        cart_items = db.query(CartItem).filter_by(user_id=user.id).all()
-        if not cart_items:
-            st.info("Cart is empty")
+                decision = ("APPROVED" if c1.button(f"Approve selected ({len(chosen)})", disabled=not chosen) else
+                            "REJECTED" if c2.button(f"Reject selected ({len(chosen)})", disabled=not chosen) else None)
+                if decision:
+                    n = review_vendors(db, chosen, decision)
+                    st.session_state.pop("admin_vendors_cursor", None)
+                    st.success(f"{n} vendors {decision.lower()}")
+            nav1, _, nav2 = st.columns([1, 4, 1])
+            if prev_apps and nav1.button("← Newer", key="apps_prev"):
+                st.session_state["admin_vendors_cursor"] = ("before", prev_apps)
+                st.experimental_rerun()
+            if next_apps and nav2.button("Older →", key="apps_next"):
+                st.session_state["admin_vendors_cursor"] = ("after", next_apps)
+                st.experimental_rerun()
+
+            st.subheader("Orders")
+            with st.form("admin_order_search"):
+                f1, f2, f3 = st.columns(3)
+                status = f1.selectbox("Status", options=[None] + sorted(admin["orders"]),
+                                      format_func=lambda k: "Any" if k is None else k)
+                vendor = f2.selectbox("Vendor", options=[None] + list(vendor_names),
+                                      format_func=lambda k: "Any" if k is None else vendor_names[k])
+                customer = f3.text_input("Customer email or id").strip()
+                g1, g2 = st.columns(2)
+                order_id = g1.text_input("Order id").strip()
+                placed = g2.date_input("Placed between", value=())
+                if st.form_submit_button("Search"):
+                    filters = {"status": status, "vendor_id": vendor, "customer": customer, "order_id": order_id,
+                               "created_from": placed[0] if placed else None,
+                               "created_to": placed[-1] if placed else None}
+                    st.session_state["admin_order_filters"] = tuple((k, v) for k, v in filters.items() if v)
+                    st.session_state.pop("admin_orders_cursor", None)
+            orders_dir, orders_cursor = st.session_state.get("admin_orders_cursor", (None, None))
+            found, next_found, prev_found = cached(db, "admin_orders", [ADMIN], load_admin_orders,
+                                                   st.session_state.get("admin_order_filters", ()), orders_dir, orders_cursor)
+            if found:
+                st.dataframe([{"order": o["id"], "placed": o["placed"], "customer": o["customer"],
+                               "vendor": vendor_names.get(o["vendor_id"], o["vendor_id"]), "status": o["status"],
+                               "total": f"{to_float(o['total_cents']):.2f} {o['currency']}"} for o in found],
+                             hide_index=True)
+            else:
+                st.info("No matching orders")
+            nav1, _, nav2 = st.columns([1, 4, 1])
+            if prev_found and nav1.button("← Newer", key="admin_orders_prev"):
+                st.session_state["admin_orders_cursor"] = ("before", prev_found)
+                st.experimental_rerun()
+            if next_found and nav2.button("Older →", key="admin_orders_next"):
+                st.session_state["admin_orders_cursor"] = ("after", next_found)
+                st.experimental_rerun()
+
+            with st.expander("Webhook inbox"):
+                st.json(admin["webhook_inbox"])
+                if admin["webhook_inbox"].get("DEAD") and st.button("Retry dead events"):
+                    st.success(f"Requeued {requeue_dead_webhook_events(db)} events")
+
+            with st.expander("Payouts"):
+                st.json(admin["payouts"])
+                if admin["last_run"]:
+                    created_at, status, settled = admin["last_run"]
+                    st.write(f"Last settlement: {created_at:%Y-%m-%d %H:%M} | {status} | {settled} payouts")
+                if st.button("Run settlement now"):
+                    run = run_settlement(db)
+                    st.success(f"Settled {run.payouts_settled} payouts")
+
+            with st.expander("DB connection pool"):
+                st.json(pool_metrics())
+
+            with st.expander("Catalog import / export"):
+                import_for = st.selectbox("Import into vendor", options=[None] + list(vendor_names),
+                                          format_func=lambda k: "(export only)" if k is None else vendor_names[k])
+                catalog_io_panel(import_for, key="admin_catalog_io")
+
+            with st.expander("Page cache"):
+                st.json(page_cache.stats())
+
+    elif page == "vendor_dashboard":
+        st.header(strings["vendor_dashboard"])
+        if not st.session_state.get("user_id"):
+            st.warning("Please login")
+        else:
+            profile = cached(db, "profile", [user_scope(st.session_state["user_id"])], load_profile, st.session_state["user_id"])
+            vendor_id = profile["vendor_id"]
+            if profile["vendor_status"] != "APPROVED":
+                st.info("No approved vendor found. Apply and wait for admin approval.")
+            else:
+                stats = cached(db, "vendor_dashboard", [vendor_scope(vendor_id), CATALOG],
+                               load_vendor_dashboard, vendor_id, locale)
+                m1, m2, m3, m4 = st.columns(4)
+                m1.metric("Paid orders", stats["orders_paid"])
+                m2.metric("Awaiting shipment", stats["pending_fulfillment"])
+                m3.metric("Oversold", stats["orders_oversold"], help="Paid, but stock ran out: refund or restock")
+                m4.metric("Payout balance", ", ".join(f"{to_float(c):.2f} {cur}" for cur, c in stats["payout_balance"].items()) or "0")
+                if stats["revenue_by_day"]:
+                    st.caption(f"Revenue, last {VENDOR_STATS_DAYS} days")
+                    revenue = {}
+                    for day, cur, cents, _ in stats["revenue_by_day"]:
+                        revenue.setdefault(cur, {})[day.isoformat()] = to_float(cents)
+                    st.bar_chart(revenue)
+                if stats["units_by_title"]:
+                    st.caption("Units sold by product")
+                    for title, units in stats["units_by_title"]:
+                        st.write(f"{title}: {units}")
+
+                st.subheader("My products")
+                product_dir, product_cursor = st.session_state.get("vendor_products_cursor", (None, None))
+                my_products, next_products, prev_products = cached(db, "vendor_products", [vendor_scope(vendor_id), CATALOG],
+                                                                   load_vendor_products, vendor_id, locale,
+                                                                   product_dir, product_cursor)
+                for p in my_products:
+                    st.write(f"{p['title']} | {p['price_label']} | Stock {p['stock']}")
+                    c1, c2 = st.columns(2)
+                    if c1.button("Edit", key=f"edit_{p['id']}"):
+                        st.session_state["editing_product"] = p["id"]
+                    if c2.button("Delete", key=f"del_{p['id']}"):
+                        doomed = db.query(Product).filter_by(id=p["id"], vendor_id=vendor_id).first()
+                        if doomed:
+                            delete_product(db, doomed)
+                        st.success("Deleted")
+                nav1, _, nav2 = st.columns([1, 4, 1])
+                if prev_products and nav1.button("← Newer", key="products_prev"):
+                    st.session_state["vendor_products_cursor"] = ("before", prev_products)
+                    st.experimental_rerun()
+                if next_products and nav2.button("Older →", key="products_next"):
+                    st.session_state["vendor_products_cursor"] = ("after", next_products)
+                    st.experimental_rerun()
+
+                editing = st.session_state.get("editing_product")
+                edit_prod = db.query(Product).filter_by(id=editing, vendor_id=vendor_id).first() if editing else None
+                if edit_prod:
+                    st.subheader("Edit product")
+                    with st.form("edit_prod"):
+                        e_title = {loc: st.text_input(f"Title ({loc.upper()})", value=(edit_prod.title or {}).get(loc, "")) for loc in SUPPORTED_LOCALES}
+                        e_desc = {loc: st.text_area(f"Desc ({loc.upper()})", value=(edit_prod.description or {}).get(loc, "")) for loc in SUPPORTED_LOCALES}
+                        e_price = st.number_input("Price (USD)", value=to_float(edit_prod.price_cents))
+                        e_stock = st.number_input("Stock", value=edit_prod.stock)
+                        if st.form_submit_button("Save"):
+                            save_product(db, edit_prod,
+                                         title={k: v for k, v in e_title.items() if v},
+                                         description={k: v for k, v in e_desc.items() if v},
+                                         price_cents=int(round(e_price * 100)), stock=e_stock)
+                            st.session_state.pop("editing_product", None)
+                            st.success("Product updated")
+
+                st.subheader("Create product")
+                with st.form("create_prod"):
+                    sku = st.text_input("SKU (optional)")
+                    t_en = st.text_input("Title (EN)")
+                    t_te = st.text_input("Title (TE)")
+                    d_en = st.text_area("Desc (EN)")
+                    price = st.number_input("Price (USD)", value=10.0)
+                    stock = st.number_input("Stock", value=10)
+                    uploads = st.file_uploader("Images", type=["jpg", "jpeg", "png", "webp"], accept_multiple_files=True)
+                    submitted = st.form_submit_button("Create")
+                    if submitted:
+                        try:
+                            image_ids = [save_image(u.getvalue()) for u in uploads or []]
+                        except InvalidImage as e:
+                            st.error(str(e))
+                        else:
+                            prod = Product(vendor_id=vendor_id, sku=sku.strip() or None, title={"en":t_en,"te":t_te}, description={"en":d_en}, price_cents=int(price*100), currency="USD", stock=stock, images=image_ids)
+                            try:
+                                save_product(db, prod); st.success("Product created")
+                            except sa_exc.IntegrityError:
+                                db.rollback(); st.error(f"You already have a product with SKU {prod.sku}")
+
+                with st.expander("Bulk import / export"):
+                    catalog_io_panel(vendor_id, key="vendor_catalog_io")
+
+                st.subheader("Orders for my products")
+                order_dir, order_cursor = st.session_state.get("vendor_orders_cursor", (None, None))
+                my_orders, next_orders, prev_orders = cached(db, "vendor_orders", [vendor_scope(vendor_id)], load_vendor_orders,
+                                                             vendor_id, order_dir, order_cursor)
+                for o in my_orders:
+                    st.write(f"Order {o['id']} | Status: {o['status']} | Total: {to_float(o['total_cents'])} {o['currency']}")
+                    fulfillment = o["fulfillment"] or {}
+                    if fulfillment.get("status") == "QUEUED":
+                        if st.button("Mark as shipped", key=f"ship_{o['id']}"):
+                            if mark_order_shipped(db, o["id"], vendor_id):
+                                st.experimental_rerun()
+                    elif fulfillment.get("status") == "OVERSOLD":
+                        st.warning(f"Not enough stock for: {', '.join(fulfillment.get('oversold', []))}")
+                nav1, _, nav2 = st.columns([1, 4, 1])
+                if prev_orders and nav1.button("← Newer", key="orders_prev"):
+                    st.session_state["vendor_orders_cursor"] = ("before", prev_orders)
+                    st.experimental_rerun()
+                if next_orders and nav2.button("Older →", key="orders_next"):
+                    st.session_state["vendor_orders_cursor"] = ("after", next_orders)
+                    st.experimental_rerun()
+
+    elif page == "checkout":
+        st.header(strings["checkout"])
+        if not st.session_state.get("user_id"):
+            st.warning("Please login to checkout")
         else:
-            st.subheader("Addresses")
-            user_addresses = user.addresses
-            addr_map = {a.id: f"{a.line1}, {a.city}, {a.state}, {a.postal_code}, {a.country}" for a in user_addresses}
-            selected_addr = None
-            if addr_map:
-                sel = st.selectbox("Select address", options=list(addr_map.keys()), format_func=lambda k: addr_map[k])
-                selected_addr = db.query(Address).filter_by(id=sel).first()
-            if st.button("Add address"):
-                with st.form("add_addr"):
-                    line1 = st.text_input("Line1")
-                    city = st.text_input("City")
-                    state = st.text_input("State")
-                    postal = st.text_input("Postal")
-                    country = st.text_input("Country")
-                    sub = st.form_submit_button("Save")
-                    if sub:
-                        a = Address(user_id=user.id, line1=line1, city=city, state=state, postal_code=postal, country=country)
-                        db.add(a); db.commit(); st.success("Address saved"); st.experimental_rerun()
-
-            # Prepare Stripe line items and order record
-            currency = st.selectbox("Pay in currency", options=list(EXCHANGE_RATES.keys()), index=0)
-            line_items = []
-            total_cents = 0
-            vendor_id = None
-            for it in cart_items:
-                prod = db.query(Product).filter_by(id=it.product_id).first()
-                if not prod: continue
-                vendor_id = prod.vendor_id
-                # convert price to selected currency using EXCHANGE_RATES as simple multiplier
-                base_usd = prod.price_cents / 100.0
-                rate = EXCHANGE_RATES.get(currency, 1.0)
-                unit_amount_cents = int(round(base_usd * rate * 100))
-                line_items.append({"name": prod.title.get(locale, prod.title.get("en")), "unit_amount": unit_amount_cents, "quantity": it.qty, "product_id": prod.id})
-                total_cents += unit_amount_cents * it.qty
-
-            st.write("Items:")
-            for li in line_items:
-                st.write(f"{li['name']} x {li['quantity']} -> {li['unit_amount']/100.0:.2f} {currency}")
-            st.write("Total:", total_cents/100.0, currency)
-
-            if st.button(strings["place_order"]):
-                # create Order record
-                order = Order(user_id=user.id, vendor_id=vendor_id, items=[{"product_id":x["product_id"], "qty":x["quantity"], "amount":x["unit_amount"]} for x in line_items], total_cents=total_cents, currency=currency, status="PENDING", address={"raw": addr_map.get(selected_addr.id) if selected_addr else None})
-                db.add(order); db.commit()
+            user_id = st.session_state["user_id"]
+            cart_items = cart_lines
+            if not cart_items:
+                st.info("Cart is empty")
+            else:
+                st.subheader("Addresses")
+                addr_map = dict(cached(db, "addresses", [user_scope(user_id)], load_addresses, user_id))
+                selected_addr = None
+                if addr_map:
+                    selected_addr = st.selectbox("Select address", options=list(addr_map.keys()), format_func=lambda k: addr_map[k])
+                if st.button("Add address"):
+                    with st.form("add_addr"):
+                        line1 = st.text_input("Line1")
+                        city = st.text_input("City")
+                        state = st.text_input("State")
+                        postal = st.text_input("Postal")
+                        country = st.text_input("Country")
+                        sub = st.form_submit_button("Save")
+                        if sub:
+                            a = Address(user_id=user_id, line1=line1, city=city, state=state, postal_code=postal, country=country)
+                            db.add(a); invalidate_on_commit(db, user_scope(user_id)); db.commit(); st.success("Address saved"); st.experimental_rerun()
+
+                # Prepare Stripe line items and order record
+                priced = None
                 try:
-                    sess = create_stripe_checkout_session([{"name":x["name"], "unit_amount":x["unit_amount"], "quantity":x["quantity"]} for x in line_items], order_id=order.id, currency=currency)
-                    st.info("Redirecting to Stripe Checkout")
-                    st.markdown(f"[Proceed to payment]({sess.url})")
-                except Exception as e:
-                    st.error(f"Stripe error: {e}")
+                    rates_snapshot = rate_provider.snapshot()
+                    currency = st.selectbox("Pay in currency", options=rate_provider.currencies(), index=0)
+                    # convert the whole cart in one pass; the rates used are stored on the checkout
+                    priced = price_lines([(it["price_cents"], it["currency"], it["qty"]) for it in cart_items], currency, rates_snapshot)
+                except RatesUnavailable:
+                    st.error("Exchange rates are unavailable right now, so prices can't be converted. Please try again in a minute.")
+                except UnknownCurrency as e:
+                    st.error(f"Some items in your cart are priced in {e.currency}, which can't be paid for at the moment. Please remove them to continue.")
+                if priced:
+                    units, total_cents, fx = priced
+                    line_items = [{"name": it["title"], "unit_amount": unit, "quantity": it["qty"],
+                                   "product_id": it["product_id"], "vendor_id": it["vendor_id"]}
+                                  for it, unit in zip(cart_items, units)]
+
+                    st.write("Items:")
+                    for li in line_items:
+                        st.write(f"{li['name']} x {li['quantity']} -> {li['unit_amount']/100.0:.2f} {currency}")
+                    st.write("Total:", total_cents/100.0, currency)
+
+                    # a second click, or a rerun, for the same cart reuses the checkout (and so its Stripe session)
+                    cart_key = (currency, selected_addr, tuple((x["product_id"], x["quantity"], x["unit_amount"]) for x in line_items))
+                    pending = st.session_state.get("pending_checkout")
+                    if pending and pending["key"] != cart_key:
+                        pending = None
+                    elif pending and db.query(Checkout.status).filter(Checkout.id == pending["id"]).scalar() == "PAID":
+                        # already paid: buying the same cart again is a new checkout
+                        pending = st.session_state["pending_checkout"] = None
+                    if st.button(strings["place_order"]):
+                        if pending is None:
+                            # one checkout (one payment) split into an order per vendor
+                            checkout = create_checkout(db, user_id, [{"product_id": x["product_id"], "vendor_id": x["vendor_id"], "qty": x["quantity"], "amount": x["unit_amount"]} for x in line_items],
+                                                       currency, exchange_rates=fx, address={"raw": addr_map.get(selected_addr) if selected_addr else None})
+                            pending = st.session_state["pending_checkout"] = {"key": cart_key, "id": checkout.id, "url": None, "error": None}
+                        if not pending["url"]:
+                            pending["error"] = None
+                            start_checkout_session(pending["id"], [{"name": x["name"], "unit_amount": x["unit_amount"], "quantity": x["quantity"]} for x in line_items], currency)
+                    if pending and not pending["url"] and not pending["error"]:
+                        state, value = checkout_session_status(pending["id"])
+                        if state == "ready":
+                            pending["url"] = value
+                        elif state == "failed":
+                            pending["error"] = value
+                    if pending and pending["url"]:
+                        st.info("Redirecting to Stripe Checkout")
+                        st.markdown(f"[Proceed to payment]({pending['url']})")
+                    elif pending and pending["error"]:
+                        st.error(f"Stripe error: {pending['error']}")
+                    elif pending:
+                        # the session is created in the background; poll until its URL is there
+                        with st.spinner("Preparing payment..."):
+                            time.sleep(STRIPE_POLL_INTERVAL)
+                        st.experimental_rerun()
 
 # Chat assistant (basic)
 st.write("---")
@@ -633,20 +797,28 @@ if st.button("Send to assistant"):
     if not chat_input:
         st.info("Type a message")
     else:
+        prior = list(st.session_state["chat_history"])
         st.session_state["chat_history"].append({"role":"user", "content": chat_input})
         if not OPENAI_API_KEY:
             st.session_state["chat_history"].append({"role":"assistant", "content":"(OpenAI key not set) I can explain the app and product details. Enable OPENAI_API_KEY to get AI responses."})
         else:
+            placeholder = st.empty()
+            parts = []
             try:
-                import openai
-                openai.api_key = OPENAI_API_KEY
-                msgs = [{"role":m["role"], "content":m["content"]} for m in st.session_state["chat_history"]]
-                sys = {"role":"system", "content":"You are a helpful marketplace assistant. Answer briefly in the user's locale."}
-                res = openai.ChatCompletion.create(model="gpt-4o-mini", messages=[sys]+msgs, temperature=0.7)
-                content = res.choices[0].message.content
-                st.session_state["chat_history"].append({"role":"assistant", "content": content})
+                with span("assistant"):
+                    with session_scope() as chat_db:
+                        answer = ask(prior, chat_input, locale, db=chat_db)
+                    for chunk in answer:
+                        parts.append(chunk)
+                        placeholder.markdown(f"**Assistant:** {''.join(parts)}")
+                st.session_state["chat_history"].append({"role":"assistant", "content": "".join(parts)})
+            except AssistantTimeout as e:
+                st.warning(str(e))
+                if parts:
+                    st.session_state["chat_history"].append({"role":"assistant", "content": "".join(parts) + " …"})
             except Exception as e:
                 st.error(f"OpenAI error: {e}")
+            placeholder.empty()
 
 for m in st.session_state["chat_history"][-10:]:
     if m["role"] == "user":
@@ -0,0 +1,226 @@
+"""
+Chat assistant. Completions run on a small thread pool and stream their
+tokens through a queue, so the Streamlit script renders text as it arrives
+and gives up after ASSISTANT_TIMEOUT seconds instead of blocking the rerun.
+
+Only the most recent history that fits in ASSISTANT_HISTORY_TOKENS is sent.
+Answers to standalone FAQ-style questions (shipping, returns, payment, ...)
+are cached per locale under a normalized key: the question's tokens minus
+stop words, de-duplicated and sorted, so "How long does shipping take?" and
+"shipping - how long does it take" share an answer. Only answers the model
+gave to the question alone are stored: with earlier history in the prompt,
+the answer may hinge on it and is not reused.
+
+When a database session is passed, the ASSISTANT_CONTEXT_PRODUCTS catalog
+products closest to a non-FAQ question (see embeddings.py) are listed in the
+system prompt, so the model can answer "do you have bamboo baskets under $20"
+without the whole catalog in the prompt.
+
+OPENAI_BASE_URL points the client at any OpenAI-compatible server; see
+fixtures/openai_stub.py for a local stand-in.
+"""
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.orm import load_only
+
+from config import OPENAI_API_KEY, OPENAI_BASE_URL
+from search import tokenize
+from embeddings import search_similar_products
+
+ASSISTANT_MODEL = os.getenv("ASSISTANT_MODEL", "gpt-4o-mini")
+ASSISTANT_TIMEOUT = float(os.getenv("ASSISTANT_TIMEOUT", "30"))  # seconds, whole answer
+ASSISTANT_WORKERS = int(os.getenv("ASSISTANT_WORKERS", "4"))
+ASSISTANT_HISTORY_TOKENS = int(os.getenv("ASSISTANT_HISTORY_TOKENS", "1500"))
+ASSISTANT_CACHE_SIZE = int(os.getenv("ASSISTANT_CACHE_SIZE", "1000"))
+ASSISTANT_CACHE_TTL = float(os.getenv("ASSISTANT_CACHE_TTL", "86400"))
+ASSISTANT_CONTEXT_PRODUCTS = int(os.getenv("ASSISTANT_CONTEXT_PRODUCTS", "5"))
+
+SYSTEM_PROMPT = "You are a helpful marketplace assistant. Answer briefly in the user's locale."
+
+FAQ_TOPICS = {
+    "shipping", "ship", "delivery", "deliver", "courier", "track", "tracking",
+    "return", "returns", "refund", "exchange", "cancel", "payment", "pay", "card", "upi",
+    "cod", "vendor", "sell", "seller", "handmade", "authentic", "care", "wash",
+}
+_STOP_WORDS = {
+    "a", "an", "the", "is", "are", "do", "does", "did", "can", "i", "you", "we", "my", "your",
+    "it", "to", "of", "for", "in", "on", "and", "or", "how", "what", "when", "please", "me",
+}
+
+_executor = ThreadPoolExecutor(max_workers=ASSISTANT_WORKERS, thread_name_prefix="assistant")
+_client = None
+_client_lock = threading.Lock()
+_DONE = object()
+
+
+class AssistantTimeout(Exception):
+    """The completion did not finish within ASSISTANT_TIMEOUT."""
+
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI  # imported on first use; it is slow to load
+            _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None,
+                             timeout=ASSISTANT_TIMEOUT, max_retries=1)
+        return _client
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; close enough for a budget
+    return len(text or "") // 4 + 4
+
+
+def trim_history(messages, budget=ASSISTANT_HISTORY_TOKENS):
+    """The most recent messages whose estimated size fits the budget (at least the last one)."""
+    kept, used = [], 0
+    for m in reversed(messages):
+        cost = estimate_tokens(m["content"])
+        if kept and used + cost > budget:
+            break
+        kept.append({"role": m["role"], "content": m["content"]})
+        used += cost
+    return kept[::-1]
+
+
+def faq_key(question: str, locale: str):
+    """Cache key for a FAQ-style question, or None when it should not be cached."""
+    terms = sorted({t for t in tokenize(question) if t not in _STOP_WORDS})
+    if not terms or not FAQ_TOPICS.intersection(terms):
+        return None
+    return (locale, " ".join(terms))
+
+
+class AnswerCache:
+    """Thread-safe LRU of answers with a TTL."""
+
+    def __init__(self, maxsize=ASSISTANT_CACHE_SIZE, ttl=ASSISTANT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (stored monotonic, answer)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, answer):
+        with self._lock:
+            self._data[key] = (time.monotonic(), answer)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+answer_cache = AnswerCache()
+
+
+class AnswerStream:
+    """
+    Iterate to receive answer text chunks as they arrive. Raises
+    AssistantTimeout once the deadline passes, or the error the completion
+    failed with. `cached` is True when the answer came from answer_cache.
+    """
+
+    def __init__(self, chunks, timeout=ASSISTANT_TIMEOUT, cached=False):
+        self._chunks = chunks
+        self._deadline = time.monotonic() + timeout
+        self.cached = cached
+
+    @classmethod
+    def from_text(cls, answer):
+        q = queue.Queue()
+        q.put(answer)
+        q.put(_DONE)
+        return cls(q, cached=True)
+
+    def __iter__(self):
+        while True:
+            remaining = self._deadline - time.monotonic()
+            if remaining <= 0:
+                raise AssistantTimeout("The assistant took too long to answer")
+            try:
+                item = self._chunks.get(timeout=remaining)
+            except queue.Empty:
+                raise AssistantTimeout("The assistant took too long to answer")
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+def product_context(db, question, locale, k=ASSISTANT_CONTEXT_PRODUCTS):
+    """System prompt lines describing the k catalog products most similar to the question."""
+    from models import Product
+    from product_views import get_views
+    ids = [pid for pid, _ in search_similar_products(question, k=k)]
+    if not ids:
+        return ""
+    products = {p.id: p for p in (db.query(Product)
+                                  .options(load_only(Product.id, Product.version, Product.stock))
+                                  .filter(Product.id.in_(ids)).all())}
+    views = get_views(db, [(p.id, p.version) for p in products.values()], locale)
+    lines = [f"- {views[pid]['title']} | {views[pid]['price_label']} | {products[pid].stock or 0} in stock"
+             for pid in ids if pid in products and pid in views]
+    if not lines:
+        return ""
+    return "Catalog products that may be relevant (title | price | stock):\n" + "\n".join(lines)
+
+
+def _complete(messages, chunks, key):
+    try:
+        stream = _get_client().chat.completions.create(
+            model=ASSISTANT_MODEL, messages=messages, temperature=0.7, stream=True)
+        parts = []
+        for event in stream:
+            delta = event.choices[0].delta.content if event.choices else None
+            if delta:
+                parts.append(delta)
+                chunks.put(delta)
+        if key is not None and parts:
+            answer_cache.put(key, "".join(parts))
+        chunks.put(_DONE)
+    except Exception as e:
+        chunks.put(e)
+
+
+def ask(history, question, locale="en", system=SYSTEM_PROMPT, db=None):
+    """
+    Start answering `question` given earlier `history` ([{"role", "content"}]).
+    Returns an AnswerStream immediately; the completion runs in the background.
+    With `db`, relevant catalog products are added to the prompt.
+    """
+    key = faq_key(question, locale)
+    if key is not None:
+        cached = answer_cache.get(key)
+        if cached is not None:
+            return AnswerStream.from_text(cached)
+    system = f"{system} (locale: {locale})"
+    if db is not None and key is None:
+        # FAQ questions are about store policy; products "matching" them are noise
+        context = product_context(db, question, locale)
+        if context:
+            system = f"{system}\n\n{context}"
+    turns = trim_history(list(history) + [{"role": "user", "content": question}])
+    if len(turns) > 1:
+        key = None  # the answer may depend on the earlier turns
+    messages = [{"role": "system", "content": system}] + turns
+    chunks = queue.Queue()
+    _executor.submit(_complete, messages, chunks, key)
+    return AnswerStream(chunks)
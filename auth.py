@@ -0,0 +1,140 @@
+"""
+Password hashing and login. bcrypt runs on a small bounded thread pool
+(bcrypt releases the GIL), so a burst of logins is capped at AUTH_WORKERS
+cores instead of taking every CPU the server has.
+"""
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+import bcrypt
+
+from models import User
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", str(AUTH_WORKERS * 8)))  # queued + running
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "10"))  # seconds
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+
+_executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="bcrypt")
+_pending = threading.BoundedSemaphore(AUTH_MAX_PENDING)
+
+
+class AuthBusy(Exception):
+    """Too many password hashes queued; the caller should retry shortly."""
+
+
+class LoginThrottled(Exception):
+    """Too many login attempts for this account in the current window."""
+
+
+def _run(fn, *args):
+    if not _pending.acquire(blocking=False):
+        raise AuthBusy("Too many sign-in requests, try again in a moment")
+    try:
+        future = _executor.submit(fn, *args)
+    except BaseException:
+        _pending.release()
+        raise
+    # the slot is held until the hash is done, not just until we stop waiting for it
+    future.add_done_callback(lambda _: _pending.release())
+    try:
+        return future.result(timeout=AUTH_TIMEOUT)
+    except FuturesTimeout:
+        future.cancel()  # drops it if still queued; a running hash finishes and then frees its slot
+        raise AuthBusy("Sign-in is taking too long, try again in a moment")
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+
+def _check(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+    except Exception:
+        return False
+
+
+def hash_password(password: str, rounds: int = None) -> str:
+    return _run(_hash, password, rounds or BCRYPT_ROUNDS)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return _run(_check, password, hashed)
+
+
+def hash_rounds(hashed: str) -> int:
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str) -> bool:
+    # only upgrades: lowering BCRYPT_ROUNDS must not weaken existing hashes
+    return hash_rounds(hashed) < BCRYPT_ROUNDS
+
+
+class LoginRateLimiter:
+    """Sliding window of login attempts per key (normalized email)."""
+
+    def __init__(self, max_attempts=LOGIN_MAX_ATTEMPTS, window=LOGIN_WINDOW_SECONDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str) -> bool:
+        """Record an attempt; False when the key is over its limit."""
+        now = time.monotonic()
+        with self._lock:
+            q = self._attempts.setdefault(key, deque())
+            while q and q[0] <= now - self.window:
+                q.popleft()
+            if len(q) >= self.max_attempts:
+                return False
+            q.append(now)
+            if len(self._attempts) > 10000:
+                self._prune(now)
+            return True
+
+    def reset(self, key: str):
+        with self._lock:
+            self._attempts.pop(key, None)
+
+    def _prune(self, now):
+        for k in [k for k, q in self._attempts.items() if not q or q[-1] <= now - self.window]:
+            del self._attempts[k]
+
+
+login_limiter = LoginRateLimiter()
+
+
+def authenticate(db, email: str, password: str):
+    """
+    Return the User for valid credentials, else None. Raises LoginThrottled or
+    AuthBusy. A hash made with a lower cost factor than BCRYPT_ROUNDS is
+    replaced on success, if the pool has room; the login succeeds either way.
+    """
+    key = (email or "").strip().lower()
+    if not login_limiter.hit(key):
+        raise LoginThrottled("Too many login attempts, try again later")
+    user = db.query(User).filter_by(email=email).first()
+    if not user or not verify_password(password, user.password_hash):
+        return None
+    login_limiter.reset(key)
+    if needs_rehash(user.password_hash):
+        try:
+            new_hash = hash_password(password)
+        except AuthBusy:
+            pass  # keep the old hash; a later login upgrades it
+        else:
+            user.password_hash = new_hash
+            db.add(user); db.commit()
+    return user
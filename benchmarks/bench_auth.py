@@ -0,0 +1,59 @@
+"""
+Login throughput at a few bcrypt cost factors, through the auth worker pool.
+
+    python benchmarks/bench_auth.py [--rounds 10 11 12] [--logins 64] [--clients 16]
+
+Prints one JSON line per cost factor.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+import auth  # noqa: E402
+
+
+def bench(rounds, logins, clients):
+    hashed = auth.hash_password("correct horse", rounds=rounds)
+    latencies = []
+    rejected = []
+
+    def one(_):
+        t0 = time.perf_counter()
+        try:
+            assert auth.verify_password("correct horse", hashed)
+        except auth.AuthBusy:
+            rejected.append(1)
+            return
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(logins)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rounds": rounds,
+        "logins": logins,
+        "clients": clients,
+        "auth_workers": auth.AUTH_WORKERS,
+        "rejected_busy": len(rejected),
+        "logins_per_s": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    ap.add_argument("--logins", type=int, default=64)
+    ap.add_argument("--clients", type=int, default=16)
+    args = ap.parse_args()
+    for r in args.rounds:
+        print(json.dumps(bench(r, args.logins, args.clients)))
@@ -0,0 +1,105 @@
+"""
+Bulk catalog import and export at scale.
+
+    python benchmarks/bench_catalog_io.py [--rows 1000000] [--chunk 2000] [--bad-every 1000] [--embeddings]
+
+Writes a CSV of that many product rows (one in --bad-every has an invalid
+price) to a temporary directory, imports it with catalog_io.import_products()
+into a throwaway SQLite database migrated to head, imports it a second time
+(every row is now an update), then exports all products back to CSV. Prints
+one JSON line with rows/s for each pass, the growth of the process's peak
+RSS during the first import and a check that the counts add up.
+Embeddings are skipped unless --embeddings is given (they need the
+embeddings API).
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_search import phrase  # noqa: E402
+
+
+def write_csv(path, n, bad_every, rng):
+    from catalog_io import PRODUCT_COLUMNS
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=PRODUCT_COLUMNS, extrasaction="ignore")
+        w.writeheader()
+        for i in range(n):
+            bad = bad_every and i % bad_every == bad_every - 1
+            w.writerow({"sku": f"SKU-{i:08d}", "title_en": phrase(rng, "en", 3), "title_hi": phrase(rng, "hi", 3),
+                        "description_en": phrase(rng, "en", 12),
+                        "price": "n/a" if bad else f"{rng.randint(100, 50000) / 100:.2f}",
+                        "currency": rng.choice(("USD", "INR")), "stock": rng.randint(0, 50)})
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000000)
+    ap.add_argument("--chunk", type=int, default=2000)
+    ap.add_argument("--bad-every", type=int, default=1000)
+    ap.add_argument("--embeddings", action="store_true")
+    args = ap.parse_args()
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench_catalog_io.db")
+    os.environ.setdefault("EMBEDDINGS_DIR", os.path.join(tmp, "embeddings"))
+
+    from sqlalchemy import func
+    from catalog_io import import_products, export_products
+    from db import migrate, session_scope
+    from models import Product, Vendor
+
+    migrate()
+    vendor_id = str(uuid.uuid4())
+    with session_scope() as db:
+        db.add(Vendor(id=vendor_id, name="bench vendor", status="APPROVED"))
+        db.commit()
+
+    path = os.path.join(tmp, "products.csv")
+    t0 = time.perf_counter()
+    write_csv(path, args.rows, args.bad_every, random.Random(42))
+    generate_s = time.perf_counter() - t0
+
+    def run_import():
+        with session_scope() as db, open(path, newline="", encoding="utf-8") as f:
+            t0 = time.perf_counter()
+            report = import_products(db, vendor_id, f, "csv", chunk_size=args.chunk, embed=args.embeddings)
+            return report, time.perf_counter() - t0
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    first, first_s = run_import()
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before  # KiB on Linux
+    second, second_s = run_import()
+
+    out_path = os.path.join(tmp, "export.csv")
+    with session_scope() as db, open(out_path, "w", newline="", encoding="utf-8") as out:
+        t0 = time.perf_counter()
+        exported = export_products(db, out, "csv", vendor_id=vendor_id)
+        export_s = time.perf_counter() - t0
+        stored, max_version = db.query(func.count(Product.id), func.max(Product.version)).one()
+
+    bad = args.rows // args.bad_every if args.bad_every else 0
+    good = args.rows - bad
+    print(json.dumps({
+        "rows": args.rows, "chunk": args.chunk, "embeddings": args.embeddings,
+        "csv_mb": round(os.path.getsize(path) / 2 ** 20, 1), "generate_s": round(generate_s, 1),
+        "import_s": round(first_s, 1), "import_rows_per_s": round(args.rows / first_s) if first_s else None,
+        "reimport_s": round(second_s, 1), "reimport_rows_per_s": round(args.rows / second_s) if second_s else None,
+        "export_s": round(export_s, 1), "export_rows_per_s": round(exported / export_s) if export_s else None,
+        "max_rss_growth_mb": round(rss_growth / 1024, 1),
+        "errors": first["errors_total"],
+        "counts_match": (first["created"] == good and second["updated"] == good and second["created"] == 0
+                         and first["errors_total"] == bad and stored == good == exported and max_version == 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
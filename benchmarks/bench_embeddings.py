@@ -0,0 +1,73 @@
+"""
+Assistant retrieval latency over synthetic multilingual products.
+
+    python benchmarks/bench_embeddings.py [--products 10000,100000] [--queries 500]
+
+For each catalog size, embeds that many products into a throwaway
+EmbeddingIndex (no database involved), then prints one JSON line with
+build time, index size on disk and p50/p99 top-5 query latency.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_search import WORDS, phrase, pct  # noqa: E402
+
+
+def run(n, queries, rng):
+    from embeddings import EmbeddingIndex, embed_product, search_similar_products
+
+    path = tempfile.mkdtemp(prefix="bench_embeddings_")
+    try:
+        index = EmbeddingIndex(path)
+        t0 = time.perf_counter()
+        batch = []
+        for _ in range(n):
+            p = SimpleNamespace(id=str(uuid.uuid4()),
+                                title={loc: phrase(rng, loc, 3) for loc in WORDS},
+                                description={loc: phrase(rng, loc, 12) for loc in WORDS})
+            batch.append((p.id, embed_product(p, index.dim)))
+            if len(batch) == 5000:
+                index.upsert_many(batch)
+                batch = []
+        if batch:
+            index.upsert_many(batch)
+        build_s = time.perf_counter() - t0
+
+        latencies = []
+        for _ in range(queries):
+            q = "do you have " + phrase(rng, rng.choice(list(WORDS)), 2)
+            t = time.perf_counter()
+            search_similar_products(q, k=5, index=index)
+            latencies.append((time.perf_counter() - t) * 1000)
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        return {
+            "products": n, "dim": index.dim, "build_s": round(build_s, 2),
+            "index_mb": round(size / 1e6, 1), "queries": queries,
+            "p50_ms": round(pct(latencies, 0.5), 2), "p99_ms": round(pct(latencies, 0.99), 2),
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", default="10000,100000")
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+    rng = random.Random(42)
+    for n in (int(x) for x in args.products.split(",")):
+        print(json.dumps(run(n, args.queries, rng)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+End-to-end load benchmark: Streamlit pages and the Stripe webhook on a
+seeded synthetic marketplace.
+
+    python benchmarks/bench_marketplace.py [--users 2000] [--vendors 100] [--products 10000]
+        [--orders 20000] [--cart-lines 3] [--page-runs 30] [--webhooks 500] [--clients 8]
+        [--no-page-cache] [--out report.json] [--compare baseline.json]
+
+Migrates a throwaway SQLite database (or uses DATABASE_URL if set) and seeds
+users, vendors, products in en/te/hi, carts, wishlists, addresses, orders
+(with vendor totals rebuilt) and PENDING checkouts, all from --seed so two
+runs see the same data. Then:
+
+  pages     runs app.py headlessly with streamlit.testing.v1.AppTest as
+            random customers, vendors and the admin, --page-runs times per page
+  webhooks  POSTs one signed checkout.session.completed per checkout to
+            /webhook from --clients threads (Stripe-Signature computed locally
+            with STRIPE_WEBHOOK_SECRET), then starts the inbox workers and
+            times how long they take to mark every checkout PAID
+
+Prints one JSON report: throughput, p50/p95/p99 latency and SQL statements
+per request for each step, and the process's peak RSS after each phase.
+--out also writes it to a file; --compare prints the change of every
+latency/throughput figure against an earlier report.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from bench_search import WORDS, phrase  # noqa: E402
+
+PAGES = ("home", "search", "checkout", "vendor_dashboard", "admin")
+WEBHOOK_SECRET = "whsec_bench"
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def peak_rss_mb():
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KiB on Linux
+
+
+def summarize(latencies, statements, elapsed, errors=0):
+    ms = lambda s: round(s * 1000, 2) if s is not None else None  # noqa: E731
+    return {
+        "requests": len(latencies), "errors": errors,
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(pct(latencies, 0.50)), "p95_ms": ms(pct(latencies, 0.95)), "p99_ms": ms(pct(latencies, 0.99)),
+        "queries_per_request": round(statements / len(latencies), 2) if latencies else None,
+    }
+
+
+class StatementCounter:
+    """Counts SQL statements sent through db.engine; take() returns the count so far and resets it."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            n, self.count = self.count, 0
+        return n
+
+
+# ------------------------------
+# Seeding
+# ------------------------------
+def _insert(conn, table, rows, batch=10000):
+    for i in range(0, len(rows), batch):
+        conn.execute(table.insert(), rows[i:i + batch])
+
+
+def seed(args, rng):
+    from db import engine, session_scope
+    from models import (User, Vendor, Product, ProductView, Address, CartItem, WishlistItem,
+                        Checkout, Order)
+    from product_views import SUPPORTED_LOCALES, build_view
+    from search import rebuild_search_index
+    from vendor_stats import rebuild_vendor_stats
+
+    now = datetime.utcnow()
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    owners = users[:args.vendors]
+    vendors = [str(uuid.uuid4()) for _ in owners]
+    products = []
+    for i in range(args.products):
+        products.append(Product(
+            id=str(uuid.uuid4()), vendor_id=rng.choice(vendors), version=1, stock=rng.randint(0, 50),
+            title={loc: phrase(rng, loc, 3) for loc in WORDS},
+            description={loc: phrase(rng, loc, 12) for loc in WORDS},
+            price_cents=rng.randint(100, 50000), currency=rng.choice(("USD", "INR")), images=[],
+            created_at=now - timedelta(seconds=rng.randint(0, 10 ** 7))))
+
+    def order_row(status, user_id, vendor_id, checkout_id=None):
+        items = [{"product_id": p.id, "qty": rng.randint(1, 3), "amount": p.price_cents}
+                 for p in rng.sample(products, rng.randint(1, 3))]
+        return {"id": str(uuid.uuid4()), "checkout_id": checkout_id, "user_id": user_id, "vendor_id": vendor_id,
+                "items": items, "total_cents": sum(it["amount"] * it["qty"] for it in items), "currency": "USD",
+                "status": status, "fulfillment": {"status": "QUEUED"} if status == "PAID" else None,
+                "created_at": now - timedelta(seconds=rng.randint(0, 30 * 86400))}
+
+    checkouts, checkout_orders = [], []
+    for _ in range(args.webhooks):
+        cid, uid = str(uuid.uuid4()), rng.choice(users)
+        children = [order_row("PENDING", uid, vid, cid) for vid in rng.sample(vendors, rng.randint(1, 2))]
+        checkout_orders += children
+        checkouts.append({"id": cid, "user_id": uid, "currency": "USD", "status": "PENDING",
+                          "total_cents": sum(o["total_cents"] for o in children), "created_at": now})
+
+    with engine.begin() as conn:
+        _insert(conn, User.__table__, [{"id": uid, "email": f"user{i}@example.com", "name": f"User {i}",
+                                        "password_hash": "x", "is_admin": i == 0} for i, uid in enumerate(users)])
+        _insert(conn, Vendor.__table__, [{"id": vid, "owner_id": uid, "name": f"store {i}", "status": "APPROVED"}
+                                         for i, (vid, uid) in enumerate(zip(vendors, owners))])
+        _insert(conn, Address.__table__, [{"id": str(uuid.uuid4()), "user_id": uid, "line1": "1 Main St",
+                                           "city": "Ranchi", "country": "IN"} for uid in users])
+        _insert(conn, Product.__table__, [{c.name: getattr(p, c.name) for c in Product.__table__.columns}
+                                          for p in products])
+        _insert(conn, ProductView.__table__, [dict(build_view(p, loc), locale=loc)
+                                              for p in products for loc in SUPPORTED_LOCALES])
+        for model, n in ((CartItem, args.cart_lines), (WishlistItem, 1)):
+            _insert(conn, model.__table__, [{"id": str(uuid.uuid4()), "user_id": uid, "product_id": p.id,
+                                             **({"qty": rng.randint(1, 3)} if model is CartItem else {})}
+                                            for uid in users for p in rng.sample(products, n)])
+        _insert(conn, Order.__table__, [order_row(rng.choice(("PAID", "SHIPPED", "PENDING")),
+                                                  rng.choice(users), rng.choice(vendors))
+                                        for _ in range(args.orders)])
+        _insert(conn, Checkout.__table__, checkouts)
+        _insert(conn, Order.__table__, checkout_orders)
+        conn.exec_driver_sql("ANALYZE")
+    with session_scope() as db:
+        rebuild_search_index(db)
+        rebuild_vendor_stats(db)
+    return {"users": users, "owners": owners, "checkouts": [c["id"] for c in checkouts]}
+
+
+# ------------------------------
+# Pages
+# ------------------------------
+def bench_pages(args, rng, data, counter):
+    from streamlit.testing.v1 import AppTest
+
+    script = os.path.join(ROOT, "app.py")
+    AppTest.from_file(script, default_timeout=120).run()  # warm-up: first run imports every module
+    results = {}
+    for page in PAGES:
+        latencies, errors, statements = [], 0, 0
+        started = time.perf_counter()
+        for _ in range(args.page_runs):
+            user_id = {"vendor_dashboard": rng.choice(data["owners"]), "admin": data["users"][0]}.get(
+                page, rng.choice(data["users"]))
+            at = AppTest.from_file(script, default_timeout=120)
+            at.session_state["user_id"] = user_id
+            at.session_state["user_is_admin"] = page == "admin"
+            at.session_state["page"] = "home" if page == "search" else page
+            if page == "search":
+                at.session_state["search_q"] = phrase(rng, rng.choice(list(WORDS)), 1)
+            counter.take()
+            t0 = time.perf_counter()
+            at.run()
+            latencies.append(time.perf_counter() - t0)
+            statements += counter.take()
+            errors += bool(at.exception)
+        results[page] = summarize(latencies, statements, time.perf_counter() - started, errors)
+    return results
+
+
+# ------------------------------
+# Webhooks
+# ------------------------------
+def sign(payload, secret=WEBHOOK_SECRET, timestamp=None):
+    """Stripe-Signature header value for payload (bytes), as Stripe computes it."""
+    timestamp = int(timestamp or time.time())
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={mac}"
+
+
+def checkout_completed(checkout_id):
+    return json.dumps({
+        "id": f"evt_{uuid.uuid4().hex}", "object": "event", "type": "checkout.session.completed",
+        "data": {"object": {"id": f"cs_{uuid.uuid4().hex}", "object": "checkout.session",
+                            "payment_status": "paid", "metadata": {"checkout_id": checkout_id}}},
+    }).encode()
+
+
+def bench_webhooks(args, data, counter):
+    import webhook
+    from sqlalchemy import func
+    from db import session_scope
+    from models import Checkout
+
+    client = webhook.app.test_client()
+    latencies, errors = [], []
+
+    def post(checkout_id):
+        payload = checkout_completed(checkout_id)
+        t0 = time.perf_counter()
+        resp = client.post("/webhook", data=payload,
+                           headers={"Stripe-Signature": sign(payload), "Content-Type": "application/json"})
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            errors.append(resp.status_code)
+
+    counter.take()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(post, data["checkouts"]))
+    post_s = time.perf_counter() - started
+    report = {"post": summarize(latencies, counter.take(), post_s, len(errors))}
+
+    started = time.perf_counter()
+    webhook.start_webhook_workers()
+    paid = 0
+    deadline = started + max(60, len(data["checkouts"]))
+    with session_scope() as db:
+        while time.perf_counter() < deadline:
+            paid = db.query(func.count(Checkout.id)).filter(Checkout.status == "PAID").scalar()
+            if paid >= len(data["checkouts"]):
+                break
+            db.rollback()
+            time.sleep(0.05)
+    drain_s = time.perf_counter() - started
+    webhook.stop_webhook_workers()
+    report["process"] = {
+        "events": len(data["checkouts"]), "paid": paid, "drain_s": round(drain_s, 2),
+        "throughput_per_s": round(paid / drain_s, 1) if drain_s else None,
+        "queries_per_event": round(counter.take() / paid, 2) if paid else None,  # includes the PAID polling above
+    }
+    return report
+
+
+# ------------------------------
+# Report
+# ------------------------------
+def compare(report, baseline, path=()):
+    """Yield (metric path, baseline, current, change %) for latency/throughput figures present in both."""
+    for key, value in report.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            yield from compare(value, old or {}, path + (key,))
+        elif (key.endswith("_ms") or key.startswith("throughput") or key.startswith("queries")) \
+                and isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            yield ".".join(path + (key,)), old, value, round((value - old) / old * 100, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--vendors", type=int, default=100)
+    ap.add_argument("--products", type=int, default=10000)
+    ap.add_argument("--orders", type=int, default=20000)
+    ap.add_argument("--cart-lines", type=int, default=3)
+    ap.add_argument("--page-runs", type=int, default=30)
+    ap.add_argument("--webhooks", type=int, default=500)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--no-page-cache", action="store_true")
+    ap.add_argument("--out")
+    ap.add_argument("--compare")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench_marketplace.db")
+    os.environ["STRIPE_WEBHOOK_SECRET"] = WEBHOOK_SECRET
+    os.environ["DISABLE_WEBHOOK_THREAD"] = "1"
+    os.environ.setdefault("EMBEDDINGS_DIR", os.path.join(tmp, "embeddings"))
+    os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(tmp, "media"))
+    if args.no_page_cache:
+        os.environ["PAGE_CACHE_TTL"] = "0"
+
+    import sqlalchemy
+    import streamlit
+    from db import engine, migrate
+
+    migrate()
+    rng = random.Random(args.seed)
+    t0 = time.perf_counter()
+    data = seed(args, rng)
+    report = {
+        "meta": {"revision": git_revision(), "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "sqlalchemy": sqlalchemy.__version__,
+                 "streamlit": streamlit.__version__, "database": engine.dialect.name,
+                 "page_cache": not args.no_page_cache,
+                 "scale": {k: getattr(args, k) for k in ("users", "vendors", "products", "orders", "cart_lines",
+                                                         "page_runs", "webhooks", "clients", "seed")}},
+        "seed": {"seconds": round(time.perf_counter() - t0, 1), "peak_rss_mb": peak_rss_mb()},
+    }
+    counter = StatementCounter(engine)
+    report["pages"] = bench_pages(args, rng, data, counter)
+    report["pages"]["peak_rss_mb"] = peak_rss_mb()
+    report["webhooks"] = bench_webhooks(args, data, counter)
+    report["webhooks"]["peak_rss_mb"] = peak_rss_mb()
+
+    print(json.dumps(report, indent=2, default=str))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for metric, old, new, change in compare(report, baseline):
+            print(f"{metric:45} {old:>10} -> {new:>10}  {change:+.1f}%", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Search latency over a synthetic multilingual catalog.
+
+    python benchmarks/bench_search.py [--products 100000] [--queries 500]
+
+Builds a throwaway SQLite database (or uses DATABASE_URL if set), indexes it
+with rebuild_search_index() and prints one JSON line with index build time
+and p50/p99 query latency.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+WORDS = {
+    "en": ["bamboo", "basket", "clay", "pot", "handwoven", "tribal", "painting", "jute", "bag",
+           "silver", "necklace", "wooden", "toy", "dokra", "brass", "lamp", "cotton", "saree", "mat", "honey"],
+    "te": ["వెదురు", "బుట్ట", "మట్టి", "కుండ", "చేతితో", "గిరిజన", "చిత్రం", "జనపనార", "సంచి", "వెండి"],
+    "hi": ["बाँस", "टोकरी", "मिट्टी", "घड़ा", "हस्तनिर्मित", "आदिवासी", "चित्र", "जूट", "थैला", "चाँदी"],
+}
+
+
+def phrase(rng, locale, n):
+    return " ".join(rng.choice(WORDS[locale]) for _ in range(n))
+
+
+def seed(n, rng):
+    from db import engine
+    from models import Product
+    now = datetime.utcnow()
+    rows = []
+    with engine.begin() as conn:
+        for i in range(n):
+            rows.append({
+                "id": str(uuid.uuid4()), "vendor_id": None, "version": 1, "stock": 10,
+                "title": {loc: phrase(rng, loc, 3) for loc in WORDS},
+                "description": {loc: phrase(rng, loc, 12) for loc in WORDS},
+                "price_cents": rng.randint(100, 10000), "currency": "USD", "images": [], "created_at": now,
+            })
+            if len(rows) == 5000:
+                conn.execute(Product.__table__.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(Product.__table__.insert(), rows)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_search.db")
+
+    from db import migrate, session_scope
+    import search
+
+    migrate()
+    rng = random.Random(42)
+    seed(args.products, rng)
+    t0 = time.perf_counter()
+    with session_scope() as db:
+        search.rebuild_search_index(db)
+    index_s = time.perf_counter() - t0
+
+    latencies = []
+    with session_scope() as db:
+        backend = "fts5" if search._use_fts(db) else "search_terms"
+        for _ in range(args.queries):
+            loc = rng.choice(list(WORDS))
+            q = phrase(rng, loc, rng.choice([1, 2]))
+            t0 = time.perf_counter()
+            search.search_products(db, q)
+            latencies.append(time.perf_counter() - t0)
+
+    print(json.dumps({
+        "backend": backend,
+        "products": args.products,
+        "queries": args.queries,
+        "index_build_s": round(index_s, 2),
+        "p50_ms": round(pct(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(pct(latencies, 0.99) * 1000, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
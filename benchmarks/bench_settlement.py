@@ -0,0 +1,86 @@
+"""
+Settlement of a large backlog of PENDING payouts.
+
+    python benchmarks/bench_settlement.py [--payouts 1000000] [--vendors 2000] [--chunk 10000]
+
+Seeds a throwaway SQLite database (or uses DATABASE_URL if set) with that
+many payouts spread over the vendors in two currencies, runs
+payouts.run_settlement() and prints one JSON line with the settle time,
+throughput, growth of the process's peak RSS during settlement and a check that the
+settlement totals match the payouts.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def seed(n, vendors, rng):
+    from db import engine
+    from models import Payout, Vendor
+    vendor_ids = [str(uuid.uuid4()) for _ in range(vendors)]
+    created = datetime.utcnow() - timedelta(minutes=1)
+    with engine.begin() as conn:
+        conn.execute(Vendor.__table__.insert(),
+                     [{"id": v, "name": f"vendor {i}", "status": "APPROVED"} for i, v in enumerate(vendor_ids)])
+        rows = []
+        for _ in range(n):
+            total = rng.randint(100, 50000)
+            rows.append({"id": str(uuid.uuid4()), "vendor_id": rng.choice(vendor_ids),
+                         "amount_cents": total - total // 10, "commission_cents": total // 10,
+                         "currency": rng.choice(("USD", "INR")), "status": "PENDING", "created_at": created})
+            if len(rows) == 20000:
+                conn.execute(Payout.__table__.insert(), rows)
+                rows = []
+        if rows:
+            conn.execute(Payout.__table__.insert(), rows)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--payouts", type=int, default=1000000)
+    ap.add_argument("--vendors", type=int, default=2000)
+    ap.add_argument("--chunk", type=int, default=10000)
+    args = ap.parse_args()
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_settlement.db")
+
+    from sqlalchemy import func
+    from db import migrate, session_scope
+    from models import Payout, Settlement
+    from payouts import run_settlement
+
+    migrate()
+    t0 = time.perf_counter()
+    seed(args.payouts, args.vendors, random.Random(42))
+    seed_s = time.perf_counter() - t0
+
+    with session_scope() as db:
+        expected = db.query(func.sum(Payout.amount_cents)).filter(Payout.status == "PENDING").scalar()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        run = run_settlement(db, chunk_size=args.chunk)
+        settle_s = time.perf_counter() - t0
+        rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before  # KiB on Linux
+        settled = db.query(func.sum(Settlement.amount_cents), func.count(Settlement.id)).filter(Settlement.run_id == run.id).one()
+        left = db.query(func.count(Payout.id)).filter(Payout.status != "SETTLED").scalar()
+
+    print(json.dumps({
+        "payouts": args.payouts, "vendors": args.vendors, "chunk": args.chunk,
+        "seed_s": round(seed_s, 1), "settle_s": round(settle_s, 1),
+        "payouts_per_s": round(run.payouts_settled / settle_s) if settle_s else None,
+        "max_rss_growth_mb": round(rss_growth / 1024, 1), "settlements": settled[1],
+        "totals_match": settled[0] == expected and run.payouts_settled == args.payouts and left == 0,
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Cold-start import time of each entry point, from python -X importtime.
+
+    python benchmarks/bench_startup.py [--runs 5] [--out startup.json] [--compare startup.json]
+        [--max-regression 25]
+
+Entry points:
+
+  webhook     what gunicorn loads (webhook:app)
+  app         the modules app.py imports at the top, i.e. what a Streamlit
+              worker loads before its first render (app.py itself is a
+              Streamlit script, so it is not imported directly)
+  catalog_io  the bulk import/export command line
+  payouts     the settlement command line (cron)
+
+Each one is imported --runs times in a fresh interpreter, after one warm-up
+run that leaves the bytecode cache in place. The report has the median
+total in ms, not counting interpreter startup, and the heaviest top-level
+packages of the median run.
+
+Stripe and OpenAI are imported on first use, and the webhook process never
+needs Pillow or numpy. An entry point that loads one of its LAZY modules
+anyway fails the run (exit 1). So does an entry point more than
+--max-regression percent slower than in the --compare report.
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+ALWAYS_LAZY = ("stripe", "openai")
+LAZY = {
+    "webhook": ALWAYS_LAZY + ("PIL", "numpy"),
+    "app": ALWAYS_LAZY,
+    "catalog_io": ALWAYS_LAZY,
+    "payouts": ALWAYS_LAZY + ("PIL",),
+}
+
+
+def app_imports():
+    """The modules app.py imports at module level."""
+    with open(os.path.join(ROOT, "app.py")) as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+def entry_points():
+    return {
+        "webhook": ["webhook"],
+        "app": app_imports(),
+        "catalog_io": ["catalog_io"],
+        "payouts": ["payouts"],
+    }
+
+
+def importtime(modules, env):
+    """[(name, depth, cumulative us)] for every import made by `import modules` in a fresh interpreter."""
+    code = "import " + ", ".join(modules) if modules else "pass"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{code!r} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+        stripped = name.lstrip(" ")
+        rows.append((stripped, (len(name) - len(stripped) - 1) // 2, int(cumulative)))
+    return rows
+
+
+def measure(modules, env, startup):
+    """(total ms, heaviest packages, loaded module names) for one run."""
+    rows = importtime(modules, env)
+    top = [(name, us) for name, depth, us in rows if depth == 0 and name not in startup]
+    packages = sorted(((name, us) for name, _, us in rows if "." not in name and name not in startup),
+                      key=lambda item: -item[1])
+    return (round(sum(us for _, us in top) / 1000, 1),
+            {name: round(us / 1000, 1) for name, us in packages[:8]},
+            {name for name, _, _ in rows})
+
+
+def bench(name, modules, runs, env, startup):
+    measure(modules, env, startup)  # warm-up: compiles anything not yet in __pycache__
+    results = sorted((measure(modules, env, startup) for _ in range(runs)), key=lambda r: r[0])
+    total_ms, heaviest, loaded = results[len(results) // 2]
+    eager = sorted(lazy for lazy in LAZY.get(name, ALWAYS_LAZY)
+                   if any(m == lazy or m.startswith(lazy + ".") for m in loaded))
+    return {"import_ms": total_ms, "min_ms": results[0][0], "max_ms": results[-1][0],
+            "modules": len(loaded), "heaviest_ms": heaviest, "eager_lazy_modules": eager}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--out")
+    ap.add_argument("--compare")
+    ap.add_argument("--max-regression", type=float, default=25.0, help="percent, against --compare")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench_startup.db"),
+               DISABLE_WEBHOOK_THREAD="1", EMBEDDINGS_DIR=os.path.join(tmp, "embeddings"),
+               IMAGE_STORE_DIR=os.path.join(tmp, "media"))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    startup = {name for name, _, _ in importtime([], env)}  # what the bare interpreter loads
+
+    report = {"meta": {"python": platform.python_version(), "runs": args.runs}}
+    for name, modules in entry_points().items():
+        report[name] = bench(name, modules, args.runs, env, startup)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failed = [f"{name}: loads {', '.join(result['eager_lazy_modules'])} at import"
+              for name, result in report.items() if result.get("eager_lazy_modules")]
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, result in report.items():
+            old = (baseline.get(name) or {}).get("import_ms")
+            if "import_ms" not in result or not old:
+                continue
+            change = round((result["import_ms"] - old) / old * 100, 1)
+            print(f"{name:12} {old:>8} ms -> {result['import_ms']:>8} ms  {change:+.1f}%", file=sys.stderr)
+            if change > args.max_regression:
+                failed.append(f"{name}: {change:+.1f}% import time")
+    for problem in failed:
+        print(problem, file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
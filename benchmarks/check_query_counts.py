@@ -0,0 +1,156 @@
+"""
+Check that the cart, wishlist and checkout pages send a fixed number of SQL
+statements, however many lines the cart and wishlist hold.
+
+    python benchmarks/check_query_counts.py [--lines 50] [--small 5]
+
+Migrates a throwaway SQLite database to head and seeds one customer per page
+and size: --small or --lines cart lines, as many wishlist entries, and an
+address, each on products of their own. The page cache is off
+(PAGE_CACHE_TTL=0) so every run loads from the database. Each of the home
+page (sidebar cart and wishlist) and the checkout page is run through
+AppTest twice per customer, in a new session each time:
+- cold: the first run, when none of the customer's products are in the
+  product view cache
+- warm: the second run
+Prints one JSON line per page and cache state, and exits 1 if a page sends
+more statements for the bigger cart than for the small one, or raises.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PAGES = ("home", "checkout")
+CATALOG_PRODUCTS = 100
+
+
+class StatementCounter:
+    """Counts SQL statements sent through db.engine; take() returns the count so far and resets it."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def take(self):
+        with self._lock:
+            n, self.count = self.count, 0
+        return n
+
+
+def _insert(conn, table, rows):
+    if rows:
+        conn.execute(table.insert(), rows)
+
+
+def seed(sizes):
+    """{(page, size): user_id}, each customer with size cart lines and size wishlist entries."""
+    from db import engine
+    from models import User, Vendor, Product, ProductView, Address, CartItem, WishlistItem
+    from product_views import SUPPORTED_LOCALES, build_view
+
+    now = datetime.utcnow()
+    owner = {"id": str(uuid.uuid4()), "email": "owner@example.com", "password_hash": "x"}
+    vendor = {"id": str(uuid.uuid4()), "owner_id": owner["id"], "name": "store", "status": "APPROVED"}
+    # the home grid shows these, newer than every customer's products, so no run warms another's views
+    products = [{"id": str(uuid.uuid4()), "vendor_id": vendor["id"], "version": 1, "stock": 10,
+                 "title": {"en": f"catalog product {i}"}, "description": {"en": ""}, "images": [],
+                 "price_cents": 100, "currency": "USD", "created_at": now - timedelta(seconds=i)}
+                for i in range(CATALOG_PRODUCTS)]
+    users, customers, carts, wishlists, addresses = [owner], {}, [], [], []
+    for page in PAGES:
+        for size in sizes:
+            uid = str(uuid.uuid4())
+            users.append({"id": uid, "email": f"{page}{size}@example.com", "password_hash": "x"})
+            customers[page, size] = uid
+            addresses.append({"id": str(uuid.uuid4()), "user_id": uid, "line1": "1 Main St", "city": "Ranchi",
+                              "country": "IN", "is_default": True})
+            for i in range(2 * size):
+                pid = str(uuid.uuid4())
+                products.append({"id": pid, "vendor_id": vendor["id"], "version": 1, "stock": 10,
+                                 "title": {"en": f"{page} {size} product {i}"}, "description": {"en": ""},
+                                 "images": [], "price_cents": 100 + i, "currency": ("USD", "INR")[i % 2],
+                                 "created_at": now - timedelta(days=1, seconds=len(products))})
+                line = {"id": str(uuid.uuid4()), "user_id": uid, "product_id": pid}
+                if i < size:
+                    carts.append(dict(line, qty=1 + i % 3))
+                else:
+                    wishlists.append(line)
+
+    class Row:
+        def __init__(self, values):
+            self.__dict__.update(values)
+
+    with engine.begin() as conn:
+        _insert(conn, User.__table__, users)
+        _insert(conn, Vendor.__table__, [vendor])
+        _insert(conn, Address.__table__, addresses)
+        _insert(conn, Product.__table__, products)
+        _insert(conn, ProductView.__table__, [dict(build_view(Row(p), loc), locale=loc)
+                                              for p in products for loc in SUPPORTED_LOCALES])
+        _insert(conn, CartItem.__table__, carts)
+        _insert(conn, WishlistItem.__table__, wishlists)
+    return customers
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=50)
+    ap.add_argument("--small", type=int, default=5)
+    args = ap.parse_args()
+    sizes = (args.small, args.lines)
+
+    os.environ.update({
+        "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check_query_counts.db"),
+        "PAGE_CACHE_TTL": "0", "DISABLE_WEBHOOK_THREAD": "1", "RATES_SOURCE": "static",
+    })
+    from streamlit.testing.v1 import AppTest
+    from db import engine, migrate
+
+    migrate()
+    customers = seed(sizes)
+    counter = StatementCounter(engine)
+    script = os.path.join(ROOT, "app.py")
+    AppTest.from_file(script, default_timeout=120).run()  # warm-up: imports, and the catalog's views
+
+    counts, errors = {}, {}
+    for (page, size), user_id in customers.items():
+        for cache in ("cold", "warm"):
+            # a new session each time; the product view cache is per process, so the second run is warm
+            at = AppTest.from_file(script, default_timeout=120)
+            at.session_state["user_id"] = user_id
+            at.session_state["page"] = page
+            counter.take()
+            at.run()
+            counts[page, cache, size] = counter.take()
+            if at.exception:
+                errors[page, cache, size] = at.exception[0].value
+
+    failed = 0
+    for page in PAGES:
+        for cache in ("cold", "warm"):
+            small, large = (counts[page, cache, size] for size in sizes)
+            page_errors = [errors[k] for k in ((page, cache, size) for size in sizes) if k in errors]
+            ok = large <= small and not page_errors
+            failed += not ok
+            print(json.dumps({"page": page, "cache": cache, "ok": ok,
+                              "statements": {str(size): counts[page, cache, size] for size in sizes},
+                              "errors": page_errors}))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
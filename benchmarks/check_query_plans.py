@@ -0,0 +1,172 @@
+"""
+Check that every list-page query is answered from an index.
+
+    python benchmarks/check_query_plans.py [--products 100000] [--orders 200000] [--users 20000]
+
+Migrates a throwaway SQLite database to head (so the indexes checked are the
+ones the migrations create), seeds it, runs ANALYZE, then runs each query in
+queries.py while capturing the SQL it sends and asks SQLite for its plan. A
+plan fails if it scans a table without an index ("SCAN orders") or sorts in a
+temporary B-tree. Prints one JSON line per query and exits 1 on any failure.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def _insert(conn, table, rows, batch=20000):
+    for i in range(0, len(rows), batch):
+        conn.execute(table.insert(), rows[i:i + batch])
+
+
+def seed(products, orders, users, rng):
+    from db import engine
+    from models import User, Vendor, Product, Address, CartItem, WishlistItem, Order
+    now = datetime.utcnow()
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    vendors = [{"id": str(uuid.uuid4()), "owner_id": uid, "name": f"store {i}",
+                "status": rng.choice(("APPROVED", "APPROVED", "APPROVED", "PENDING", "REJECTED"))}
+               for i, uid in enumerate(user_ids[:max(1, users // 20)])]
+    product_ids = [str(uuid.uuid4()) for _ in range(products)]
+    with engine.begin() as conn:
+        _insert(conn, User.__table__, [{"id": uid, "email": f"user{i}@example.com", "password_hash": "x"}
+                                       for i, uid in enumerate(user_ids)])
+        _insert(conn, Vendor.__table__, vendors)
+        _insert(conn, Address.__table__, [{"id": str(uuid.uuid4()), "user_id": uid, "line1": "1 Main St",
+                                           "city": "Ranchi", "country": "IN"} for uid in user_ids])
+        _insert(conn, Product.__table__, [
+            {"id": pid, "vendor_id": rng.choice(vendors)["id"], "version": 1, "stock": rng.randint(0, 20),
+             "title": {"en": f"product {i}"}, "description": {"en": ""}, "images": [],
+             "price_cents": rng.randint(100, 50000), "currency": rng.choice(("USD", "INR")),
+             "created_at": now - timedelta(seconds=rng.randint(0, 10 ** 7))}
+            for i, pid in enumerate(product_ids)])
+        _insert(conn, Order.__table__, [
+            {"id": str(uuid.uuid4()), "user_id": rng.choice(user_ids), "vendor_id": rng.choice(vendors)["id"],
+             "items": [], "total_cents": rng.randint(100, 50000), "currency": "USD",
+             "status": rng.choice(("PENDING", "PAID", "SHIPPED")),
+             "created_at": now - timedelta(seconds=rng.randint(0, 10 ** 7))}
+            for _ in range(orders)])
+        for model in (CartItem, WishlistItem):
+            lines = {(rng.choice(user_ids), rng.choice(product_ids)) for _ in range(users * 3)}
+            _insert(conn, model.__table__, [{"id": str(uuid.uuid4()), "user_id": u, "product_id": p}
+                                            for u, p in lines])
+        conn.exec_driver_sql("ANALYZE")
+    return user_ids, vendors
+
+
+def bad_plan_lines(plan):
+    """Plan rows that read a whole table or sort outside an index."""
+    bad = []
+    for detail in plan:
+        words = detail.split()
+        if words[:1] == ["SCAN"] and len(words) == 2:
+            bad.append(detail)  # "SCAN orders": full table scan, no index at all
+        elif "TEMP B-TREE" in detail:
+            bad.append(detail)
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--products", type=int, default=100000)
+    ap.add_argument("--orders", type=int, default=200000)
+    ap.add_argument("--users", type=int, default=20000)
+    args = ap.parse_args()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check_query_plans.db")
+
+    from sqlalchemy import event
+    from db import engine, migrate, session_scope
+    from models import User, Vendor, Order
+    import queries
+
+    migrate()
+    rng = random.Random(42)
+    user_ids, vendors = seed(args.products, args.orders, args.users, rng)
+    vendor_id = next(v["id"] for v in vendors if v["status"] == "APPROVED")
+    user_id = user_ids[0]
+
+    def catalog_next(db):
+        return queries.query_catalog(db, after=queries.query_catalog(db)[1])
+
+    def catalog_prev(db):
+        page2 = queries.query_catalog(db, after=queries.query_catalog(db)[1])
+        return queries.query_catalog(db, before=page2[2])
+
+    def vendor_orders_next(db):
+        return queries.query_vendor_orders(db, vendor_id, after=queries.query_vendor_orders(db, vendor_id)[1])
+
+    def vendor_products_next(db):
+        return queries.query_vendor_products(db, vendor_id, after=queries.query_vendor_products(db, vendor_id)[1])
+
+    def admin_orders_next(db):
+        return queries.search_orders(db, status="PAID", after=queries.search_orders(db, status="PAID")[1])
+
+    week = (datetime.utcnow() - timedelta(days=7)).date(), datetime.utcnow().date()
+
+    checks = {
+        "catalog": lambda db: queries.query_catalog(db),
+        "catalog_next_page": catalog_next,
+        "catalog_prev_page": catalog_prev,
+        "catalog_by_vendor": lambda db: queries.query_catalog(db, vendor_id=vendor_id),
+        "catalog_in_stock_usd": lambda db: queries.query_catalog(db, in_stock=True, currency="USD"),
+        "vendor_orders": lambda db: queries.query_vendor_orders(db, vendor_id),
+        "vendor_orders_next_page": vendor_orders_next,
+        "vendor_products": lambda db: queries.query_vendor_products(db, vendor_id),
+        "vendor_products_next_page": vendor_products_next,
+        "cart_lines": lambda db: queries.load_cart_lines(db, user_id),
+        "wishlist_lines": lambda db: queries.load_wishlist_lines(db, user_id),
+        "vendor_applications": queries.vendor_applications,
+        "approved_vendor_names": queries.approved_vendor_names,
+        "admin_orders": queries.search_orders,
+        "admin_orders_next_page": admin_orders_next,
+        "admin_orders_by_status": lambda db: queries.search_orders(db, status="SHIPPED"),
+        "admin_orders_by_vendor": lambda db: queries.search_orders(db, vendor_id=vendor_id),
+        "admin_orders_by_customer": lambda db: queries.search_orders(db, user_id=user_id),
+        "admin_orders_last_week": lambda db: queries.search_orders(db, created_from=week[0], created_to=week[1]),
+        "admin_orders_by_status_last_week": lambda db: queries.search_orders(db, status="PAID", created_from=week[0],
+                                                                             created_to=week[1]),
+        "admin_order_by_id": lambda db: queries.search_orders(db, order_id="x"),
+        "admin_find_user": lambda db: queries.find_user_id(db, "user1@example.com"),
+        "order_status_counts": lambda db: queries.status_counts(db, Order),
+        "vendor_status_counts": lambda db: queries.status_counts(db, Vendor),
+        "user_addresses": lambda db: db.get(User, user_id).addresses,
+        "user_vendor": lambda db: db.get(User, vendors[0]["owner_id"]).vendor,
+    }
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failed = 0
+    for name, run in checks.items():
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            with session_scope() as db:
+                run(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        plans = []
+        with engine.connect() as conn:
+            for statement, parameters in captured:
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+                plans.append([row[-1] for row in rows])
+        bad = [line for plan in plans for line in bad_plan_lines(plan)]
+        failed += bool(bad)
+        print(json.dumps({"query": name, "ok": not bad, "statements": len(plans), "bad": bad,
+                          "plan": plans if bad else None}))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Check that many buyers paying for one SKU at once never oversell it.
+
+    python benchmarks/check_stock_race.py [--stock 100] [--buyers 300] [--clients 16]
+        [--database-url URL]
+
+Migrates a throwaway SQLite database to head (or the empty database at
+--database-url, e.g. PostgreSQL, where the writers really overlap) and
+seeds one product with --stock units. Each of --buyers customers gets a
+pending checkout for 1-3 units of it, more than the stock in total. Every
+checkout is then finalized twice, as a duplicate webhook delivery would,
+by --clients threads at once, each with its own session. A finalize that
+hits a lock error is retried, as the webhook inbox would.
+
+Prints one JSON line and exits 1 unless:
+- the final stock is not negative
+- stock taken equals the units of the QUEUED orders
+- QUEUED plus OVERSOLD units equal the demand
+- every checkout and order is PAID, with exactly one payout per order
+- each checkout was claimed by exactly one of its two finalizes
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+MAX_ATTEMPTS = 20
+
+
+def seed(stock, buyers, rng):
+    """(product_id, [checkout_id, ...], total units demanded)."""
+    from checkout import create_checkout
+    from db import session_scope
+    from models import User, Vendor, Product
+
+    with session_scope() as db:
+        owner = User(id=str(uuid.uuid4()), email="owner@example.com", password_hash="x")
+        vendor = Vendor(id=str(uuid.uuid4()), owner_id=owner.id, name="store", status="APPROVED")
+        product = Product(id=str(uuid.uuid4()), vendor_id=vendor.id, title={"en": "last few"},
+                          description={"en": ""}, images=[], price_cents=500, currency="USD", stock=stock)
+        customers = [User(id=str(uuid.uuid4()), email=f"buyer{i}@example.com", password_hash="x")
+                     for i in range(buyers)]
+        db.add_all([owner, vendor, product, *customers])
+        db.commit()
+        checkouts, demand = [], 0
+        for customer in customers:
+            qty = rng.randint(1, 3)
+            demand += qty
+            line = {"product_id": product.id, "vendor_id": vendor.id, "qty": qty, "amount": 500}
+            checkouts.append(create_checkout(db, customer.id, [line], "USD").id)
+        return product.id, checkouts, demand
+
+
+def finalize(checkout_id):
+    """(claimed, retries) for one delivery of checkout_id's payment."""
+    from sqlalchemy.exc import OperationalError
+    from db import session_scope
+    from webhook import finalize_paid_checkout
+
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with session_scope() as db:
+                return finalize_paid_checkout(db, checkout_id, {"source": "check_stock_race"}), attempt
+        except OperationalError:
+            time.sleep(0.01 * (attempt + 1))  # "database is locked" / serialization failure
+    raise RuntimeError(f"checkout {checkout_id} still failing after {MAX_ATTEMPTS} attempts")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--stock", type=int, default=100)
+    ap.add_argument("--buyers", type=int, default=300)
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--database-url")
+    args = ap.parse_args()
+
+    os.environ.update({
+        "DATABASE_URL": args.database_url
+        or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check_stock_race.db"),
+        "PAGE_CACHE_TTL": "0", "DISABLE_WEBHOOK_THREAD": "1",
+        "DB_POOL_SIZE": str(args.clients), "DB_MAX_OVERFLOW": "0",
+    })
+    from db import migrate, session_scope
+    from models import Checkout, Order, Payout, Product
+    from vendor_stats import order_units
+
+    migrate()
+    logging.getLogger("webhook").setLevel(logging.ERROR)  # every late buyer logs an oversold warning
+    product_id, checkouts, demand = seed(args.stock, args.buyers, random.Random(args.seed))
+    deliveries = checkouts * 2
+    random.Random(args.seed).shuffle(deliveries)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(finalize, deliveries))
+    elapsed = time.perf_counter() - started
+
+    claims = {}
+    for checkout_id, (claimed, _) in zip(deliveries, results):
+        claims[checkout_id] = claims.get(checkout_id, 0) + claimed
+    with session_scope() as db:
+        stock = db.get(Product, product_id).stock
+        orders = db.query(Order).all()
+        units = {"QUEUED": 0, "OVERSOLD": 0}
+        for order in orders:
+            status = (order.fulfillment or {}).get("status")
+            units[status] = units.get(status, 0) + order_units(order).get(product_id, 0)
+        unpaid = (db.query(Checkout).filter(Checkout.status != "PAID").count()
+                  + db.query(Order).filter(Order.status != "PAID").count())
+        payouts = db.query(Payout.order_id).all()
+
+    problems = []
+    if stock < 0:
+        problems.append(f"stock went negative: {stock}")
+    if args.stock - stock != units["QUEUED"]:
+        problems.append(f"{args.stock - stock} units left stock but QUEUED orders hold {units['QUEUED']}")
+    if units["QUEUED"] + units["OVERSOLD"] != demand:
+        problems.append(f"QUEUED {units['QUEUED']} + OVERSOLD {units['OVERSOLD']} != demand {demand}")
+    if unpaid:
+        problems.append(f"{unpaid} checkouts/orders not PAID")
+    if len(payouts) != len(orders) or len({p.order_id for p in payouts}) != len(orders):
+        problems.append(f"{len(payouts)} payouts for {len(orders)} orders")
+    bad_claims = sum(1 for n in claims.values() if n != 1)
+    if bad_claims:
+        problems.append(f"{bad_claims} checkouts not claimed exactly once")
+
+    print(json.dumps({"ok": not problems, "stock_start": args.stock, "stock_end": stock, "demand": demand,
+                      "units": units, "checkouts": len(checkouts), "deliveries": len(deliveries),
+                      "retries": sum(retries for _, retries in results), "seconds": round(elapsed, 2),
+                      "problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Check stripe_gateway against fixtures/stripe_stub.py: idempotent session
+creation, retries, timeouts and the background create-and-poll flow.
+
+    python benchmarks/check_stripe_gateway.py [--checkouts 40]
+
+Starts the stub in-process on a free port, points STRIPE_API_BASE at it,
+uses a throwaway SQLite database migrated to head, and runs:
+- double_start: Place Order clicked twice. One Stripe session results, and
+  its URL is saved on the checkout.
+- replay: a later create for the same checkout gets the same session back.
+- retry: the first 2 attempts fail with a 500 and the third succeeds.
+- give_up: every attempt fails, and the poll reports the error.
+- timeout: a stub slower than STRIPE_READ_TIMEOUT fails within the
+  timeouts-times-attempts bound.
+- concurrent: --checkouts created at once, each with exactly one session.
+Prints one JSON line per check and exits 1 on any failure.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--checkouts", type=int, default=40)
+    args = ap.parse_args()
+
+    from werkzeug.serving import make_server
+    from fixtures.stripe_stub import app as stub, _stats
+
+    server = make_server("127.0.0.1", 0, stub, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ.update({
+        "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "check_stripe_gateway.db"),
+        "STRIPE_SECRET_KEY": "sk_test_stub", "STRIPE_API_BASE": f"http://127.0.0.1:{server.port}",
+        "STRIPE_CONNECT_TIMEOUT": "1", "STRIPE_READ_TIMEOUT": "0.5", "STRIPE_MAX_RETRIES": "2",
+    })
+
+    from checkout import create_checkout
+    from db import migrate, session_scope
+    from models import Checkout
+    import stripe_gateway as gw
+
+    migrate()
+    items = [{"name": "bamboo basket", "unit_amount": 1250, "quantity": 2}]
+
+    def new_checkout():
+        with session_scope() as db:
+            return create_checkout(db, "user-1", [{"product_id": "p1", "vendor_id": "v1", "qty": 2, "amount": 1250}],
+                                   "USD").id
+
+    def wait(checkout_id, limit=30):
+        deadline = time.monotonic() + limit
+        while time.monotonic() < deadline:
+            state, value = gw.checkout_session_status(checkout_id)
+            if state != "pending":
+                return state, value
+            time.sleep(0.02)
+        return "pending", None
+
+    def created():
+        return _stats["sessions_created"]
+
+    def stub_config(delay=0.0, fail_first=0):
+        stub.config.update(DELAY=delay, FAIL_FIRST=fail_first)
+
+    def double_start():
+        before, cid = created(), new_checkout()
+        gw.start_checkout_session(cid, items)
+        gw.start_checkout_session(cid, items)
+        state, url = wait(cid)
+        with session_scope() as db:
+            saved = (db.get(Checkout, cid).payment_metadata or {}).get("url")
+        return state == "ready" and created() - before == 1 and saved == url, {"state": state}
+
+    def replay():
+        cid = new_checkout()
+        first = gw.create_checkout_session(cid, items)
+        replays, before = _stats["idempotent_replays"], created()
+        second = gw.create_checkout_session(cid, items)
+        return (first["id"] == second["id"] and created() == before
+                and _stats["idempotent_replays"] == replays + 1), {"session": first["id"]}
+
+    def retry():
+        stub_config(fail_first=2)
+        try:
+            injected, cid = _stats["failures_injected"], new_checkout()
+            t0 = time.perf_counter()
+            gw.start_checkout_session(cid, items)
+            state, _ = wait(cid)
+        finally:
+            stub_config()
+        return state == "ready" and _stats["failures_injected"] - injected == 2, {
+            "state": state, "seconds": round(time.perf_counter() - t0, 2)}
+
+    def give_up():
+        stub_config(fail_first=99)
+        try:
+            cid = new_checkout()
+            gw.start_checkout_session(cid, items)
+            state, message = wait(cid)
+        finally:
+            stub_config()
+        return state == "failed", {"state": state, "message": message}
+
+    def timeout():
+        stub_config(delay=gw.STRIPE_READ_TIMEOUT + 0.5)
+        try:
+            cid = new_checkout()
+            t0 = time.perf_counter()
+            gw.start_checkout_session(cid, items)
+            state, message = wait(cid)
+            seconds = time.perf_counter() - t0
+        finally:
+            stub_config()
+        # each attempt gives up after the read timeout; backoff between attempts is at most 1s and 2s here
+        bound = (gw.STRIPE_MAX_RETRIES + 1) * gw.STRIPE_READ_TIMEOUT + 3 + 1
+        return state == "failed" and seconds < bound, {"state": state, "seconds": round(seconds, 2),
+                                                       "bound": bound, "message": message}
+
+    def concurrent():
+        before = created()
+        ids = [new_checkout() for _ in range(args.checkouts)]
+        t0 = time.perf_counter()
+        for cid in ids:
+            gw.start_checkout_session(cid, items)
+            gw.start_checkout_session(cid, items)
+        states = [wait(cid)[0] for cid in ids]
+        seconds = time.perf_counter() - t0
+        return states.count("ready") == len(ids) and created() - before == len(ids), {
+            "checkouts": len(ids), "seconds": round(seconds, 2), "workers": gw.STRIPE_WORKERS}
+
+    failed = 0
+    for check in (double_start, replay, retry, give_up, timeout, concurrent):
+        ok, detail = check()
+        failed += not ok
+        print(json.dumps(dict({"check": check.__name__, "ok": ok}, **detail)))
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
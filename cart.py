@@ -0,0 +1,58 @@
+"""
+Cart and wishlist writes. A user has at most one cart line and one wishlist
+entry per product (unique on (user_id, product_id), see migration 0002), so
+adding again bumps the quantity instead of appending a row. Each operation is
+a single statement where the dialect has INSERT ... ON CONFLICT, and none of
+them commit: the caller's transaction decides. The user's cached cart and
+wishlist (page_cache) are dropped when it commits.
+"""
+from sqlalchemy import select, literal
+
+from db import increment, upsert_insert
+from models import CartItem, WishlistItem
+from page_cache import invalidate_on_commit, user_scope
+
+
+def add_to_cart(db, user_id, product_id, qty=1):
+    """Add qty of a product to the user's cart, merging with an existing line."""
+    invalidate_on_commit(db, user_scope(user_id))
+    increment(db, CartItem, {"user_id": user_id, "product_id": product_id}, {"qty": qty})
+
+
+def add_to_wishlist(db, user_id, product_id):
+    """Wishlist a product; a product already on the wishlist is left as is."""
+    invalidate_on_commit(db, user_scope(user_id))
+    insert = upsert_insert(db)
+    if insert is not None:
+        db.execute(insert(WishlistItem.__table__).values(user_id=user_id, product_id=product_id)
+                   .on_conflict_do_nothing(index_elements=["user_id", "product_id"]))
+    elif not db.query(WishlistItem.id).filter_by(user_id=user_id, product_id=product_id).first():
+        db.add(WishlistItem(user_id=user_id, product_id=product_id))
+
+
+def clear_cart(db, user_id, product_ids=None):
+    """Delete the user's cart lines (only those for product_ids, if given). Returns how many."""
+    invalidate_on_commit(db, user_scope(user_id))
+    q = db.query(CartItem).filter(CartItem.user_id == user_id)
+    if product_ids is not None:
+        q = q.filter(CartItem.product_id.in_(list(product_ids)))
+    return q.delete(synchronize_session=False)
+
+
+def move_wishlist_to_cart(db, user_id):
+    """Put one of every wishlisted product in the cart and empty the wishlist. Returns how many moved."""
+    invalidate_on_commit(db, user_scope(user_id))
+    cart = CartItem.__table__
+    wished = (select(WishlistItem.id, WishlistItem.user_id, WishlistItem.product_id, literal(1))
+              .where(WishlistItem.user_id == user_id))
+    insert = upsert_insert(db)
+    if insert is not None:
+        # the wishlist row's id becomes the new cart line's id: unique, and the wishlist row goes away
+        stmt = insert(cart).from_select(["id", "user_id", "product_id", "qty"], wished)
+        db.execute(stmt.on_conflict_do_update(index_elements=["user_id", "product_id"],
+                                              set_={"qty": cart.c.qty + stmt.excluded.qty}))
+    else:
+        for _, uid, pid, qty in db.execute(wished).all():
+            add_to_cart(db, uid, pid, qty)
+    return (db.query(WishlistItem).filter(WishlistItem.user_id == user_id)
+            .delete(synchronize_session=False))
@@ -0,0 +1,395 @@
+"""
+Bulk catalog import and export, as CSV or JSON Lines, for vendors
+onboarding thousands of SKUs and for admins.
+
+Import reads the file one row at a time, so memory stays flat however large
+it is, and validates each row. Bad rows are reported with their line number
+and skipped. Good rows are written IMPORT_CHUNK at a time, one transaction
+per chunk:
+- one INSERT ... ON CONFLICT (vendor_id, sku) DO UPDATE executemany for the
+  products
+- their product_views rows and search entries, in bulk
+An existing SKU is updated and its version bumped, so an interrupted import
+is finished by running it again.
+
+Columns (the CSV header, or keys in JSONL):
+
+    sku                                  required, unique per vendor
+    title_en, title_te, title_hi         title_en required; JSONL may send "title": {"en": ...}
+    description_en, description_te, ...  JSONL may send "description": {...}
+    price                                in currency units, e.g. 12.50 (or price_cents)
+    currency                             default USD; one the exchange rates cover (rates.py)
+    stock                                default 0
+    images                               image ids or http(s) URLs: "|"-separated in CSV, a list in JSONL
+
+Exports stream products or orders, oldest first, in the same formats. A
+product export can be imported again.
+
+    python catalog_io.py import VENDOR_ID products.csv [--no-embeddings]
+    python catalog_io.py export products|orders [--vendor VENDOR_ID] [--format jsonl] [-o FILE]
+"""
+import os
+import csv
+import sys
+import json
+import uuid
+import logging
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy import tuple_
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.orm import load_only
+
+from db import upsert_insert
+from embeddings import embed_product, embedding_index
+from images import is_image_ref
+from models import Product, Order
+from page_cache import CATALOG, invalidate_on_commit, vendor_scope
+from product_views import SUPPORTED_LOCALES, sync_product_views_many
+from rates import rate_provider
+from search import index_products
+
+IMPORT_CHUNK = int(os.getenv("IMPORT_CHUNK", "2000"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))  # row errors kept in the report; all are counted
+EXPORT_CHUNK = int(os.getenv("EXPORT_CHUNK", "5000"))
+FORMATS = ("csv", "jsonl")
+SKU_MAX_LENGTH = 64
+
+PRODUCT_COLUMNS = (["sku"] + [f"title_{loc}" for loc in SUPPORTED_LOCALES]
+                   + [f"description_{loc}" for loc in SUPPORTED_LOCALES]
+                   + ["price", "currency", "stock", "images", "id"])
+ORDER_COLUMNS = ["id", "checkout_id", "vendor_id", "user_id", "status", "fulfillment_status",
+                 "total_cents", "currency", "created_at", "items"]
+_UPDATED_COLUMNS = ("title", "description", "price_cents", "currency", "stock", "images")
+
+log = logging.getLogger("catalog_io")
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+# ------------------------------
+# Import
+# ------------------------------
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:  # the reader resumes on the next line
+            yield reader.reader.line_num, None, f"not valid CSV: {e}"
+            continue
+        yield reader.line_num, row, None
+
+
+def _jsonl_rows(stream):
+    for n, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield n, None, f"not valid JSON: {e}"
+            continue
+        if isinstance(row, dict):
+            yield n, row, None
+        else:
+            yield n, None, "expected a JSON object"
+
+
+def read_rows(stream, fmt="csv"):
+    """
+    Yield (line number, row dict or None, parse error or None) from a text
+    stream. Lines that aren't valid CSV/JSON are reported and skipped. Bytes
+    the stream can't decode end the file, with one error after the last
+    line read.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+    line = 0
+    try:
+        for line, row, error in (_csv_rows if fmt == "csv" else _jsonl_rows)(stream):
+            yield line, row, error
+    except UnicodeDecodeError:
+        yield line + 1, None, (f"not UTF-8 text, so nothing after line {line} was read; "
+                               f"save the file as UTF-8 and import it again")
+
+
+def _localized(row, name):
+    value = row.get(name)
+    field = {k: str(v).strip() for k, v in value.items() if v not in (None, "")} if isinstance(value, dict) else {}
+    for loc in SUPPORTED_LOCALES:
+        v = row.get(f"{name}_{loc}")
+        if v not in (None, ""):
+            field[loc] = str(v).strip()
+    return field
+
+
+def _int(row, name, default=None):
+    value = row.get(name)
+    if value in (None, ""):
+        if default is None:
+            raise InvalidRow(f"{name} is required")
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRow(f"{name} must be a whole number, got {value!r}")
+
+
+def parse_product(row, currencies):
+    """Validated product columns from one import row; currencies are the ones we have rates for. Raises InvalidRow."""
+    sku = str(row.get("sku") or "").strip()
+    if not sku:
+        raise InvalidRow("sku is required")
+    if len(sku) > SKU_MAX_LENGTH:
+        raise InvalidRow(f"sku is longer than {SKU_MAX_LENGTH} characters")
+    title = _localized(row, "title")
+    if not title.get("en"):
+        raise InvalidRow("title_en is required")
+    if row.get("price_cents") not in (None, ""):
+        price_cents = _int(row, "price_cents")
+    elif row.get("price") not in (None, ""):
+        try:
+            price_cents = int((Decimal(str(row["price"]).strip()) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+        except InvalidOperation:
+            raise InvalidRow(f"price must be a number, got {row['price']!r}")
+    else:
+        raise InvalidRow("price is required")
+    currency = str(row.get("currency") or "USD").strip().upper()
+    if currency not in currencies:
+        raise InvalidRow(f"currency must be one of {', '.join(sorted(currencies))}, got {currency!r}")
+    stock = _int(row, "stock", 0)
+    if price_cents < 0 or stock < 0:
+        raise InvalidRow("price and stock can't be negative")
+    images = row.get("images") or []
+    if isinstance(images, str):
+        images = [i.strip() for i in images.split("|") if i.strip()]
+    if not isinstance(images, list) or not all(isinstance(i, str) for i in images):
+        raise InvalidRow("images must be a list of image ids or URLs")
+    for image in images:
+        if not is_image_ref(image):
+            raise InvalidRow(f"images must be image ids or http(s) URLs, got {image[:80]!r}")
+    return {"sku": sku, "title": title, "description": _localized(row, "description"),
+            "price_cents": price_cents, "currency": currency, "stock": stock, "images": images}
+
+
+def _upsert(db, vendor_id, products):
+    """INSERT ... ON CONFLICT (vendor_id, sku) DO UPDATE for a chunk, as one executemany."""
+    table = Product.__table__
+    now = datetime.utcnow()
+    params = [dict(p, id=str(uuid.uuid4()), vendor_id=vendor_id, version=1, created_at=now) for p in products]
+    insert = upsert_insert(db)
+    if insert is not None:
+        stmt = insert(table)
+        set_ = {c: stmt.excluded[c] for c in _UPDATED_COLUMNS}
+        set_["version"] = table.c.version + 1
+        db.execute(stmt.on_conflict_do_update(index_elements=["vendor_id", "sku"], set_=set_), params)
+        return
+    existing = set(sku for (sku,) in db.query(Product.sku).filter(
+        Product.vendor_id == vendor_id, Product.sku.in_([p["sku"] for p in products])))
+    for p in params:
+        if p["sku"] in existing:
+            (db.query(Product).filter(Product.vendor_id == vendor_id, Product.sku == p["sku"])
+             .update(dict({c: p[c] for c in _UPDATED_COLUMNS}, version=Product.version + 1),
+                     synchronize_session=False))
+        else:
+            db.execute(table.insert(), p)
+
+
+def _write_chunk(db, vendor_id, chunk, embed):
+    """Upsert one chunk and its views and search entries, and commit. Returns how many were new."""
+    products = list(chunk.values())
+    _upsert(db, vendor_id, products)
+    saved = (db.query(Product)
+             .options(load_only(Product.id, Product.vendor_id, Product.sku, Product.version, Product.title,
+                                Product.description, Product.price_cents, Product.currency))
+             .filter(Product.vendor_id == vendor_id, Product.sku.in_(list(chunk))).all())
+    sync_product_views_many(db, saved)
+    index_products(db, saved)
+    vectors = [(p.id, embed_product(p)) for p in saved] if embed else []
+    created = sum(1 for p in saved if p.version == 1)
+    invalidate_on_commit(db, CATALOG, vendor_scope(vendor_id))
+    db.commit()
+    db.expunge_all()
+    if vectors:
+        # like index_product_embedding(): the products are saved even if this fails
+        try:
+            embedding_index.upsert_many(vectors)
+        except Exception:
+            log.exception("could not update the embedding index for %d imported products", len(vectors))
+    return created
+
+
+def import_products(db, vendor_id, stream, fmt="csv", chunk_size=IMPORT_CHUNK, embed=True,
+                    max_errors=IMPORT_MAX_ERRORS):
+    """
+    Create or update (by SKU) the vendor's products from a CSV/JSONL text
+    stream. Commits once per chunk. Returns {"rows", "imported", "created",
+    "updated", "errors_total", "errors": [{"line", "sku", "error"}, ...]};
+    created/updated count distinct products, imported counts rows.
+    """
+    report = {"rows": 0, "imported": 0, "created": 0, "updated": 0, "errors_total": 0, "errors": []}
+
+    def error(line, sku, message):
+        report["errors_total"] += 1
+        if len(report["errors"]) < max_errors:
+            report["errors"].append({"line": line, "sku": sku, "error": message})
+
+    def flush(chunk, rows):
+        try:
+            created = _write_chunk(db, vendor_id, {sku: p for sku, (_, p) in chunk.items()}, embed)
+        except sa_exc.DBAPIError as e:
+            db.rollback()
+            for sku, (line, _) in chunk.items():
+                error(line, sku, f"not saved: {e.orig}")
+            return
+        report["imported"] += rows
+        report["created"] += created
+        report["updated"] += len(chunk) - created
+
+    currencies = set(rate_provider.currencies())  # prices in any other currency can't be converted at checkout
+    chunk, rows = {}, 0  # sku -> (line, product); a SKU repeated within a chunk keeps its last row
+    for line, row, parse_error in read_rows(stream, fmt):
+        report["rows"] += 1
+        if parse_error:
+            error(line, None, parse_error)
+            continue
+        try:
+            product = parse_product(row, currencies)
+        except InvalidRow as e:
+            error(line, row.get("sku") or None, str(e))
+            continue
+        chunk[product["sku"]] = (line, product)
+        rows += 1
+        if len(chunk) >= chunk_size:
+            flush(chunk, rows)
+            chunk, rows = {}, 0
+    if chunk:
+        flush(chunk, rows)
+    return report
+
+
+# ------------------------------
+# Export
+# ------------------------------
+def _pages(query, model, chunk_size):
+    """
+    query's rows in pages of chunk_size, oldest first. Seeks on
+    (created_at, id) so every page is one range of the ix_*_created_id
+    indexes, with or without a vendor filter.
+    """
+    last = None
+    while True:
+        q = query
+        if last is not None:
+            q = q.filter(tuple_(model.created_at, model.id) > tuple_(*last))
+        page = q.order_by(model.created_at, model.id).limit(chunk_size).all()
+        if not page:
+            return
+        yield page
+        last = (page[-1].created_at, page[-1].id)
+        query.session.expunge_all()
+
+
+def _write(out, fmt, columns, records):
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow({k: json.dumps(v, ensure_ascii=False) if isinstance(v, (list, dict)) else v
+                             for k, v in record.items()})
+            count += 1
+    elif fmt == "jsonl":
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+    return count
+
+
+def product_record(p, fmt="csv"):
+    record = {"id": p.id, "sku": p.sku, "price": f"{(p.price_cents or 0) / 100:.2f}", "currency": p.currency,
+              "stock": p.stock}
+    for name in ("title", "description"):
+        field = getattr(p, name) or {}
+        if fmt == "jsonl":
+            record[name] = field
+        else:
+            record.update({f"{name}_{loc}": field.get(loc, "") for loc in SUPPORTED_LOCALES})
+    record["images"] = list(p.images or []) if fmt == "jsonl" else "|".join(p.images or [])
+    return record
+
+
+def export_products(db, out, fmt="csv", vendor_id=None, chunk_size=EXPORT_CHUNK):
+    """Write products (one vendor's, or all) to a text stream. Returns how many."""
+    q = db.query(Product)
+    if vendor_id:
+        q = q.filter(Product.vendor_id == vendor_id)
+    records = (product_record(p, fmt) for page in _pages(q, Product, chunk_size) for p in page)
+    return _write(out, fmt, PRODUCT_COLUMNS, records)
+
+
+def order_record(o):
+    return {"id": o.id, "checkout_id": o.checkout_id, "vendor_id": o.vendor_id, "user_id": o.user_id,
+            "status": o.status, "fulfillment_status": (o.fulfillment or {}).get("status"),
+            "total_cents": o.total_cents, "currency": o.currency,
+            "created_at": o.created_at.isoformat() if o.created_at else None, "items": o.items or []}
+
+
+def export_orders(db, out, fmt="csv", vendor_id=None, chunk_size=EXPORT_CHUNK):
+    """Write orders (one vendor's, or all) to a text stream. Returns how many."""
+    q = db.query(Order).options(load_only(Order.id, Order.checkout_id, Order.vendor_id, Order.user_id, Order.status,
+                                          Order.fulfillment, Order.total_cents, Order.currency, Order.created_at,
+                                          Order.items))
+    if vendor_id:
+        q = q.filter(Order.vendor_id == vendor_id)
+    records = (order_record(o) for page in _pages(q, Order, chunk_size) for o in page)
+    return _write(out, fmt, ORDER_COLUMNS, records)
+
+
+if __name__ == "__main__":
+    import argparse
+    from db import session_scope
+
+    logging.basicConfig(level=logging.INFO)
+    ap = argparse.ArgumentParser(description="Bulk product import and product/order export")
+    sub = ap.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("vendor_id")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=FORMATS)
+    imp.add_argument("--no-embeddings", action="store_true",
+                     help="skip the assistant's embedding index (rebuild it later with python embeddings.py)")
+    exp = sub.add_parser("export")
+    exp.add_argument("what", choices=("products", "orders"))
+    exp.add_argument("--vendor")
+    exp.add_argument("--format", choices=FORMATS, default="csv")
+    exp.add_argument("-o", "--output")
+    args = ap.parse_args()
+
+    with session_scope() as db:
+        if args.command == "import":
+            with open(args.path, encoding="utf-8-sig", newline="") as f:
+                result = import_products(db, args.vendor_id, f, args.format or detect_format(args.path),
+                                         embed=not args.no_embeddings)
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            export = export_products if args.what == "products" else export_orders
+            out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+            try:
+                n = export(db, out, args.format, vendor_id=args.vendor)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            log.info("exported %d %s", n, args.what)
@@ -0,0 +1,43 @@
+"""
+Checkout of a cart that may hold several vendors' products. The cart is
+grouped by vendor in one pass into a parent Checkout (what the customer pays,
+one Stripe session) and one child Order per vendor, which is what vendors see
+and what payouts and dashboard totals are computed from.
+webhook.finalize_paid_checkout() settles all children in one transaction.
+"""
+import uuid
+
+from models import Checkout, Order
+from page_cache import ADMIN, invalidate_on_commit, vendor_scope
+
+
+def group_by_vendor(lines):
+    """{vendor_id: [line, ...]} in cart order. lines: dicts with a "vendor_id" key."""
+    groups = {}
+    for line in lines:
+        groups.setdefault(line["vendor_id"], []).append(line)
+    return groups
+
+
+def create_checkout(db, user_id, lines, currency, exchange_rates=None, address=None):
+    """
+    lines: [{"product_id", "vendor_id", "qty", "amount"}], amount being the
+    unit price in `currency` cents. Inserts the Checkout and its per-vendor
+    orders in one flush (one batched INSERT per table) and commits.
+    """
+    checkout = Checkout(id=str(uuid.uuid4()), user_id=user_id, currency=currency,
+                        exchange_rates=exchange_rates, status="PENDING", address=address,
+                        total_cents=sum(line["amount"] * line["qty"] for line in lines))
+    orders = [
+        Order(id=str(uuid.uuid4()), checkout_id=checkout.id, user_id=user_id, vendor_id=vendor_id,
+              items=[{"product_id": line["product_id"], "qty": line["qty"], "amount": line["amount"]}
+                     for line in vendor_lines],
+              total_cents=sum(line["amount"] * line["qty"] for line in vendor_lines),
+              currency=currency, exchange_rates=exchange_rates, status="PENDING", address=address)
+        for vendor_id, vendor_lines in group_by_vendor(lines).items()
+    ]
+    db.add(checkout)
+    db.add_all(orders)
+    invalidate_on_commit(db, ADMIN, *(vendor_scope(o.vendor_id) for o in orders))
+    db.commit()
+    return checkout
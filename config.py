@@ -0,0 +1,21 @@
+"""Settings read from the environment (and .env, when python-dotenv is installed)."""
+import os
+
+# Load .env if present (optional convenience)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# --- Config from env ---
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./tribal_marketplace.db")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
+STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY", "")
+STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+# Point the Stripe client at another server (e.g. fixtures/stripe_stub.py)
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "")
+APP_URL = os.getenv("APP_URL", "http://localhost:8501")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# Point the assistant at another OpenAI-compatible server (e.g. fixtures/openai_stub.py)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
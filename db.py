@@ -0,0 +1,138 @@
+"""Engine, connection pool and session scope shared by the UI and the webhook server."""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import exc as sa_exc
+
+from config import DATABASE_URL
+
+# Pool sizing, tunable per deployment
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Checkout/wait counters for the connection pool (see pool_metrics())
+_pool_stats = {"checkouts": 0, "checkins": 0, "in_use": 0, "peak_in_use": 0,
+               "timeouts": 0, "wait_total_s": 0.0, "wait_max_s": 0.0}
+_pool_stats_lock = threading.Lock()
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to get a connection."""
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except sa_exc.TimeoutError:
+            with _pool_stats_lock:
+                _pool_stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - t0
+        with _pool_stats_lock:
+            _pool_stats["checkouts"] += 1
+            _pool_stats["in_use"] += 1
+            _pool_stats["peak_in_use"] = max(_pool_stats["peak_in_use"], _pool_stats["in_use"])
+            _pool_stats["wait_total_s"] += waited
+            _pool_stats["wait_max_s"] = max(_pool_stats["wait_max_s"], waited)
+        return conn
+
+    def _do_return_conn(self, record):
+        with _pool_stats_lock:
+            _pool_stats["checkins"] += 1
+            _pool_stats["in_use"] -= 1
+        super()._do_return_conn(record)
+
+def _engine_kwargs(url):
+    kwargs = {}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url.rstrip("/") == "sqlite:":
+            return kwargs  # in-memory sqlite keeps its single-connection pool
+    kwargs.update(poolclass=MeteredQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                  pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE,
+                  pool_pre_ping=DB_POOL_PRE_PING)
+    return kwargs
+
+Base = declarative_base()
+engine = create_engine(DATABASE_URL, **_engine_kwargs(DATABASE_URL))
+SessionLocal = sessionmaker(bind=engine)
+
+@contextmanager
+def session_scope():
+    """
+    One session per unit of work (a Streamlit script run, a webhook request).
+    Callers commit explicitly; anything left uncommitted is rolled back and the
+    connection always goes back to the pool when the block exits.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def get_db():
+    with session_scope() as db:
+        yield db
+
+def upsert_insert(db):
+    """
+    The dialect's insert(), whose statements have on_conflict_do_update() and
+    on_conflict_do_nothing(), on SQLite and PostgreSQL. None on other
+    dialects, where callers fall back to separate statements.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert
+
+def increment(db, model, keys, deltas):
+    """
+    Add deltas to the row identified by keys (its primary key or a unique
+    constraint), creating it if needed, as one atomic statement where the
+    dialect has INSERT ... ON CONFLICT. Does not commit.
+    """
+    table = model.__table__
+    insert = upsert_insert(db)
+    if insert is not None:
+        stmt = insert(table).values(**keys, **deltas)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={c: table.c[c] + stmt.excluded[c] for c in deltas})
+        db.execute(stmt)
+        return
+    where = [table.c[k] == v for k, v in keys.items()]
+    updated = db.execute(table.update().where(*where)
+                         .values({c: table.c[c] + d for c, d in deltas.items()})).rowcount
+    if not updated:
+        db.execute(table.insert().values(**keys, **deltas))
+
+def migrate(revision="head"):
+    """Upgrade the database to revision with migrations/ (what `alembic upgrade head` does)."""
+    from alembic import command
+    from alembic.config import Config
+    here = os.path.dirname(os.path.abspath(__file__))
+    cfg = Config(os.path.join(here, "alembic.ini"))
+    cfg.set_main_option("script_location", os.path.join(here, "migrations"))
+    command.upgrade(cfg, revision)
+
+def pool_metrics():
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+    stats["wait_avg_s"] = stats["wait_total_s"] / stats["checkouts"] if stats["checkouts"] else 0.0
+    stats["pool_size"] = getattr(engine.pool, "size", lambda: None)()
+    stats["pool_status"] = engine.pool.status()
+    return stats
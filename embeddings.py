@@ -0,0 +1,307 @@
+"""
+Local embedding index over product titles and descriptions (all locales),
+used to give the assistant the few products relevant to a question.
+
+Texts are embedded locally with feature hashing: search.tokenize() tokens
+plus character trigrams of each token (so "baskets" still lands near
+"basket"), hashed into EMBEDDING_DIM signed buckets and L2-normalized. No
+model download or API call is involved; swap _embed() for a real model
+if recall becomes a problem.
+
+Vectors live in a memory-mapped float32 matrix under EMBEDDINGS_DIR with a
+parallel fixed-width array of product ids, so the OS page cache, not the
+Python heap, holds them and every process shares one copy. Search is a brute
+force dot product over the matrix (about 100 MB at 100k products). Deleted
+products leave a zeroed row that the next insert reuses. save_product() and
+delete_product() keep the index current; run `python embeddings.py` to
+rebuild it from the products table. Writers in different processes (Streamlit
+workers, catalog imports) take turns through an flock on index.lock.
+"""
+import os
+import json
+import zlib
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes are only serialized within the process
+    fcntl = None
+
+import numpy as np
+
+from search import tokenize
+
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR", "./embeddings")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+TITLE_WEIGHT = 2.0
+TRIGRAM_WEIGHT = 0.5
+_ID_WIDTH = 64
+_INITIAL_CAPACITY = 1024
+
+log = logging.getLogger("embeddings")
+
+
+@lru_cache(maxsize=200000)
+def _features(token, dim):
+    # (buckets, signed weights) arrays for a token and its character trigrams
+    padded = f"#{token}#"
+    grams = [token] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    hashes = np.array([zlib.crc32(g.encode()) for g in grams], dtype=np.int64)
+    weights = np.full(len(grams), TRIGRAM_WEIGHT, dtype=np.float32)
+    weights[0] = 1.0
+    weights[hashes & 0x80000000 == 0] *= -1
+    return hashes % dim, weights
+
+
+def _embed(weighted_texts, dim):
+    buckets, weights = [], []
+    for text, weight in weighted_texts:
+        for token in tokenize(text):
+            b, w = _features(token, dim)
+            buckets.append(b)
+            weights.append(w * weight)
+    if not buckets:
+        return np.zeros(dim, dtype=np.float32)
+    vec = np.bincount(np.concatenate(buckets), np.concatenate(weights), minlength=dim).astype(np.float32)
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def embed_product(product, dim=EMBEDDING_DIM):
+    return _embed([(v, TITLE_WEIGHT) for v in (product.title or {}).values()]
+                  + [(v, 1.0) for v in (product.description or {}).values()], dim)
+
+
+def embed_query(text, dim=EMBEDDING_DIM):
+    return _embed([(text, 1.0)], dim)
+
+
+class EmbeddingIndex:
+    """
+    Memory-mapped (rows x dim) float32 matrix plus product ids, in `path`:
+    vectors.f32, ids.bin and meta.json ({"dim", "capacity", "count",
+    "generation"}). Opened lazily on first use. Readers in other processes
+    notice writes through meta.json's mtime and remap. Writers hold the
+    index.lock flock and reload first if the generation moved, so row
+    allocation always starts from what every process has written.
+    """
+
+    def __init__(self, path=EMBEDDINGS_DIR, dim=EMBEDDING_DIM):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._generation = None
+        self._vectors = None
+        self._ids = None
+        self.capacity = 0
+        self.count = 0  # high-water mark of used rows
+        self._rows = {}  # product id -> row
+        self._free = []
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _write_meta(self):
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "capacity": self.capacity, "count": self.count,
+                       "generation": self._generation}, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta_mtime = os.stat(self._file("meta.json")).st_mtime_ns
+
+    def _map(self):
+        self._vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(self.capacity, self.dim))
+        self._ids = np.memmap(self._file("ids.bin"), dtype=f"S{_ID_WIDTH}", mode="r+",
+                              shape=(self.capacity,))
+
+    def _resize_files(self, capacity):
+        for name, row_bytes in (("vectors.f32", self.dim * 4), ("ids.bin", _ID_WIDTH)):
+            with open(self._file(name), "ab") as f:
+                f.truncate(capacity * row_bytes)  # extends with zeros, keeps existing rows
+
+    def _open(self):
+        meta_file = self._file("meta.json")
+        if not os.path.exists(meta_file):
+            os.makedirs(self.path, exist_ok=True)
+            self.capacity, self.count, self._generation = _INITIAL_CAPACITY, 0, 0
+            self._resize_files(self.capacity)
+            self._write_meta()
+        else:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            if meta["dim"] != self.dim:
+                raise ValueError(f"{self.path} holds {meta['dim']}-d vectors, expected {self.dim}; rebuild it")
+            self.capacity, self.count = meta["capacity"], meta["count"]
+            self._generation = meta.get("generation", 0)
+            self._meta_mtime = os.stat(meta_file).st_mtime_ns
+        self._map()
+        self._rows, self._free = {}, []
+        for row, raw in enumerate(self._ids[:self.count]):
+            if raw:
+                self._rows[raw.decode()] = row
+            else:
+                self._free.append(row)
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file("index.lock"), "a") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield  # closing the file releases the flock
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive write access across threads and processes, with meta and ids reloaded if stale."""
+        with self._lock, self._file_lock():
+            try:
+                with open(self._file("meta.json")) as f:
+                    generation = json.load(f).get("generation", 0)
+            except FileNotFoundError:
+                generation = None
+            if self._vectors is None or generation != self._generation:
+                self._open()
+            try:
+                yield
+            except BaseException:
+                self._generation = None  # possibly half applied: reload before the next write
+                raise
+            self._generation += 1
+            self._write_meta()
+
+    def _ensure_open(self):
+        if self._vectors is None:
+            if os.path.exists(self._file("meta.json")):
+                self._open()
+            else:
+                with self._file_lock():  # don't race a writer creating or growing the files
+                    self._open()
+            return
+        try:
+            mtime = os.stat(self._file("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._meta_mtime:
+            self._open()
+
+    def _grow(self, needed):
+        capacity = max(self.capacity * 2, needed)
+        self._vectors.flush()
+        self._ids.flush()
+        self._vectors = self._ids = None
+        self._resize_files(capacity)
+        self.capacity = capacity
+        self._map()
+
+    def upsert_many(self, items):
+        """items: iterable of (product_id, vector)."""
+        items = list(items)
+        with self._writing():
+            new = sum(1 for pid, _ in items if pid not in self._rows)
+            if self.count + new - len(self._free) > self.capacity:
+                self._grow(self.count + new)
+            for pid, vec in items:
+                if len(pid.encode()) > _ID_WIDTH:
+                    raise ValueError(f"product id longer than {_ID_WIDTH} bytes: {pid!r}")
+                row = self._rows.get(pid)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        row, self.count = self.count, self.count + 1
+                    self._rows[pid] = row
+                    self._ids[row] = pid.encode()
+                self._vectors[row] = vec
+            self._vectors.flush()
+            self._ids.flush()
+
+    def upsert_product(self, product):
+        self.upsert_many([(product.id, embed_product(product, self.dim))])
+
+    def remove(self, product_id):
+        with self._writing():
+            row = self._rows.pop(product_id, None)
+            if row is not None:
+                self._vectors[row] = 0
+                self._ids[row] = b""
+                self._free.append(row)
+                self._vectors.flush()
+                self._ids.flush()
+
+    def clear(self):
+        with self._writing():
+            self._vectors[:self.count] = 0
+            self._ids[:self.count] = b""
+            self._vectors.flush()
+            self._ids.flush()
+            self._rows, self._free, self.count = {}, [], 0
+
+    def __len__(self):
+        with self._lock:
+            self._ensure_open()
+            return len(self._rows)
+
+    def search(self, query_vec, k=5, min_score=0.0):
+        """Top-k (product_id, cosine score) by brute force, best first."""
+        with self._lock:
+            self._ensure_open()
+            if not self._rows:
+                return []
+            scores = self._vectors[:self.count] @ query_vec
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[r].decode(), float(scores[r])) for r in top
+                    if scores[r] > min_score and self._ids[r]]
+
+
+embedding_index = EmbeddingIndex()
+
+
+def index_product_embedding(product):
+    # called after the product's transaction commits; a failure here must not undo the save
+    try:
+        embedding_index.upsert_product(product)
+    except Exception:
+        log.exception("could not update the embedding index for product %s", product.id)
+
+
+def unindex_product_embedding(product_id):
+    try:
+        embedding_index.remove(product_id)
+    except Exception:
+        log.exception("could not remove product %s from the embedding index", product_id)
+
+
+def rebuild_embedding_index(db, batch_size=2000, index=None):
+    """Embed every product from scratch (backfill)."""
+    from models import Product
+    index = index or embedding_index
+    index.clear()
+    last_id = ""
+    while True:
+        batch = (db.query(Product).filter(Product.id > last_id)
+                 .order_by(Product.id).limit(batch_size).all())
+        if not batch:
+            break
+        index.upsert_many((p.id, embed_product(p, index.dim)) for p in batch)
+        last_id = batch[-1].id
+        db.expunge_all()
+
+
+def search_similar_products(query, k=5, min_score=0.1, index=None):
+    index = index or embedding_index
+    return index.search(embed_query(query, index.dim), k=k, min_score=min_score)
+
+
+if __name__ == "__main__":
+    from db import session_scope
+    logging.basicConfig(level=logging.INFO)
+    with session_scope() as db:
+        rebuild_embedding_index(db)
+    log.info("indexed %d products into %s", len(embedding_index), EMBEDDINGS_DIR)
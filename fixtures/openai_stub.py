@@ -0,0 +1,62 @@
+"""
+Minimal OpenAI-compatible chat completions server for local development and
+tests, so the assistant can run without an API key or network access.
+
+    python fixtures/openai_stub.py [--port 5100] [--delay 0.02]
+    OPENAI_API_KEY=stub OPENAI_BASE_URL=http://127.0.0.1:5100/v1 streamlit run app.py
+
+It answers every request by echoing the last user message word by word,
+streamed as server-sent events when "stream": true.
+"""
+import argparse
+import json
+import time
+import uuid
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+app.config["DELAY"] = 0.02
+
+
+def _answer(messages):
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    return f"(stub) You asked: {question}"
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    body = request.get_json(force=True)
+    answer = _answer(body.get("messages", []))
+    cid, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), body.get("model", "stub")
+    if not body.get("stream"):
+        return jsonify({
+            "id": cid, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def events():
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            chunk = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "finish_reason": None,
+                                  "delta": {"content": word if i == 0 else " " + word}}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            time.sleep(app.config["DELAY"])
+        done = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+        yield f"data: {json.dumps(done)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return Response(events(), mimetype="text/event-stream")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=5100)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds between streamed words")
+    args = parser.parse_args()
+    app.config["DELAY"] = args.delay
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,142 @@
+"""
+Minimal Stripe API stand-in (Checkout Sessions only) for local development
+and tests, so checkout can run without a Stripe account or network access.
+
+    python fixtures/stripe_stub.py [--port 12111] [--delay 0] [--fail-first 0]
+        [--webhook-url http://127.0.0.1:5000/webhook --webhook-secret whsec_test]
+    STRIPE_SECRET_KEY=sk_test_stub STRIPE_API_BASE=http://127.0.0.1:12111 streamlit run app.py
+
+POST /v1/checkout/sessions honours Idempotency-Key like Stripe: a repeated
+key gets the first response back and creates nothing. --delay slows every
+response down and --fail-first answers the first N attempts of each key with
+a 500, to exercise client timeouts and retries. Opening a session's url
+"pays" it: the stub posts a signed checkout.session.completed event to
+--webhook-url and redirects to the session's success_url.
+GET /_stub/stats counts requests and sessions created.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import re
+import threading
+import time
+import uuid
+
+import requests
+from flask import Flask, jsonify, redirect, request
+
+app = Flask(__name__)
+app.config.update(DELAY=0.0, FAIL_FIRST=0, WEBHOOK_URL="", WEBHOOK_SECRET="")
+
+_lock = threading.Lock()
+_sessions = {}  # id -> session
+_replies = {}  # idempotency key -> session id
+_attempts = {}  # idempotency key -> attempts seen
+_stats = {"requests": 0, "sessions_created": 0, "idempotent_replays": 0, "failures_injected": 0}
+
+
+def _unflatten(form):
+    """Stripe's form encoding (line_items[0][price_data][currency]=usd) to nested dicts and lists."""
+    root = {}
+    for key, value in form.items(multi=True):
+        parts = re.findall(r"[^\[\]]+", key)
+        node = root
+        for part, nxt in zip(parts, parts[1:]):
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+
+    def lists(node):
+        if not isinstance(node, dict):
+            return node
+        if node and all(k.isdigit() for k in node):
+            return [lists(node[k]) for k in sorted(node, key=int)]
+        return {k: lists(v) for k, v in node.items()}
+    return lists(root)
+
+
+def _error(status, message, kind="api_error"):
+    return jsonify({"error": {"type": kind, "message": message}}), status
+
+
+@app.route("/v1/checkout/sessions", methods=["POST"])
+def create_session():
+    time.sleep(app.config["DELAY"])
+    key = request.headers.get("Idempotency-Key")
+    with _lock:
+        _stats["requests"] += 1
+        if key:
+            _attempts[key] = _attempts.get(key, 0) + 1
+            if _attempts[key] <= app.config["FAIL_FIRST"]:
+                _stats["failures_injected"] += 1
+                return _error(500, "Injected failure (stripe_stub --fail-first)")
+            if key in _replies:
+                _stats["idempotent_replays"] += 1
+                return jsonify(_sessions[_replies[key]])
+        params = _unflatten(request.form)
+        line_items = params.get("line_items") or []
+        if not line_items:
+            return _error(400, "Missing required param: line_items.", "invalid_request_error")
+        sid = f"cs_test_{uuid.uuid4().hex}"
+        session = {
+            "id": sid, "object": "checkout.session", "livemode": False, "created": int(time.time()),
+            "mode": params.get("mode", "payment"), "status": "open", "payment_status": "unpaid",
+            "currency": line_items[0]["price_data"]["currency"],
+            "amount_total": sum(int(li["price_data"]["unit_amount"]) * int(li.get("quantity", 1))
+                                for li in line_items),
+            "metadata": params.get("metadata") or {},
+            "success_url": params.get("success_url"), "cancel_url": params.get("cancel_url"),
+            "url": f"{request.host_url}pay/{sid}",
+        }
+        _sessions[sid] = session
+        if key:
+            _replies[key] = sid
+        _stats["sessions_created"] += 1
+    return jsonify(session)
+
+
+@app.route("/v1/checkout/sessions/<sid>", methods=["GET"])
+def retrieve_session(sid):
+    with _lock:
+        session = _sessions.get(sid)
+    if session is None:
+        return _error(404, f"No such checkout.session: '{sid}'", "invalid_request_error")
+    return jsonify(session)
+
+
+@app.route("/pay/<sid>", methods=["GET"])
+def pay(sid):
+    with _lock:
+        session = _sessions.get(sid)
+        if session is None:
+            return "unknown session", 404
+        session.update(status="complete", payment_status="paid")
+    if app.config["WEBHOOK_URL"]:
+        payload = json.dumps({"id": f"evt_{uuid.uuid4().hex}", "object": "event",
+                              "type": "checkout.session.completed", "created": int(time.time()),
+                              "data": {"object": session}}).encode()
+        timestamp = int(time.time())
+        mac = hmac.new(app.config["WEBHOOK_SECRET"].encode(), f"{timestamp}.".encode() + payload,
+                       hashlib.sha256).hexdigest()
+        requests.post(app.config["WEBHOOK_URL"], data=payload, timeout=10,
+                      headers={"Content-Type": "application/json", "Stripe-Signature": f"t={timestamp},v1={mac}"})
+    return redirect(session["success_url"] or "/")
+
+
+@app.route("/_stub/stats", methods=["GET"])
+def stats():
+    with _lock:
+        return jsonify(dict(_stats, sessions=len(_sessions)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds before every API response")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N attempts per idempotency key with a 500")
+    parser.add_argument("--webhook-url", default="", help="where opening a session's url posts checkout.session.completed")
+    parser.add_argument("--webhook-secret", default="", help="STRIPE_WEBHOOK_SECRET of the webhook server")
+    args = parser.parse_args()
+    app.config.update(DELAY=args.delay, FAIL_FIRST=args.fail_first,
+                      WEBHOOK_URL=args.webhook_url, WEBHOOK_SECRET=args.webhook_secret)
+    app.run(port=args.port, threaded=True)
@@ -0,0 +1,33 @@
+"""
+Production settings for the webhook server:
+
+    gunicorn -c gunicorn.conf.py webhook:app
+
+Each worker process gets its own DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW
+connections) and its own WEBHOOK_WORKERS inbox threads, size the database
+accordingly.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("WEBHOOK_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEBHOOK_GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("WEBHOOK_GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("WEBHOOK_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("WEBHOOK_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# import the app in each worker, after fork, so no engine/pool is shared across processes
+preload_app = False
+accesslog = "-"
+
+
+def post_worker_init(worker):
+    from webhook import start_webhook_workers
+    start_webhook_workers()
+
+
+def worker_exit(server, worker):
+    # SIGTERM: let in-flight inbox events finish before the process goes away
+    from webhook import stop_webhook_workers
+    stop_webhook_workers(timeout=graceful_timeout)
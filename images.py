@@ -0,0 +1,229 @@
+"""
+Product images. Uploads are stored content-addressed (the id is the SHA-256
+of the bytes, so re-uploads dedupe and a URL never changes meaning) in an
+object store with an S3-style put/get/head interface. FileSystemObjectStore
+under IMAGE_STORE_DIR is the only backend; anything with the same three
+methods can replace it.
+
+WebP thumbnails in THUMB_WIDTHS are generated on a small worker pool right
+after upload, and on demand if a request arrives first. images_bp serves
+originals and thumbnails with immutable Cache-Control headers and ETags; it is
+mounted on the webhook server (IMAGE_BASE_URL points at it).
+"""
+import io
+import os
+import re
+import json
+import html
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, Response, abort, request
+
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "./media")
+IMAGE_BASE_URL = os.getenv("IMAGE_BASE_URL", "http://localhost:5000/images").rstrip("/")
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+THUMB_WIDTHS = (160, 320, 640)
+THUMB_QUALITY = 80
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+_IMAGE_ID = re.compile(r"[0-9a-f]{64}")
+_IMAGE_URL = re.compile(r"https?://\S+", re.IGNORECASE)
+
+log = logging.getLogger("images")
+
+
+class ObjectNotFound(KeyError):
+    pass
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class FileSystemObjectStore:
+    """Objects as files under root; the content type is kept in a .meta sidecar."""
+
+    def __init__(self, root=IMAGE_STORE_DIR):
+        self.root = root
+
+    def _path(self, key):
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ObjectNotFound(key)
+        return path
+
+    def put_object(self, key, body, content_type="application/octet-stream"):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        for target, data in ((path + ".meta", json.dumps({"content_type": content_type}).encode()), (path, body)):
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+
+    def head_object(self, key):
+        path = self._path(key)
+        try:
+            with open(path + ".meta", "rb") as f:
+                meta = json.load(f)
+            meta["size"] = os.path.getsize(path)
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        return meta
+
+    def get_object(self, key):
+        meta = self.head_object(key)
+        with open(self._path(key), "rb") as f:
+            meta["body"] = f.read()
+        return meta
+
+    def exists(self, key):
+        try:
+            self.head_object(key)
+            return True
+        except ObjectNotFound:
+            return False
+
+
+store = FileSystemObjectStore()
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="thumbnails")
+
+
+def _original_key(image_id):
+    return f"originals/{image_id[:2]}/{image_id}"
+
+
+def _thumb_key(image_id, width):
+    return f"thumbs/{image_id[:2]}/{image_id}/{width}.webp"
+
+
+def is_image_id(value):
+    return isinstance(value, str) and _IMAGE_ID.fullmatch(value) is not None
+
+
+def is_image_ref(value):
+    """True for what a Product.images entry may hold: an image id or an http(s) URL."""
+    return is_image_id(value) or (isinstance(value, str) and _IMAGE_URL.fullmatch(value) is not None)
+
+
+def make_thumbnail(data, width):
+    from PIL import Image, ImageOps  # Pillow (and the numpy it pulls in) loads with the first image
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        img.thumbnail((width, width * 4))
+        out = io.BytesIO()
+        img.save(out, "WEBP", quality=THUMB_QUALITY, method=4)
+        return out.getvalue()
+
+
+def ensure_thumbnail(image_id, width):
+    """
+    Thumbnail bytes, generating and storing them if needed. Raises
+    ObjectNotFound, or InvalidImage when the stored original can't be decoded.
+    """
+    key = _thumb_key(image_id, width)
+    try:
+        return store.get_object(key)["body"]
+    except ObjectNotFound:
+        pass
+    original = store.get_object(_original_key(image_id))["body"]
+    try:
+        data = make_thumbnail(original, width)
+    except Exception as e:  # Pillow raises OSError, ValueError, DecompressionBombError, ...
+        log.warning("stored image %s can't be decoded: %s", image_id, e)
+        raise InvalidImage("Not a readable image") from e
+    store.put_object(key, data, "image/webp")
+    return data
+
+
+def generate_thumbnails(image_id):
+    for width in THUMB_WIDTHS:
+        try:
+            ensure_thumbnail(image_id, width)
+        except Exception:
+            log.exception("thumbnail %s@%d failed", image_id, width)
+
+
+def save_image(data):
+    """Validate and store an uploaded image, queue its thumbnails and return its id."""
+    if len(data) > IMAGE_MAX_BYTES:
+        raise InvalidImage(f"Image is larger than {IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            fmt = img.format
+            img.verify()
+    except Exception:
+        raise InvalidImage("Not a readable image")
+    if fmt not in _FORMATS:
+        raise InvalidImage(f"Unsupported image format {fmt}")
+    image_id = hashlib.sha256(data).hexdigest()
+    if not store.exists(_original_key(image_id)):
+        store.put_object(_original_key(image_id), data, _FORMATS[fmt])
+    _executor.submit(generate_thumbnails, image_id)
+    return image_id
+
+
+def image_url(image, width=None):
+    """URL for a Product.images entry: a thumbnail for image ids, other URLs as-is, else None."""
+    if not is_image_id(image):
+        return image if is_image_ref(image) else None
+    if width:
+        return f"{IMAGE_BASE_URL}/{image}/{width}.webp"
+    return f"{IMAGE_BASE_URL}/{image}"
+
+
+def thumbnail_html(image, alt=""):
+    """Lazy-loaded <img> with a srcset, sized for a 3-column grid; "" for an entry that is not an image ref."""
+    if not is_image_ref(image):
+        return ""
+    alt = html.escape(alt or "", quote=True)
+    if not is_image_id(image):
+        return (f'<img src="{html.escape(image, quote=True)}" alt="{alt}" loading="lazy" decoding="async" '
+                'style="width:100%">')
+    srcset = ", ".join(f"{image_url(image, w)} {w}w" for w in THUMB_WIDTHS)
+    return (f'<img src="{image_url(image, THUMB_WIDTHS[1])}" srcset="{html.escape(srcset, quote=True)}" '
+            f'sizes="(max-width: 640px) 100vw, 33vw" alt="{alt}" loading="lazy" decoding="async" '
+            'style="width:100%;aspect-ratio:1;object-fit:cover">')
+
+
+# ------------------------------
+# HTTP serving
+# ------------------------------
+images_bp = Blueprint("images", __name__)
+
+
+def _cached(etag, produce, content_type):
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        try:
+            resp = Response(produce(), mimetype=content_type)
+        except (ObjectNotFound, InvalidImage):
+            abort(404)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    return resp
+
+
+@images_bp.route("/images/<image_id>/<int:width>.webp", methods=["GET"])
+def serve_thumbnail(image_id, width):
+    if not is_image_id(image_id) or width not in THUMB_WIDTHS:
+        abort(404)
+    return _cached(f"{image_id}-{width}", lambda: ensure_thumbnail(image_id, width), "image/webp")
+
+
+@images_bp.route("/images/<image_id>", methods=["GET"])
+def serve_original(image_id):
+    if not is_image_id(image_id):
+        abort(404)
+    try:
+        meta = store.head_object(_original_key(image_id))
+    except ObjectNotFound:
+        abort(404)
+    return _cached(image_id, lambda: store.get_object(_original_key(image_id))["body"], meta["content_type"])
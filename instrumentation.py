@@ -0,0 +1,212 @@
+"""
+Timing for page renders, webhook requests and the queries they send.
+
+span(name) times a block: a page render ("page:home"), a part of one
+("sidebar", "load:catalog"), or a webhook request. Spans nest. Every query
+is counted against every open span on the current thread, and its latency
+is recorded under the innermost span. For each span name the process keeps
+histograms of:
+- duration
+- queries sent
+- time spent in the database
+
+Queries slower than SLOW_QUERY_MS are logged with their statement (never
+their parameters).
+
+render_metrics() returns all of it in the Prometheus text format, together
+with the connection pool and page cache counters. The webhook server serves
+it on GET /metrics. A Streamlit process running without the embedded
+webhook thread serves it on METRICS_PORT if that is set. Numbers are
+per process.
+
+INSTRUMENTATION=0 turns it off: no engine listeners are installed, span()
+returns a shared no-op context manager, and /metrics shows only the pool
+and cache counters.
+"""
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+
+from db import engine, pool_metrics
+
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "1") == "1"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "250"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0: no standalone metrics server
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+log = logging.getLogger("instrumentation")
+
+_lock = threading.Lock()
+_stack = ContextVar("instrumentation_spans", default=())  # open spans, outermost first
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Prometheus histogram with one label. Not locked; callers hold _lock."""
+
+    def __init__(self, name, help, label, buckets):
+        self.name, self.help, self.label, self.buckets = name, help, label, buckets
+        self._series = {}  # label value -> [count per bucket..., count above the last, sum, count]
+
+    def observe(self, label_value, amount):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0, 0]
+        series[bisect_left(self.buckets, amount)] += 1
+        series[-2] += amount
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, series in sorted(self._series.items()):
+            label = f'{self.label}="{_escape(value)}"'
+            total = 0
+            for le, n in zip(self.buckets + ("+Inf",), series):
+                total += n
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {total}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{label}}} {series[-1]}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+SPAN_SECONDS = Histogram("marketplace_span_seconds", "Time spent in a page render, page section or request.",
+                         "span", SECONDS_BUCKETS)
+SPAN_QUERIES = Histogram("marketplace_span_queries", "SQL statements sent during a span.",
+                         "span", COUNT_BUCKETS)
+SPAN_QUERY_SECONDS = Histogram("marketplace_span_query_seconds", "Time spent in SQL statements during a span.",
+                               "span", SECONDS_BUCKETS)
+QUERY_SECONDS = Histogram("marketplace_db_query_seconds", "SQL statement latency, by innermost open span.",
+                          "span", SECONDS_BUCKETS)
+_slow_queries = {}  # span -> count
+
+
+class _Span:
+    __slots__ = ("name", "queries", "query_s", "_start", "_token")
+
+    def __init__(self, name):
+        self.name, self.queries, self.query_s = name, 0, 0.0
+
+    def __enter__(self):
+        self._token = _stack.set(_stack.get() + (self,))
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        _stack.reset(self._token)
+        with _lock:
+            SPAN_SECONDS.observe(self.name, elapsed)
+            SPAN_QUERIES.observe(self.name, self.queries)
+            SPAN_QUERY_SECONDS.observe(self.name, self.query_s)
+
+
+def span(name):
+    """Context manager timing a block under name (keep names few: they are metric labels)."""
+    return _Span(name) if INSTRUMENTATION else _NOOP
+
+
+def traced(name):
+    """Decorator: run the function inside span(name)."""
+    def decorate(fn):
+        if not INSTRUMENTATION:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentation_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_instrumentation_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    spans = _stack.get()
+    for record in spans:
+        record.queries += 1
+        record.query_s += elapsed
+    name = spans[-1].name if spans else "none"
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    with _lock:
+        QUERY_SECONDS.observe(name, elapsed)
+        if slow:
+            _slow_queries[name] = _slow_queries.get(name, 0) + 1
+    if slow:
+        log.warning("slow query (%.0f ms, span %s%s): %s", elapsed * 1000, name,
+                    ", executemany" if executemany else "", statement)
+
+
+if INSTRUMENTATION:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def render_metrics():
+    """Everything this process has recorded, in the Prometheus text exposition format."""
+    from page_cache import page_cache  # imported here: page_cache records its loads through span()
+    lines = []
+    with _lock:
+        for histogram in (SPAN_SECONDS, SPAN_QUERIES, SPAN_QUERY_SECONDS, QUERY_SECONDS):
+            lines += histogram.render()
+        lines += ["# HELP marketplace_slow_queries_total SQL statements slower than SLOW_QUERY_MS.",
+                  "# TYPE marketplace_slow_queries_total counter"]
+        lines += [f'marketplace_slow_queries_total{{span="{_escape(name)}"}} {n}'
+                  for name, n in sorted(_slow_queries.items())]
+    pool, cache = pool_metrics(), page_cache.stats()
+    for name, kind, help, value in (
+        ("db_pool_in_use", "gauge", "Connections checked out of the pool.", pool["in_use"]),
+        ("db_pool_checkouts_total", "counter", "Connections handed out by the pool.", pool["checkouts"]),
+        ("db_pool_timeouts_total", "counter", "Pool checkouts that timed out.", pool["timeouts"]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.", pool["wait_total_s"]),
+        ("page_cache_hits_total", "counter", "Page cache lookups served from memory.", cache["hits"]),
+        ("page_cache_misses_total", "counter", "Page cache lookups that ran the loader.", cache["misses"]),
+        ("page_cache_entries", "gauge", "Entries held in the page cache.", cache["entries"]),
+    ):
+        lines += [f"# HELP marketplace_{name} {help}", f"# TYPE marketplace_{name} {kind}",
+                  f"marketplace_{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def _metrics_app(environ, start_response):
+    if environ.get("PATH_INFO") != "/metrics":
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"not found\n"]
+    body = render_metrics().encode("utf-8")
+    start_response("200 OK", [("Content-Type", METRICS_CONTENT_TYPE), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_metrics_server_once(port=METRICS_PORT):
+    """Serve GET /metrics on port from a daemon thread (once per process; nothing if port is 0)."""
+    global _server
+    with _server_lock:
+        if _server is None and port:
+            from werkzeug.serving import make_server
+            _server = make_server("0.0.0.0", port, _metrics_app, threaded=True)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
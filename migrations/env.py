@@ -0,0 +1,49 @@
+"""Alembic environment: migrates config.DATABASE_URL to the models in models.py."""
+from logging.config import fileConfig
+
+from alembic import context
+
+from db import Base, engine
+import models  # noqa: F401  registers every table on Base.metadata
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names):
+    # the FTS5 table and its shadow tables are managed by hand (see migration 0001a)
+    if type_ == "table":
+        return not (name or "").startswith("product_search")
+    return True
+
+
+def _configure(**kwargs):
+    context.configure(
+        target_metadata=target_metadata,
+        include_name=include_name,
+        render_as_batch=engine.dialect.name == "sqlite",  # SQLite can't ALTER most things in place
+        compare_type=True,
+        **kwargs)
+
+
+def run_migrations_offline():
+    _configure(url=engine.url.render_as_string(hide_password=False), literal_binds=True,
+               dialect_opts={"paramstyle": "named"})
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        _configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
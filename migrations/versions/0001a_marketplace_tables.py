@@ -0,0 +1,209 @@
+"""marketplace tables
+
+What the app grew before it had migrations, on top of the original schema in
+0001:
+- the product read model: products.version, product_views, search_terms, and
+  on SQLite the product_search FTS5 table
+- multi-vendor checkouts: checkouts, orders.checkout_id and exchange_rates
+- the webhook inbox: webhook_events
+- payouts per order with commission, settled in runs: settlement_runs,
+  settlements, payouts.order_id/commission_cents/settlement_id
+- vendor dashboard totals: vendor_summaries, vendor_daily_sales,
+  vendor_product_sales, vendor_balances
+- the catalog, vendor order and payout queue indexes
+
+A database adopted from the original app gets empty search and vendor total
+tables here; fill them with `python search.py` and `python vendor_stats.py`
+after upgrading.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-17 21:01:47.009185
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# kept here rather than imported from search.py, so later edits there can't change this revision
+FTS_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+           "USING fts5(product_id UNINDEXED, title, description, tokenize='ascii')")
+
+
+def upgrade() -> None:
+    op.create_table('settlement_runs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('cutoff', sa.DateTime(), nullable=True),
+    sa.Column('payouts_settled', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('webhook_events',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('webhook_events', schema=None) as batch_op:
+        batch_op.create_index('ix_webhook_events_status_next', ['status', 'next_attempt_at'], unique=False)
+
+    op.create_table('checkouts',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('total_cents', sa.Integer(), nullable=True),
+    sa.Column('currency', sa.String(), nullable=True),
+    sa.Column('exchange_rates', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('payment_metadata', sa.JSON(), nullable=True),
+    sa.Column('address', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('checkout_id', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('exchange_rates', sa.JSON(), nullable=True))
+        batch_op.create_foreign_key('fk_orders_checkout_id', 'checkouts', ['checkout_id'], ['id'])
+        batch_op.create_index('ix_orders_checkout', ['checkout_id'], unique=False)
+        batch_op.create_index('ix_orders_vendor_created_id', ['vendor_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False))
+        batch_op.create_index('ix_products_created_id', ['created_at', 'id'], unique=False)
+        batch_op.create_index('ix_products_currency_price', ['currency', 'price_cents'], unique=False)
+        batch_op.create_index('ix_products_vendor_created_id', ['vendor_id', 'created_at', 'id'], unique=False)
+
+    op.create_table('settlements',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('run_id', sa.String(), nullable=True),
+    sa.Column('vendor_id', sa.String(), nullable=True),
+    sa.Column('currency', sa.String(), nullable=True),
+    sa.Column('amount_cents', sa.Integer(), nullable=False),
+    sa.Column('commission_cents', sa.Integer(), nullable=False),
+    sa.Column('payout_count', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['run_id'], ['settlement_runs.id'], ),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('run_id', 'vendor_id', 'currency', name='uq_settlements_run_vendor_currency')
+    )
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('order_id', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('commission_cents', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('settlement_id', sa.String(), nullable=True))
+        batch_op.create_foreign_key('fk_payouts_order_id', 'orders', ['order_id'], ['id'])
+        batch_op.create_foreign_key('fk_payouts_settlement_id', 'settlements', ['settlement_id'], ['id'])
+        batch_op.create_index('ix_payouts_status_id', ['status', 'id'], unique=False)
+    # payouts made before commissions existed paid the vendor everything
+    op.execute("UPDATE payouts SET commission_cents = 0 WHERE commission_cents IS NULL")
+
+    op.create_table('vendor_balances',
+    sa.Column('vendor_id', sa.String(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('pending_payout_cents', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('vendor_id', 'currency')
+    )
+    op.create_table('vendor_daily_sales',
+    sa.Column('vendor_id', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('revenue_cents', sa.Integer(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('vendor_id', 'day', 'currency')
+    )
+    op.create_table('vendor_product_sales',
+    sa.Column('vendor_id', sa.String(), nullable=False),
+    sa.Column('product_id', sa.String(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('vendor_id', 'product_id')
+    )
+    op.create_table('vendor_summaries',
+    sa.Column('vendor_id', sa.String(), nullable=False),
+    sa.Column('orders_paid', sa.Integer(), nullable=False),
+    sa.Column('pending_fulfillment', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('vendor_id')
+    )
+    op.create_table('product_views',
+    sa.Column('product_id', sa.String(), nullable=False),
+    sa.Column('locale', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('price_label', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'locale')
+    )
+    op.create_table('search_terms',
+    sa.Column('term', sa.String(), nullable=False),
+    sa.Column('product_id', sa.String(), nullable=False),
+    sa.Column('weight', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('term', 'product_id')
+    )
+    with op.batch_alter_table('search_terms', schema=None) as batch_op:
+        batch_op.create_index('ix_search_terms_product', ['product_id'], unique=False)
+
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(FTS_DDL)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS product_search")
+    with op.batch_alter_table('search_terms', schema=None) as batch_op:
+        batch_op.drop_index('ix_search_terms_product')
+
+    op.drop_table('search_terms')
+    op.drop_table('product_views')
+    op.drop_table('vendor_summaries')
+    op.drop_table('vendor_product_sales')
+    op.drop_table('vendor_daily_sales')
+    op.drop_table('vendor_balances')
+    with op.batch_alter_table('payouts', schema=None) as batch_op:
+        batch_op.drop_index('ix_payouts_status_id')
+        batch_op.drop_constraint('fk_payouts_settlement_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_payouts_order_id', type_='foreignkey')
+        batch_op.drop_column('settlement_id')
+        batch_op.drop_column('commission_cents')
+        batch_op.drop_column('order_id')
+
+    op.drop_table('settlements')
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_vendor_created_id')
+        batch_op.drop_index('ix_products_currency_price')
+        batch_op.drop_index('ix_products_created_id')
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_vendor_created_id')
+        batch_op.drop_index('ix_orders_checkout')
+        batch_op.drop_constraint('fk_orders_checkout_id', type_='foreignkey')
+        batch_op.drop_column('exchange_rates')
+        batch_op.drop_column('checkout_id')
+
+    op.drop_table('checkouts')
+    with op.batch_alter_table('webhook_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_webhook_events_status_next')
+
+    op.drop_table('webhook_events')
+    op.drop_table('settlement_runs')
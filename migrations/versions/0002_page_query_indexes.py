@@ -0,0 +1,72 @@
+"""page query indexes
+
+One cart line and one wishlist entry per user and product (duplicates are
+merged first: cart quantities are summed into the oldest line), plus indexes
+for the vendor, address and admin recent-orders page queries.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-17 21:02:07.324807
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+
+def _merge_duplicates():
+    # keep the lowest id per (user_id, product_id); carts keep the summed qty
+    op.execute("""
+        UPDATE cart_items SET qty = (
+            SELECT SUM(COALESCE(c.qty, 1)) FROM cart_items c
+            WHERE c.user_id = cart_items.user_id AND c.product_id = cart_items.product_id)
+        WHERE id IN (SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """)
+    for table in ("cart_items", "wishlist_items"):
+        op.execute(f"""
+            DELETE FROM {table} WHERE id NOT IN (
+                SELECT MIN(id) FROM {table} GROUP BY user_id, product_id)
+        """)
+
+
+def upgrade() -> None:
+    _merge_duplicates()
+
+    with op.batch_alter_table('addresses', schema=None) as batch_op:
+        batch_op.create_index('ix_addresses_user', ['user_id'], unique=False)
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_items_user_product', ['user_id', 'product_id'])
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_created_id', ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('vendors', schema=None) as batch_op:
+        batch_op.create_index('ix_vendors_owner', ['owner_id'], unique=False)
+        batch_op.create_index('ix_vendors_status_name', ['status', 'name'], unique=False)
+
+    with op.batch_alter_table('wishlist_items', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_wishlist_items_user_product', ['user_id', 'product_id'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('wishlist_items', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_wishlist_items_user_product', type_='unique')
+
+    with op.batch_alter_table('vendors', schema=None) as batch_op:
+        batch_op.drop_index('ix_vendors_status_name')
+        batch_op.drop_index('ix_vendors_owner')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_created_id')
+
+    with op.batch_alter_table('cart_items', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_items_user_product', type_='unique')
+
+    with op.batch_alter_table('addresses', schema=None) as batch_op:
+        batch_op.drop_index('ix_addresses_user')
@@ -0,0 +1,31 @@
+"""product sku
+
+Products get an optional vendor SKU, unique per vendor, which bulk catalog
+imports (catalog_io.py) upsert on.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 21:14:54.191224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sku', sa.String(), nullable=True))
+        batch_op.create_unique_constraint('uq_products_vendor_sku', ['vendor_id', 'sku'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_products_vendor_sku', type_='unique')
+        batch_op.drop_column('sku')
@@ -0,0 +1,36 @@
+"""admin search indexes
+
+Indexes for the admin page: the vendor review queue by status, order search
+by status or customer (newest first), and order counts by status.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 22:04:31.518730
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.create_index('ix_orders_status_created_id', ['status', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_orders_user_created_id', ['user_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('vendors', schema=None) as batch_op:
+        batch_op.create_index('ix_vendors_status_created_id', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('vendors', schema=None) as batch_op:
+        batch_op.drop_index('ix_vendors_status_created_id')
+
+    with op.batch_alter_table('orders', schema=None) as batch_op:
+        batch_op.drop_index('ix_orders_user_created_id')
+        batch_op.drop_index('ix_orders_status_created_id')
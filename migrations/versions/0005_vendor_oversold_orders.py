@@ -0,0 +1,49 @@
+"""vendor oversold orders
+
+vendor_summaries.orders_oversold: paid orders whose stock ran out. They
+never ship, so they no longer count towards pending_fulfillment ("Awaiting
+shipment" on the dashboard); existing totals are moved over here.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:12:40.226871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+orders = sa.table('orders', sa.column('vendor_id', sa.String()), sa.column('status', sa.String()),
+                  sa.column('fulfillment', sa.JSON()))
+summaries = sa.table('vendor_summaries', sa.column('vendor_id', sa.String()),
+                     sa.column('pending_fulfillment', sa.Integer()), sa.column('orders_oversold', sa.Integer()))
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('vendor_summaries', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('orders_oversold', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    # fulfillment is JSON, so pick the oversold ones out in Python rather than per dialect in SQL
+    bind = op.get_bind()
+    oversold = {}
+    paid = sa.select(orders.c.vendor_id, orders.c.fulfillment).where(
+        orders.c.status == 'PAID', orders.c.vendor_id.isnot(None))
+    for vendor_id, fulfillment in bind.execute(paid):
+        if (fulfillment or {}).get('status') == 'OVERSOLD':
+            oversold[vendor_id] = oversold.get(vendor_id, 0) + 1
+    for vendor_id, count in oversold.items():
+        bind.execute(summaries.update().where(summaries.c.vendor_id == vendor_id).values(
+            pending_fulfillment=summaries.c.pending_fulfillment - count, orders_oversold=count))
+
+
+def downgrade() -> None:
+    op.execute(summaries.update().values(
+        pending_fulfillment=summaries.c.pending_fulfillment + summaries.c.orders_oversold))
+    with op.batch_alter_table('vendor_summaries', schema=None) as batch_op:
+        batch_op.drop_column('orders_oversold')
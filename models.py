@@ -0,0 +1,244 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import (Column, Integer, String, DateTime, Date, ForeignKey, Text, JSON,
+                        Boolean, Index, Float, UniqueConstraint)
+from sqlalchemy.orm import relationship
+
+from db import Base
+
+class User(Base):
+    __tablename__ = "users"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    name = Column(String)
+    email = Column(String, unique=True, index=True)
+    password_hash = Column(String)
+    is_admin = Column(Boolean, default=False)
+    vendor = relationship("Vendor", uselist=False, back_populates="owner")
+    addresses = relationship("Address", back_populates="user")
+
+class Vendor(Base):
+    __tablename__ = "vendors"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    owner_id = Column(String, ForeignKey("users.id"))
+    name = Column(String)
+    description = Column(Text)
+    status = Column(String, default="PENDING")  # PENDING / APPROVED / REJECTED
+    payout_info = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    owner = relationship("User", back_populates="vendor")
+    products = relationship("Product", back_populates="vendor")
+    __table_args__ = (
+        Index("ix_vendors_owner", "owner_id"),
+        # approved vendors by name (catalog filter), counts by status (admin)
+        Index("ix_vendors_status_name", "status", "name"),
+        # admin review queue: WHERE status = ? ORDER BY created_at DESC, id DESC
+        Index("ix_vendors_status_created_id", "status", "created_at", "id"),
+    )
+
+class Product(Base):
+    __tablename__ = "products"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    vendor_id = Column(String, ForeignKey("vendors.id"))
+    sku = Column(String)  # the vendor's own code, optional; bulk imports upsert on (vendor_id, sku)
+    title = Column(JSON)    # {'en': 'Bamboo Basket', 'te': '...', 'hi': '...'}
+    description = Column(JSON)
+    price_cents = Column(Integer, default=0)
+    currency = Column(String, default="USD")
+    stock = Column(Integer, default=0)
+    images = Column(JSON, default=[])  # list of paths/URLs
+    version = Column(Integer, default=1, nullable=False)  # bumped on every edit, keys the product_views cache
+    created_at = Column(DateTime, default=datetime.utcnow)
+    vendor = relationship("Vendor", back_populates="products")
+    __table_args__ = (
+        # keyset pagination for the catalog grid: ORDER BY created_at DESC, id DESC
+        Index("ix_products_created_id", "created_at", "id"),
+        Index("ix_products_vendor_created_id", "vendor_id", "created_at", "id"),
+        Index("ix_products_currency_price", "currency", "price_cents"),
+        UniqueConstraint("vendor_id", "sku", name="uq_products_vendor_sku"),
+    )
+
+class ProductView(Base):
+    # denormalized per-locale display fields, written with the product (see product_views.py)
+    __tablename__ = "product_views"
+    product_id = Column(String, ForeignKey("products.id"), primary_key=True)
+    locale = Column(String, primary_key=True)
+    version = Column(Integer)
+    title = Column(String)
+    description = Column(Text)
+    price_label = Column(String)
+
+class SearchTerm(Base):
+    # inverted index used by search.py on databases without FTS5
+    __tablename__ = "search_terms"
+    term = Column(String, primary_key=True)
+    product_id = Column(String, ForeignKey("products.id"), primary_key=True)
+    weight = Column(Float)
+    __table_args__ = (
+        Index("ix_search_terms_product", "product_id"),
+    )
+
+class Address(Base):
+    __tablename__ = "addresses"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"))
+    line1 = Column(String)
+    city = Column(String)
+    state = Column(String)
+    postal_code = Column(String)
+    country = Column(String)
+    is_default = Column(Boolean, default=False)
+    user = relationship("User", back_populates="addresses")
+    __table_args__ = (
+        Index("ix_addresses_user", "user_id"),
+    )
+
+class CartItem(Base):
+    __tablename__ = "cart_items"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"))
+    product_id = Column(String, ForeignKey("products.id"))
+    qty = Column(Integer, default=1)
+    product = relationship("Product")
+    __table_args__ = (
+        # one line per product in a cart; also serves WHERE user_id = ?
+        UniqueConstraint("user_id", "product_id", name="uq_cart_items_user_product"),
+    )
+
+class WishlistItem(Base):
+    __tablename__ = "wishlist_items"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"))
+    product_id = Column(String, ForeignKey("products.id"))
+    product = relationship("Product")
+    __table_args__ = (
+        UniqueConstraint("user_id", "product_id", name="uq_wishlist_items_user_product"),
+    )
+
+class Checkout(Base):
+    # one customer payment; split into one Order per vendor (see checkout.py)
+    __tablename__ = "checkouts"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = Column(String, ForeignKey("users.id"))
+    total_cents = Column(Integer)
+    currency = Column(String)
+    exchange_rates = Column(JSON, nullable=True)
+    status = Column(String, default="PENDING")  # PENDING / PAID
+    payment_metadata = Column(JSON, nullable=True)
+    address = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    orders = relationship("Order", back_populates="checkout")
+
+class Order(Base):
+    __tablename__ = "orders"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    checkout_id = Column(String, ForeignKey("checkouts.id"), nullable=True)  # None for orders placed before the split
+    user_id = Column(String, ForeignKey("users.id"))
+    vendor_id = Column(String, ForeignKey("vendors.id"), nullable=True)
+    items = Column(JSON)
+    total_cents = Column(Integer)
+    currency = Column(String)
+    exchange_rates = Column(JSON, nullable=True)  # rates used at checkout: {"base": "USD", "as_of": ..., "rates": {...}}
+    status = Column(String, default="PENDING")  # PENDING / PAID / FULFILLING / SHIPPED / DELIVERED / CANCELLED
+    payment_metadata = Column(JSON, nullable=True)
+    fulfillment = Column(JSON, nullable=True)
+    address = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # vendor dashboard order list: WHERE vendor_id = ? ORDER BY created_at DESC, id DESC
+        Index("ix_orders_vendor_created_id", "vendor_id", "created_at", "id"),
+        Index("ix_orders_checkout", "checkout_id"),
+        # admin order search, newest first: unfiltered, by status (and counts by status), by customer
+        Index("ix_orders_created_id", "created_at", "id"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+        Index("ix_orders_user_created_id", "user_id", "created_at", "id"),
+    )
+    checkout = relationship("Checkout", back_populates="orders")
+
+class Payout(Base):
+    __tablename__ = "payouts"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    vendor_id = Column(String, ForeignKey("vendors.id"))
+    order_id = Column(String, ForeignKey("orders.id"), nullable=True)
+    amount_cents = Column(Integer)  # owed to the vendor, after commission
+    commission_cents = Column(Integer, default=0)
+    currency = Column(String)
+    status = Column(String, default="PENDING")  # PENDING / SETTLING (inside a settlement transaction) / SETTLED
+    settlement_id = Column(String, ForeignKey("settlements.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        # settlement walks PENDING payouts in id order, one chunk at a time
+        Index("ix_payouts_status_id", "status", "id"),
+    )
+
+class SettlementRun(Base):
+    # one execution of the settlement job (see payouts.py); OPEN until every payout up to cutoff is settled
+    __tablename__ = "settlement_runs"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = Column(String, default="OPEN")  # OPEN / DONE
+    cutoff = Column(DateTime)  # payouts created after this wait for the next run
+    payouts_settled = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class Settlement(Base):
+    # the total owed to one vendor in one currency for one run
+    __tablename__ = "settlements"
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    run_id = Column(String, ForeignKey("settlement_runs.id"))
+    vendor_id = Column(String, ForeignKey("vendors.id"))
+    currency = Column(String)
+    amount_cents = Column(Integer, default=0, nullable=False)
+    commission_cents = Column(Integer, default=0, nullable=False)
+    payout_count = Column(Integer, default=0, nullable=False)
+    status = Column(String, default="READY")  # READY (to transfer) / PAID
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("run_id", "vendor_id", "currency", name="uq_settlements_run_vendor_currency"),
+    )
+
+# Vendor dashboard totals. Maintained incrementally in the same transaction
+# as the order/payout transition that changes them (see vendor_stats.py).
+class VendorSummary(Base):
+    __tablename__ = "vendor_summaries"
+    vendor_id = Column(String, ForeignKey("vendors.id"), primary_key=True)
+    orders_paid = Column(Integer, default=0, nullable=False)
+    pending_fulfillment = Column(Integer, default=0, nullable=False)  # paid, not yet shipped
+    orders_oversold = Column(Integer, default=0, nullable=False)  # paid, but stock ran out; never ships as is
+
+class VendorDailySales(Base):
+    __tablename__ = "vendor_daily_sales"
+    vendor_id = Column(String, ForeignKey("vendors.id"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC day the order was placed
+    currency = Column(String, primary_key=True)
+    revenue_cents = Column(Integer, default=0, nullable=False)
+    orders = Column(Integer, default=0, nullable=False)
+
+class VendorProductSales(Base):
+    __tablename__ = "vendor_product_sales"
+    vendor_id = Column(String, ForeignKey("vendors.id"), primary_key=True)
+    product_id = Column(String, primary_key=True)  # no FK: totals outlive deleted products
+    units = Column(Integer, default=0, nullable=False)
+
+class VendorBalance(Base):
+    __tablename__ = "vendor_balances"
+    vendor_id = Column(String, ForeignKey("vendors.id"), primary_key=True)
+    currency = Column(String, primary_key=True)
+    pending_payout_cents = Column(Integer, default=0, nullable=False)  # sum of PENDING payouts
+
+class WebhookEvent(Base):
+    __tablename__ = "webhook_events"
+    id = Column(String, primary_key=True)  # Stripe event id, dedupes Stripe retries
+    type = Column(String)
+    payload = Column(JSON)
+    status = Column(String, default="PENDING")  # PENDING / PROCESSING / DONE / DEAD
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    __table_args__ = (
+        Index("ix_webhook_events_status_next", "status", "next_attempt_at"),
+    )
+
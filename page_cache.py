@@ -0,0 +1,131 @@
+"""
+Cache for what app.py reads on every Streamlit rerun (profile, cart,
+wishlist, catalog pages, dashboards), shared by all sessions in the process.
+A rerun where nothing changed is served without touching the database.
+
+Entries are plain data (dicts, tuples), never ORM objects, and are keyed by
+the current generation of the scopes they depend on:
+
+    catalog        products, their views and stock, approved vendors
+    user:<id>      one user's profile, addresses, cart and wishlist
+    vendor:<id>    one vendor's dashboard: summary, products, orders
+    admin          the admin page lists and counters
+
+Writers call invalidate_on_commit(db, scope, ...); the scopes' generations
+are bumped when that session commits (and forgotten if it rolls back), so
+older entries are never looked up again and age out of the LRU. Writes from
+another process (the webhook server under gunicorn) can't reach this
+process's cache, so entries also expire after PAGE_CACHE_TTL seconds.
+PAGE_CACHE_TTL=0 turns caching off.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from instrumentation import span
+
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", "60"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "10000"))
+
+CATALOG = "catalog"
+ADMIN = "admin"
+
+
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+
+def vendor_scope(vendor_id):
+    return f"vendor:{vendor_id}"
+
+
+class PageCache:
+    """Thread-safe LRU with a TTL, keyed by (name, args, scope generations)."""
+
+    def __init__(self, maxsize=PAGE_CACHE_SIZE, ttl=PAGE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (stored monotonic, value)
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.invalidations = 0
+
+    def _key(self, name, scopes, args):
+        return (name, args) + tuple(self._generations.get(s, 0) for s in scopes)
+
+    def get_or_load(self, name, scopes, load, *args):
+        """The cached value of load(*args), calling it on a miss. args must be hashable."""
+        if self.ttl <= 0:
+            return load(*args)
+        with self._lock:
+            key = self._key(name, scopes, args)
+            entry = self._data.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._data.move_to_end(key)
+                self.hits[name] = self.hits.get(name, 0) + 1
+                return entry[1]
+            self.misses[name] = self.misses.get(name, 0) + 1
+        value = load(*args)
+        with self._lock:
+            # keyed by the generations seen before loading: an invalidation
+            # that raced with the load leaves this entry unreachable
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            self.invalidations += len(scopes)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "hits": sum(self.hits.values()),
+                "misses": sum(self.misses.values()),
+                "invalidations": self.invalidations,
+                "by_name": {n: {"hits": self.hits.get(n, 0), "misses": self.misses.get(n, 0)}
+                            for n in sorted(set(self.hits) | set(self.misses))},
+            }
+
+
+page_cache = PageCache()
+
+
+def cached(db, name, scopes, load, *args):
+    """load(db, *args) through page_cache; the key is name, args and the scopes' generations."""
+    def _load(*a):
+        with span(f"load:{name}"):
+            return load(db, *a)
+    return page_cache.get_or_load(name, scopes, _load, *args)
+
+
+def invalidate_on_commit(db, *scopes):
+    """Invalidate scopes once db's current transaction commits."""
+    db.info.setdefault("page_cache_scopes", set()).update(s for s in scopes if s)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    scopes = session.info.pop("page_cache_scopes", None)
+    if scopes:
+        page_cache.invalidate(*scopes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _after_rollback(session, previous_transaction):
+    session.info.pop("page_cache_scopes", None)
@@ -0,0 +1,175 @@
+"""
+Vendor payouts: the commission taken when an order is paid, and the
+settlement job that rolls PENDING payouts up into one Settlement per vendor
+and currency.
+
+COMMISSION_RULES is a JSON list (inline, or file:/path/rules.json). The
+first rule whose conditions all match the order applies; orders matching no
+rule pay COMMISSION_RATE (default 0.10):
+
+    [{"vendor_id": "...", "rate": "0.08"},
+     {"currency": "INR", "rate": "0.12", "fixed_cents": 500},
+     {"min_total_cents": 100000, "rate": "0.07"}]
+
+Settlement runs from cron or the admin page (`python payouts.py`). It works
+through the payouts in chunks of SETTLEMENT_CHUNK, one transaction per
+chunk. Each transaction claims the chunk with a conditional UPDATE, adds the
+chunk's per-(vendor, currency) sums to the run's settlements with one
+INSERT ... SELECT ... GROUP BY ... ON CONFLICT, and marks the payouts
+SETTLED. Payout rows are never loaded into Python. A crash rolls back only
+the chunk in flight, and the next invocation resumes the OPEN run.
+"""
+import os
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import and_, bindparam, func, literal, select
+
+from db import upsert_insert
+from models import Payout, Settlement, SettlementRun, VendorBalance
+from page_cache import ADMIN, invalidate_on_commit, vendor_scope
+from vendor_stats import record_payout_balance
+
+COMMISSION_RATE = os.getenv("COMMISSION_RATE", "0.10")
+COMMISSION_RULES = os.getenv("COMMISSION_RULES", "")
+SETTLEMENT_CHUNK = int(os.getenv("SETTLEMENT_CHUNK", "10000"))
+
+log = logging.getLogger("payouts")
+
+
+def load_commission_rules(spec=COMMISSION_RULES):
+    if not spec:
+        return []
+    if spec.startswith("file:"):
+        with open(spec[len("file:"):], encoding="utf-8") as f:
+            rules = json.load(f)
+    else:
+        rules = json.loads(spec)
+    return [dict(r, rate=Decimal(str(r.get("rate", COMMISSION_RATE))), fixed_cents=int(r.get("fixed_cents", 0)))
+            for r in rules]
+
+
+commission_rules = load_commission_rules()
+_DEFAULT_RULE = {"rate": Decimal(COMMISSION_RATE), "fixed_cents": 0}
+
+
+def _matches(rule, order):
+    return (rule.get("vendor_id") in (None, order.vendor_id)
+            and rule.get("currency") in (None, order.currency)
+            and (order.total_cents or 0) >= rule.get("min_total_cents", 0))
+
+
+def commission_for(order, rules=None):
+    """Platform commission in the order's currency cents, never more than the total."""
+    rules = commission_rules if rules is None else rules
+    rule = next((r for r in rules if _matches(r, order)), _DEFAULT_RULE)
+    total = order.total_cents or 0
+    cut = int((Decimal(total) * rule["rate"]).quantize(Decimal(1), ROUND_HALF_UP)) + rule["fixed_cents"]
+    return max(0, min(total, cut))
+
+
+def create_payout(db, order):
+    """Queue the vendor's share of a paid order. Returns the amount. Does not commit."""
+    if not order.vendor_id:
+        return 0  # nobody to pay; the platform keeps it
+    commission = commission_for(order)
+    amount = (order.total_cents or 0) - commission
+    db.add(Payout(vendor_id=order.vendor_id, order_id=order.id, amount_cents=amount,
+                  commission_cents=commission, currency=order.currency, status="PENDING"))
+    record_payout_balance(db, order.vendor_id, order.currency, amount)
+    return amount
+
+
+def open_settlement_run(db):
+    """The unfinished run to resume, or a new one covering payouts created until now."""
+    run = db.query(SettlementRun).filter_by(status="OPEN").order_by(SettlementRun.created_at).first()
+    if run is None:
+        run = SettlementRun(status="OPEN", cutoff=datetime.utcnow())
+        db.add(run)
+        db.commit()
+    return run
+
+
+def _add_to_settlements(db, rows):
+    """Add per-(vendor, currency) chunk totals to the run's settlements, one statement per dialect."""
+    table = Settlement.__table__
+    insert = upsert_insert(db)
+    if insert is not None:
+        stmt = insert(table).from_select(
+            ["id", "run_id", "vendor_id", "currency", "amount_cents", "commission_cents",
+             "payout_count", "status", "created_at"], rows)
+        deltas = ("amount_cents", "commission_cents", "payout_count")
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["id"], set_={c: table.c[c] + stmt.excluded[c] for c in deltas}))
+        return
+    for sid, run_id, vendor_id, currency, amount, commission, count, status, created_at in db.execute(rows):
+        if not db.execute(table.update().where(table.c.id == sid).values(
+                amount_cents=table.c.amount_cents + amount, commission_cents=table.c.commission_cents + commission,
+                payout_count=table.c.payout_count + count)).rowcount:
+            db.execute(table.insert().values(
+                id=sid, run_id=run_id, vendor_id=vendor_id, currency=currency, amount_cents=amount,
+                commission_cents=commission, payout_count=count, status=status, created_at=created_at))
+
+
+def _settle_chunk(db, run, chunk_size):
+    """Settle up to chunk_size of the run's payouts in one transaction. Returns how many."""
+    pending = and_(Payout.status == "PENDING", Payout.created_at <= run.cutoff, Payout.vendor_id.isnot(None))
+    upper = (db.query(Payout.id).filter(pending).order_by(Payout.id)
+             .offset(chunk_size - 1).limit(1).scalar())
+    chunk = pending if upper is None else and_(pending, Payout.id <= upper)
+    claimed = db.query(Payout).filter(chunk).update({Payout.status: "SETTLING"}, synchronize_session=False)
+    if not claimed:
+        db.rollback()
+        return 0
+    settling = Payout.status == "SETTLING"
+    # deterministic id, so every chunk of a run adds to the same settlement row
+    settlement_id = literal(f"{run.id}:") + Payout.vendor_id + ":" + Payout.currency
+    amount = func.sum(Payout.amount_cents)
+    _add_to_settlements(db, (
+        select(settlement_id, literal(run.id), Payout.vendor_id, Payout.currency, amount,
+               func.coalesce(func.sum(Payout.commission_cents), 0), func.count(),
+               literal("READY"), literal(datetime.utcnow()))
+        .where(settling).group_by(Payout.vendor_id, Payout.currency)))
+    balances = VendorBalance.__table__
+    paid_out = [{"vid": vid, "cur": cur, "amount": amt or 0} for vid, cur, amt in
+                db.execute(select(Payout.vendor_id, Payout.currency, amount)
+                           .where(settling).group_by(Payout.vendor_id, Payout.currency))]
+    db.execute(balances.update()
+               .where(balances.c.vendor_id == bindparam("vid"), balances.c.currency == bindparam("cur"))
+               .values(pending_payout_cents=balances.c.pending_payout_cents - bindparam("amount")),
+               paid_out)
+    invalidate_on_commit(db, ADMIN, *(vendor_scope(row["vid"]) for row in paid_out))
+    (db.query(Payout).filter(settling)
+     .update({Payout.status: "SETTLED", Payout.settlement_id: settlement_id}, synchronize_session=False))
+    (db.query(SettlementRun).filter(SettlementRun.id == run.id)
+     .update({SettlementRun.payouts_settled: SettlementRun.payouts_settled + claimed}, synchronize_session=False))
+    db.commit()
+    return claimed
+
+
+def run_settlement(db, chunk_size=SETTLEMENT_CHUNK):
+    """Settle every PENDING payout up to the run's cutoff. Returns the finished SettlementRun."""
+    run = open_settlement_run(db)
+    run_id = run.id
+    while True:
+        settled = _settle_chunk(db, run, chunk_size)
+        log.info("settlement %s: %d payouts in chunk", run_id, settled)
+        if settled < chunk_size:
+            break
+    (db.query(SettlementRun).filter(SettlementRun.id == run_id, SettlementRun.status == "OPEN")
+     .update({SettlementRun.status: "DONE", SettlementRun.finished_at: datetime.utcnow()},
+             synchronize_session=False))
+    invalidate_on_commit(db, ADMIN)
+    db.commit()
+    return db.get(SettlementRun, run_id)
+
+
+if __name__ == "__main__":
+    from db import session_scope
+    logging.basicConfig(level=logging.INFO)
+    with session_scope() as db:
+        run = run_settlement(db)
+        count = db.query(func.count(Settlement.id)).filter(Settlement.run_id == run.id).scalar()
+        log.info("run %s settled %d payouts into %d settlements", run.id, run.payouts_settled, count)
@@ -0,0 +1,160 @@
+"""
+Localized read model for product listings. Every product write stores one
+product_views row per locale with the display title, description and price
+label already resolved (locale -> "en" fallback applied), so pages never
+parse the title/description JSON columns.
+
+Pages look views up by (product_id, version) through an in-process LRU keyed
+by (product_id, locale, version). Product.version is bumped on every edit,
+so a stale entry can never be served, even by another process's cache.
+Stock is deliberately not part of the view: it changes on every sale and is
+read live from the (slim) product row.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from models import Product, ProductView
+from page_cache import CATALOG, invalidate_on_commit, vendor_scope
+from search import index_product, unindex_product
+from embeddings import index_product_embedding, unindex_product_embedding
+
+SUPPORTED_LOCALES = ("en", "te", "hi")
+PRODUCT_VIEW_CACHE_SIZE = int(os.getenv("PRODUCT_VIEW_CACHE_SIZE", "20000"))
+
+
+def _localized(field, locale):
+    field = field or {}
+    return field.get(locale) or field.get("en") or ""
+
+
+def price_label(price_cents, currency):
+    return f"{(price_cents or 0) / 100.0:.2f} {currency}"
+
+
+def build_view(product, locale):
+    return {
+        "product_id": product.id,
+        "version": product.version,
+        "title": _localized(product.title, locale) or "-",
+        "description": _localized(product.description, locale),
+        "price_label": price_label(product.price_cents, product.currency),
+    }
+
+
+class ViewCache:
+    """Thread-safe LRU of view dicts keyed by (product_id, locale, version)."""
+
+    def __init__(self, maxsize=PRODUCT_VIEW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, product_id):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == product_id]:
+                del self._data[key]
+
+
+view_cache = ViewCache()
+
+
+def sync_product_views(db, product):
+    """Rewrite the product's per-locale rows. Does not commit."""
+    sync_product_views_many(db, [product])
+
+
+def sync_product_views_many(db, products):
+    """Rewrite the per-locale rows of many products with one DELETE and one INSERT. Does not commit."""
+    products = list(products)
+    if not products:
+        return
+    db.query(ProductView).filter(ProductView.product_id.in_([p.id for p in products])).delete(synchronize_session=False)
+    db.execute(ProductView.__table__.insert(),
+               [dict(build_view(p, locale), locale=locale) for p in products for locale in SUPPORTED_LOCALES])
+
+
+def save_product(db, product, **changes):
+    """
+    Create or edit a product, its views and its search entry in one commit,
+    then refresh its assistant embedding.
+    """
+    for name, value in changes.items():
+        setattr(product, name, value)
+    if product.id is not None and product.version is not None:
+        product.version += 1
+    else:
+        product.version = 1
+    db.add(product)
+    db.flush()  # assigns the id of a new product
+    sync_product_views(db, product)
+    invalidate_on_commit(db, CATALOG, vendor_scope(product.vendor_id))
+    index_product(db, product)
+    db.commit()
+    view_cache.invalidate(product.id)
+    index_product_embedding(product)
+    return product
+
+
+def delete_product(db, product):
+    pid = product.id
+    invalidate_on_commit(db, CATALOG, vendor_scope(product.vendor_id))
+    db.query(ProductView).filter(ProductView.product_id == pid).delete(synchronize_session=False)
+    unindex_product(db, pid)
+    db.delete(product)
+    db.commit()
+    view_cache.invalidate(pid)
+    unindex_product_embedding(pid)
+
+
+def get_views(db, keys, locale):
+    """
+    keys: iterable of (product_id, version). Returns {product_id: view dict}.
+    Cache misses are read from product_views in one query; products without a
+    current view row (written before this table existed) are built from the
+    product row instead.
+    """
+    keys = list(keys)
+    views, missing = {}, {}
+    for pid, version in keys:
+        v = view_cache.get((pid, locale, version))
+        if v is None:
+            missing[pid] = version
+        else:
+            views[pid] = v
+    if missing:
+        rows = (db.query(ProductView)
+                .filter(ProductView.locale == locale, ProductView.product_id.in_(list(missing)))
+                .all())
+        for r in rows:
+            if r.version == missing[r.product_id]:
+                v = {"product_id": r.product_id, "version": r.version, "title": r.title,
+                     "description": r.description, "price_label": r.price_label}
+                views[r.product_id] = v
+                view_cache.put((r.product_id, locale, r.version), v)
+                del missing[r.product_id]
+    if missing:
+        for p in db.query(Product).filter(Product.id.in_(list(missing))).all():
+            v = build_view(p, locale)
+            views[p.id] = v
+            view_cache.put((p.id, locale, p.version), v)
+    return views
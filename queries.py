@@ -0,0 +1,165 @@
+"""
+Queries behind the app's list pages: cart and wishlist lines, the catalog and
+vendor orders (keyset pagination on (created_at, id)), and the admin lists.
+Each is meant to be answered from an index; benchmarks/check_query_plans.py
+checks that on a large seeded database.
+"""
+import os
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import joinedload, load_only
+
+from product_views import get_views
+from models import User, Vendor, Product, CartItem, WishlistItem, Order
+
+
+# ------------------------------
+# Cart / wishlist loaders
+# ------------------------------
+# Lines come back with a slim Product joined in (display text comes from
+# product_views), so rendering never issues a query per line. Lines whose
+# product has been deleted have product = None.
+_LINE_PRODUCT_COLUMNS = (Product.id, Product.version, Product.vendor_id, Product.price_cents, Product.currency)
+
+def load_cart_lines(db, user_id):
+    return (db.query(CartItem).options(joinedload(CartItem.product).load_only(*_LINE_PRODUCT_COLUMNS))
+            .filter(CartItem.user_id == user_id).all())
+
+def load_wishlist_lines(db, user_id):
+    return (db.query(WishlistItem).options(joinedload(WishlistItem.product).load_only(*_LINE_PRODUCT_COLUMNS))
+            .filter(WishlistItem.user_id == user_id).all())
+
+def line_views(db, lines, locale):
+    return get_views(db, [(it.product.id, it.product.version) for it in lines if it.product], locale)
+
+# ------------------------------
+# Catalog queries (keyset pagination)
+# ------------------------------
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24"))
+
+def encode_cursor(row) -> str:
+    return f"{row.created_at.isoformat()}|{row.id}"
+
+def decode_cursor(cursor: str):
+    created_at, _, pid = cursor.partition("|")
+    return datetime.fromisoformat(created_at), pid
+
+def query_catalog(db, after=None, before=None, limit=CATALOG_PAGE_SIZE, vendor_id=None,
+                  min_price_cents=None, max_price_cents=None, in_stock=False, currency=None):
+    """
+    One page of products, newest first, seeking on (created_at, id) instead of OFFSET.
+    after/before: cursor strings from a previous page (next / previous page).
+    Returns (products, next_cursor, prev_cursor); a cursor is None when there is no such page.
+    Products are slim rows (no title/description JSON); display text comes from get_views().
+    """
+    q = db.query(Product).options(load_only(Product.id, Product.created_at, Product.version, Product.stock, Product.images))
+    if vendor_id:
+        q = q.filter(Product.vendor_id == vendor_id)
+    if currency:
+        q = q.filter(Product.currency == currency)
+    if min_price_cents is not None:
+        q = q.filter(Product.price_cents >= min_price_cents)
+    if max_price_cents is not None:
+        q = q.filter(Product.price_cents <= max_price_cents)
+    if in_stock:
+        q = q.filter(Product.stock > 0)
+
+    return keyset_page(q, Product, after, before, limit)
+
+def keyset_page(q, model, after=None, before=None, limit=CATALOG_PAGE_SIZE):
+    """
+    Run query q one page at a time on (model.created_at, model.id), newest first.
+    Returns (rows, next_cursor, prev_cursor).
+    """
+    if before:
+        created_at, rid = decode_cursor(before)
+        q = q.filter(or_(model.created_at > created_at,
+                         and_(model.created_at == created_at, model.id > rid)))
+        q = q.order_by(model.created_at.asc(), model.id.asc())
+    else:
+        if after:
+            created_at, rid = decode_cursor(after)
+            q = q.filter(or_(model.created_at < created_at,
+                             and_(model.created_at == created_at, model.id < rid)))
+        q = q.order_by(model.created_at.desc(), model.id.desc())
+
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after is not None
+    if not rows:
+        return [], None, None
+    next_cursor = encode_cursor(rows[-1]) if has_next else None
+    prev_cursor = encode_cursor(rows[0]) if has_prev else None
+    return rows, next_cursor, prev_cursor
+
+VENDOR_ORDERS_PAGE_SIZE = int(os.getenv("VENDOR_ORDERS_PAGE_SIZE", "20"))
+
+def query_vendor_orders(db, vendor_id, after=None, before=None, limit=VENDOR_ORDERS_PAGE_SIZE):
+    """One page of the vendor's orders, newest first (uses ix_orders_vendor_created_id)."""
+    q = (db.query(Order)
+         .options(load_only(Order.id, Order.created_at, Order.status, Order.total_cents,
+                            Order.currency, Order.fulfillment))
+         .filter(Order.vendor_id == vendor_id))
+    return keyset_page(q, Order, after, before, limit)
+
+VENDOR_PRODUCTS_PAGE_SIZE = int(os.getenv("VENDOR_PRODUCTS_PAGE_SIZE", "20"))
+
+def query_vendor_products(db, vendor_id, after=None, before=None, limit=VENDOR_PRODUCTS_PAGE_SIZE):
+    """One page of the vendor's products, newest first (uses ix_products_vendor_created_id)."""
+    q = (db.query(Product)
+         .options(load_only(Product.id, Product.created_at, Product.version, Product.stock, Product.images))
+         .filter(Product.vendor_id == vendor_id))
+    return keyset_page(q, Product, after, before, limit)
+
+# ------------------------------
+# Admin / filter lists
+# ------------------------------
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "25"))
+
+def vendor_applications(db, status="PENDING", after=None, before=None, limit=ADMIN_PAGE_SIZE):
+    """One page of vendors in status, newest first, owners joined in (uses ix_vendors_status_created_id)."""
+    q = (db.query(Vendor).options(joinedload(Vendor.owner).load_only(User.id, User.email))
+         .filter(Vendor.status == status))
+    return keyset_page(q, Vendor, after, before, limit)
+
+def approved_vendor_names(db):
+    return db.query(Vendor.id, Vendor.name).filter(Vendor.status == "APPROVED").order_by(Vendor.name).all()
+
+def search_orders(db, status=None, vendor_id=None, user_id=None, order_id=None, created_from=None,
+                  created_to=None, after=None, before=None, limit=ADMIN_PAGE_SIZE):
+    """
+    One page of the orders matching every filter given, newest first.
+    created_from/created_to are dates, both inclusive. Whichever of vendor,
+    customer or status is set picks the index (ix_orders_*_created_id); the
+    date range is a range on its created_at.
+    """
+    q = db.query(Order).options(load_only(Order.id, Order.created_at, Order.user_id, Order.vendor_id,
+                                          Order.status, Order.total_cents, Order.currency))
+    if order_id:
+        q = q.filter(Order.id == order_id)
+    if vendor_id:
+        q = q.filter(Order.vendor_id == vendor_id)
+    if user_id:
+        q = q.filter(Order.user_id == user_id)
+    if status:
+        q = q.filter(Order.status == status)
+    if created_from:
+        q = q.filter(Order.created_at >= datetime.combine(created_from, time.min))
+    if created_to:
+        q = q.filter(Order.created_at < datetime.combine(created_to + timedelta(days=1), time.min))
+    return keyset_page(q, Order, after, before, limit)
+
+def find_user_id(db, email_or_id):
+    """The id of the user with that email or id, or None."""
+    return (db.query(User.id).filter(or_(User.email == email_or_id, User.id == email_or_id))
+            .limit(1).scalar())
+
+def status_counts(db, model):
+    """{status: rows} for model's table, one GROUP BY over an index leading with status."""
+    return dict(db.query(model.status, func.count()).group_by(model.status).all())
@@ -0,0 +1,185 @@
+"""
+Exchange rates for checkout. Rates are USD-based Decimals, served from an
+in-process cache: after RATES_TTL seconds the cached snapshot is still served
+while one background thread refreshes it (stale-while-revalidate). Only a cold
+cache, or one older than RATES_TTL + RATES_MAX_STALE, blocks the caller.
+If that fetch fails the last snapshot is served anyway, and the source is
+not asked again for RATES_RETRY_INTERVAL seconds. With no snapshot at all
+the caller gets RatesUnavailable.
+
+RATES_SOURCE selects where rates come from:
+    static                  built-in placeholder rates (default)
+    file:/path/rates.json   {"base": "USD", "rates": {"INR": "82.0", ...}}
+    https://...             same JSON shape, fetched over HTTP
+"""
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+RATES_SOURCE = os.getenv("RATES_SOURCE", "static")
+RATES_TTL = float(os.getenv("RATES_TTL", "3600"))
+RATES_MAX_STALE = float(os.getenv("RATES_MAX_STALE", "86400"))
+RATES_HTTP_TIMEOUT = float(os.getenv("RATES_HTTP_TIMEOUT", "5"))
+RATES_RETRY_INTERVAL = float(os.getenv("RATES_RETRY_INTERVAL", "30"))  # seconds between fetches after a failure
+
+log = logging.getLogger("rates")
+
+# Exchange rates placeholder (USD base). Replace with a live source in production
+DEFAULT_RATES = {"USD": "1.0", "INR": "82.0", "EUR": "0.92"}
+
+
+class RatesUnavailable(Exception):
+    """No exchange rates could be loaded and none are cached."""
+
+
+class UnknownCurrency(Exception):
+    """A price or checkout currency the rate snapshot has no rate for."""
+
+    def __init__(self, currency):
+        super().__init__(f"no exchange rate for {currency}")
+        self.currency = currency
+
+
+def _parse(doc):
+    if doc.get("base", "USD") != "USD":
+        raise ValueError("rates must be USD-based")
+    rates = {k.upper(): Decimal(str(v)) for k, v in doc["rates"].items()}
+    rates["USD"] = Decimal(1)
+    return rates
+
+
+class StaticRateSource:
+    def __init__(self, rates=None):
+        self.rates = _parse({"rates": rates or DEFAULT_RATES})
+
+    def fetch(self):
+        return dict(self.rates)
+
+
+class FileRateSource:
+    """Local JSON file, for offline development and tests (see fixtures/exchange_rates.json)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def fetch(self):
+        with open(self.path, encoding="utf-8") as f:
+            return _parse(json.load(f))
+
+
+class HttpRateSource:
+    def __init__(self, url, timeout=RATES_HTTP_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        import requests
+        res = requests.get(self.url, timeout=self.timeout)
+        res.raise_for_status()
+        return _parse(res.json())
+
+
+def source_from_env(spec=RATES_SOURCE):
+    if spec.startswith("file:"):
+        return FileRateSource(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HttpRateSource(spec)
+    return StaticRateSource()
+
+
+class RateProvider:
+    def __init__(self, source, ttl=RATES_TTL, max_stale=RATES_MAX_STALE, retry_interval=RATES_RETRY_INTERVAL):
+        self.source = source
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.retry_interval = retry_interval
+        self._snapshot = None  # {"rates": {...}, "as_of": iso str, "fetched": monotonic}
+        self._retry_at = 0.0  # monotonic; after a failed fetch the source is left alone until then
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self):
+        try:
+            rates = self.source.fetch()
+        except Exception:
+            self._retry_at = time.monotonic() + self.retry_interval
+            raise
+        snap = {"rates": rates, "as_of": datetime.utcnow().isoformat(), "fetched": time.monotonic()}
+        self._snapshot = snap
+        return snap
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._retry_at:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self._load()
+            except Exception:
+                log.exception("exchange rate refresh failed; serving cached rates")
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name="rates-refresh", daemon=True).start()
+
+    def snapshot(self):
+        """The current snapshot, or the last one if the source is down. Raises RatesUnavailable."""
+        snap = self._snapshot
+        if snap is not None:
+            age = time.monotonic() - snap["fetched"]
+            if age <= self.ttl:
+                return snap
+            if age <= self.ttl + self.max_stale or time.monotonic() < self._retry_at:
+                self._refresh_in_background()
+                return snap
+        elif time.monotonic() < self._retry_at:
+            raise RatesUnavailable("exchange rates are unavailable")
+        with self._lock:
+            # another caller may have loaded it while we waited
+            snap = self._snapshot
+            if snap is not None and time.monotonic() - snap["fetched"] <= self.ttl:
+                return snap
+            try:
+                return self._load()
+            except Exception as e:
+                if snap is None:
+                    log.exception("exchange rates unavailable")
+                    raise RatesUnavailable("exchange rates are unavailable") from e
+                log.exception("exchange rate refresh failed; serving rates as of %s", snap["as_of"])
+                return snap
+
+    def currencies(self):
+        rates = self.snapshot()["rates"]
+        return ["USD"] + sorted(c for c in rates if c != "USD")
+
+
+rate_provider = RateProvider(source_from_env())
+
+_CENT = Decimal(1)
+
+
+def price_lines(lines, currency, snapshot):
+    """
+    Convert every (price_cents, from_currency, qty) in one pass with Decimal
+    math. Returns (unit_amounts_cents, total_cents, fx) where fx is the rate
+    snapshot to store on the order. Raises UnknownCurrency.
+    """
+    rates = snapshot["rates"]
+    for code in {currency} | {src or "USD" for _, src, _ in lines}:
+        if code not in rates:
+            raise UnknownCurrency(code)
+    target = rates[currency]
+    units = [
+        int((Decimal(price_cents) * target / rates[src or "USD"]).quantize(_CENT, ROUND_HALF_UP))
+        for price_cents, src, _ in lines
+    ]
+    total = sum(u * qty for u, (_, _, qty) in zip(units, lines))
+    used = {src or "USD" for _, src, _ in lines} | {currency}
+    fx = {"base": "USD", "as_of": snapshot["as_of"], "rates": {c: str(rates[c]) for c in sorted(used)}}
+    return units, total, fx
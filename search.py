@@ -0,0 +1,167 @@
+"""
+Product search over the multilingual title/description JSON.
+
+Text is tokenized here, the same way for documents and queries: NFC,
+casefold, and runs of word characters including the Devanagari and Telugu
+blocks, so vowel signs and viramas stay inside their word (SQLite's unicode61
+tokenizer would split on them).
+
+On SQLite the tokens go into an FTS5 table (ascii tokenizer, which leaves
+non-ASCII tokens whole) ranked with bm25. Other databases use the
+search_terms inverted index table. Both are kept current by
+product_views.save_product()/delete_product().
+"""
+import os
+import re
+import hashlib
+import unicodedata
+from collections import Counter
+
+from sqlalchemy import text
+
+from models import Product, SearchTerm
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "24"))
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# \w plus the Devanagari (minus the danda punctuation) and Telugu blocks
+_TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u097F\u0C00-\u0C7F\u200C\u200D]+")
+
+
+def tokenize(value):
+    value = unicodedata.normalize("NFC", value or "").casefold()
+    return [t for t in (m.replace("\u200c", "").replace("\u200d", "") for m in _TOKEN.findall(value)) if t]
+
+
+def _field_tokens(field):
+    # {'en': ..., 'te': ..., 'hi': ...} -> tokens of every locale
+    return [t for v in (field or {}).values() for t in tokenize(v)]
+
+
+def _use_fts(db):
+    return db.get_bind().dialect.name == "sqlite"
+
+
+FTS_DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+           "USING fts5(product_id UNINDEXED, title, description, tokenize='ascii')")
+
+
+def ensure_search_index(db):
+    """Create the FTS5 table on SQLite. Migrations do this too; for throwaway databases. Commits."""
+    if _use_fts(db):
+        db.execute(text(FTS_DDL))
+        db.commit()
+
+
+_FTS_INSERT = ("INSERT INTO product_search (rowid, product_id, title, description) "
+               "VALUES (:rowid, :pid, :title, :description)")
+
+
+def _rowid(product_id):
+    # FTS5 only indexes rowid, so derive a stable 63-bit one from the product id;
+    # updates and deletes then hit a single row instead of scanning the table
+    return int.from_bytes(hashlib.blake2b(product_id.encode(), digest_size=8).digest(), "big") >> 1
+
+
+def _fts_row(product):
+    return {"rowid": _rowid(product.id), "pid": product.id,
+            "title": " ".join(_field_tokens(product.title)),
+            "description": " ".join(_field_tokens(product.description))}
+
+
+def _term_rows(product):
+    weights = Counter()
+    for t in _field_tokens(product.title):
+        weights[t] += TITLE_WEIGHT
+    for t in _field_tokens(product.description):
+        weights[t] += DESCRIPTION_WEIGHT
+    return [{"term": t, "product_id": product.id, "weight": w} for t, w in weights.items()]
+
+
+def unindex_product(db, product_id):
+    if _use_fts(db):
+        db.execute(text("DELETE FROM product_search WHERE rowid = :rowid"), {"rowid": _rowid(product_id)})
+    else:
+        db.query(SearchTerm).filter(SearchTerm.product_id == product_id).delete(synchronize_session=False)
+
+
+def index_products(db, products):
+    """(Re)index products. Does not commit."""
+    products = list(products)
+    if not products:
+        return
+    if _use_fts(db):
+        # one executemany for the deletes, one for the inserts
+        db.execute(text("DELETE FROM product_search WHERE rowid = :rowid"),
+                   [{"rowid": _rowid(p.id)} for p in products])
+        db.execute(text(_FTS_INSERT),
+                   [_fts_row(p) for p in products])
+    else:
+        (db.query(SearchTerm).filter(SearchTerm.product_id.in_([p.id for p in products]))
+         .delete(synchronize_session=False))
+        rows = [r for p in products for r in _term_rows(p)]
+        if rows:
+            db.execute(SearchTerm.__table__.insert(), rows)
+
+
+def index_product(db, product):
+    index_products(db, [product])
+
+
+def rebuild_search_index(db, batch_size=2000):
+    """Index every product from scratch (backfill). Commits per batch."""
+    if _use_fts(db):
+        db.execute(text("DELETE FROM product_search"))
+    else:
+        db.query(SearchTerm).delete(synchronize_session=False)
+    db.commit()
+    last_id = ""
+    while True:
+        batch = (db.query(Product).filter(Product.id > last_id)
+                 .order_by(Product.id).limit(batch_size).all())
+        if not batch:
+            break
+        if _use_fts(db):
+            db.execute(text(_FTS_INSERT),
+                       [_fts_row(p) for p in batch])
+        else:
+            db.execute(SearchTerm.__table__.insert(), [r for p in batch for r in _term_rows(p)])
+        db.commit()
+        last_id = batch[-1].id
+        db.expunge_all()
+
+
+def search_products(db, query, page=0, page_size=SEARCH_PAGE_SIZE):
+    """
+    Product ids matching every query token, best match first.
+    Returns (product_ids, has_more).
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return [], False
+    params = {"limit": page_size + 1, "offset": page * page_size}
+    if _use_fts(db):
+        # last token matches as a prefix, so results show up while typing
+        match = " AND ".join(f'"{t}"' for t in tokens[:-1]) + (" AND " if len(tokens) > 1 else "") + f'"{tokens[-1]}"*'
+        params["match"] = match
+        rows = db.execute(text(
+            "SELECT product_id FROM product_search WHERE product_search MATCH :match "
+            f"ORDER BY bm25(product_search, 0, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}) "
+            "LIMIT :limit OFFSET :offset"), params).all()
+    else:
+        params.update({f"t{i}": t for i, t in enumerate(tokens)})
+        params["n"] = len(tokens)
+        placeholders = ", ".join(f":t{i}" for i in range(len(tokens)))
+        rows = db.execute(text(
+            f"SELECT product_id FROM search_terms WHERE term IN ({placeholders}) "
+            "GROUP BY product_id HAVING COUNT(*) = :n "
+            "ORDER BY SUM(weight) DESC, product_id LIMIT :limit OFFSET :offset"), params).all()
+    ids = [r[0] for r in rows]
+    return ids[:page_size], len(ids) > page_size
+
+
+if __name__ == "__main__":
+    from db import session_scope
+    with session_scope() as db:
+        rebuild_search_index(db)
@@ -0,0 +1,133 @@
+"""
+Stripe API calls made by the app. There is one StripeClient per process, on
+a pooled requests.Session, so connections to Stripe are kept alive and
+reused across checkouts. Every call has connect and read timeouts and is
+retried STRIPE_MAX_RETRIES times with exponential backoff and jitter
+(stripe's own retry loop) on connection errors, timeouts, 409s and 5xx.
+
+Checkout sessions are created on a small thread pool:
+start_checkout_session() returns at once and the checkout page polls
+checkout_session_status() until the payment URL is there, so a slow Stripe
+never blocks a rerun. The idempotency key is derived from the checkout id:
+a double click, a rerun or a retry after a timeout gets back the same Stripe
+session instead of creating another. The session id and URL are saved on
+the Checkout row.
+
+STRIPE_API_BASE points the client at another server; see
+fixtures/stripe_stub.py for a local stand-in.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import STRIPE_SECRET_KEY, STRIPE_API_BASE, APP_URL
+from db import session_scope
+from models import Checkout
+
+STRIPE_CONNECT_TIMEOUT = float(os.getenv("STRIPE_CONNECT_TIMEOUT", "3"))  # seconds
+STRIPE_READ_TIMEOUT = float(os.getenv("STRIPE_READ_TIMEOUT", "10"))  # seconds, per attempt
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", "2"))
+STRIPE_WORKERS = int(os.getenv("STRIPE_WORKERS", "4"))
+STRIPE_POLL_INTERVAL = float(os.getenv("STRIPE_POLL_INTERVAL", "0.5"))  # seconds between checkout page polls
+
+log = logging.getLogger("stripe_gateway")
+
+_executor = ThreadPoolExecutor(max_workers=STRIPE_WORKERS, thread_name_prefix="stripe")
+_client = None
+_client_lock = threading.Lock()
+_jobs = {}  # checkout_id -> Future, until its outcome has been polled
+_jobs_lock = threading.Lock()
+
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            if not STRIPE_SECRET_KEY:
+                raise RuntimeError("Missing STRIPE_SECRET_KEY env var.")
+            import stripe  # here rather than at the top: it takes longer to import than the rest of the app
+            pool = HTTPAdapter(pool_connections=1, pool_maxsize=STRIPE_WORKERS)
+            http = requests.Session()
+            http.mount("https://", pool)
+            http.mount("http://", pool)
+            _client = stripe.StripeClient(
+                STRIPE_SECRET_KEY,
+                base_addresses={"api": STRIPE_API_BASE} if STRIPE_API_BASE else {},
+                max_network_retries=STRIPE_MAX_RETRIES,
+                http_client=stripe.RequestsClient(timeout=(STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT),
+                                                  session=http))
+        return _client
+
+
+def idempotency_key(checkout_id):
+    return f"checkout-session-{checkout_id}"
+
+
+def checkout_session_params(items, checkout_id, currency="USD"):
+    """items: list of dicts with keys: name, unit_amount (in cents), quantity"""
+    return {
+        "payment_method_types": ["card"],
+        "line_items": [{"price_data": {"currency": currency.lower(),
+                                       "product_data": {"name": it["name"]},
+                                       "unit_amount": int(it["unit_amount"])},
+                        "quantity": int(it.get("quantity", 1))} for it in items],
+        "mode": "payment",
+        "metadata": {"checkout_id": checkout_id},
+        "success_url": f"{APP_URL}?checkout=success",
+        "cancel_url": f"{APP_URL}?checkout=cancel",
+    }
+
+
+def create_checkout_session(checkout_id, items, currency="USD"):
+    """
+    Create the Stripe Checkout Session for a checkout (or get the one already
+    created for it back) and save its id and URL on the Checkout. Blocks for
+    up to the timeouts times the attempts; raises stripe.StripeError.
+    """
+    session = _get_client().checkout.sessions.create(
+        checkout_session_params(items, checkout_id, currency),
+        {"idempotency_key": idempotency_key(checkout_id)})
+    with session_scope() as db:
+        # a checkout already PAID keeps the payment data the webhook stored
+        (db.query(Checkout).filter(Checkout.id == checkout_id, Checkout.status == "PENDING")
+         .update({Checkout.payment_metadata: {"stripe_session_id": session.id, "url": session.url}},
+                 synchronize_session=False))
+        db.commit()
+    return {"id": session.id, "url": session.url}
+
+
+def start_checkout_session(checkout_id, items, currency="USD"):
+    """Create the checkout's Stripe session in the background; no-op while one is already being created."""
+    with _jobs_lock:
+        if checkout_id not in _jobs:
+            _jobs[checkout_id] = _executor.submit(create_checkout_session, checkout_id, items, currency)
+
+
+def checkout_session_status(checkout_id):
+    """("pending", None), ("ready", payment URL) or ("failed", message) for a started checkout."""
+    with _jobs_lock:
+        job = _jobs.get(checkout_id)
+        if job is not None and job.done():
+            del _jobs[checkout_id]
+    if job is None:
+        # created earlier, or by another process
+        with session_scope() as db:
+            meta = db.query(Checkout.payment_metadata).filter(Checkout.id == checkout_id).scalar() or {}
+        if meta.get("url"):
+            return "ready", meta["url"]
+        return "failed", "No payment session was started for this checkout."
+    if not job.done():
+        return "pending", None
+    try:
+        return "ready", job.result()["url"]
+    except Exception as e:
+        from stripe import APIConnectionError  # already loaded by the job, unless the key was missing
+        if isinstance(e, APIConnectionError):
+            log.warning("checkout session for %s: Stripe unreachable: %s", checkout_id, e)
+            return "failed", "Stripe did not respond in time. Please try again."
+        log.warning("checkout session for %s failed: %s", checkout_id, e)
+        return "failed", getattr(e, "user_message", None) or str(e)
@@ -0,0 +1,31 @@
+"""
+Admin decisions on vendor applications. Any number of applications are
+approved or rejected with one UPDATE. Only PENDING ones change, so a second
+click or a stale page can't flip a vendor that has already been decided.
+"""
+from sqlalchemy import update
+
+from models import Vendor
+from page_cache import ADMIN, CATALOG, invalidate_on_commit, user_scope
+
+REVIEW_DECISIONS = ("APPROVED", "REJECTED")
+
+
+def review_vendors(db, vendor_ids, decision):
+    """Set decision on those of vendor_ids still PENDING, in one UPDATE, and commit. Returns how many changed."""
+    if decision not in REVIEW_DECISIONS:
+        raise ValueError(f"decision must be one of {REVIEW_DECISIONS}, not {decision!r}")
+    vendor_ids = list(vendor_ids)
+    if not vendor_ids:
+        return 0
+    pending = (Vendor.id.in_(vendor_ids), Vendor.status == "PENDING")
+    stmt = update(Vendor).where(*pending).values(status=decision).execution_options(synchronize_session=False)
+    if db.get_bind().dialect.update_returning:
+        owners = db.execute(stmt.returning(Vendor.owner_id)).scalars().all()
+    else:
+        owners = [owner for owner, in db.query(Vendor.owner_id).filter(*pending).with_for_update().all()]
+        db.execute(stmt)
+    # owners' profiles carry their vendor status; approved vendors show up in the catalog
+    invalidate_on_commit(db, ADMIN, CATALOG, *(user_scope(owner) for owner in owners))
+    db.commit()
+    return len(owners)
@@ -0,0 +1,147 @@
+"""
+Vendor dashboard totals, kept as small summary tables (see models.py:
+VendorSummary, VendorDailySales, VendorProductSales, VendorBalance) instead
+of being recomputed from orders on every page view.
+
+The record_* functions apply one state transition as atomic increments
+(INSERT ... ON CONFLICT DO UPDATE SET col = col + delta) inside the caller's
+transaction, so totals commit or roll back together with the order/payout
+change that caused them. rebuild_vendor_stats() recomputes everything from
+orders and payouts, for backfill or repair.
+
+Revenue is bucketed by the UTC day the order was placed, in the order's
+currency. Paid orders whose stock ran out (fulfillment OVERSOLD) can't be
+shipped, so they are counted in orders_oversold instead of
+pending_fulfillment.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from db import increment
+from page_cache import ADMIN, invalidate_on_commit, vendor_scope
+from models import Order, Payout, VendorSummary, VendorDailySales, VendorProductSales, VendorBalance
+
+# an order counts as sold once it is in one of these states, and as shipped in the last two
+SOLD_STATUSES = ("PAID", "FULFILLING", "SHIPPED", "DELIVERED")
+SHIPPED_STATUSES = ("SHIPPED", "DELIVERED")
+VENDOR_STATS_DAYS = 30
+
+
+def order_units(order):
+    """{product_id: qty} for an order's items."""
+    units = {}
+    for it in order.items or []:
+        pid = it.get("product_id")
+        if pid:
+            units[pid] = units.get(pid, 0) + int(it.get("qty", 1))
+    return units
+
+
+def record_order_paid(db, order):
+    """Order moved to PAID, its fulfillment status already set."""
+    if not order.vendor_id:
+        return
+    day = (order.created_at or datetime.utcnow()).date()
+    waiting = "orders_oversold" if (order.fulfillment or {}).get("status") == "OVERSOLD" else "pending_fulfillment"
+    increment(db, VendorSummary, {"vendor_id": order.vendor_id}, {"orders_paid": 1, waiting: 1})
+    increment(db, VendorDailySales, {"vendor_id": order.vendor_id, "day": day, "currency": order.currency},
+               {"revenue_cents": order.total_cents or 0, "orders": 1})
+    for pid, qty in order_units(order).items():
+        increment(db, VendorProductSales, {"vendor_id": order.vendor_id, "product_id": pid}, {"units": qty})
+
+
+def record_order_shipped(db, vendor_id):
+    """Order left PAID for SHIPPED."""
+    if vendor_id:
+        increment(db, VendorSummary, {"vendor_id": vendor_id}, {"pending_fulfillment": -1})
+
+
+def record_payout_balance(db, vendor_id, currency, delta_cents):
+    """A PENDING payout was created (+amount) or settled/cancelled (-amount)."""
+    if vendor_id:
+        increment(db, VendorBalance, {"vendor_id": vendor_id, "currency": currency},
+                   {"pending_payout_cents": delta_cents})
+
+
+def mark_order_shipped(db, order_id, vendor_id, tracking="TBD"):
+    """
+    PAID -> SHIPPED for one of the vendor's orders. The conditional UPDATE
+    makes a double click count once. Oversold orders don't ship. Returns
+    False if nothing changed.
+    """
+    fulfillment = (db.query(Order.fulfillment)
+                   .filter(Order.id == order_id, Order.vendor_id == vendor_id).scalar())
+    if (fulfillment or {}).get("status") == "OVERSOLD":
+        return False
+    shipped = (db.query(Order)
+               .filter(Order.id == order_id, Order.vendor_id == vendor_id, Order.status == "PAID")
+               .update({Order.status: "SHIPPED",
+                        Order.fulfillment: {"status": "SHIPPED", "tracking": tracking, "notes": "Shipped by vendor"}},
+                       synchronize_session="fetch"))
+    if not shipped:
+        db.rollback()
+        return False
+    record_order_shipped(db, vendor_id)
+    invalidate_on_commit(db, ADMIN, vendor_scope(vendor_id))
+    db.commit()
+    return True
+
+
+def vendor_summary(db, vendor_id, days=VENDOR_STATS_DAYS, top_products=10):
+    """Everything the dashboard header shows, from the summary tables only."""
+    summary = db.get(VendorSummary, vendor_id)
+    since = (datetime.utcnow() - timedelta(days=days - 1)).date()
+    daily = (db.query(VendorDailySales)
+             .filter(VendorDailySales.vendor_id == vendor_id, VendorDailySales.day >= since)
+             .order_by(VendorDailySales.day).all())
+    products = (db.query(VendorProductSales)
+                .filter(VendorProductSales.vendor_id == vendor_id)
+                .order_by(VendorProductSales.units.desc()).limit(top_products).all())
+    balances = db.query(VendorBalance).filter(VendorBalance.vendor_id == vendor_id).all()
+    return {
+        "orders_paid": summary.orders_paid if summary else 0,
+        "pending_fulfillment": summary.pending_fulfillment if summary else 0,
+        "orders_oversold": summary.orders_oversold if summary else 0,
+        "revenue_by_day": [(d.day, d.currency, d.revenue_cents, d.orders) for d in daily],
+        "units_by_product": [(p.product_id, p.units) for p in products],
+        "payout_balance": {b.currency: b.pending_payout_cents for b in balances if b.pending_payout_cents},
+    }
+
+
+def rebuild_vendor_stats(db, vendor_id=None, batch_size=2000):
+    """Recompute the summary tables from orders and payouts. Commits."""
+    for model in (VendorSummary, VendorDailySales, VendorProductSales, VendorBalance):
+        q = db.query(model)
+        if vendor_id:
+            q = q.filter(model.vendor_id == vendor_id)
+        q.delete(synchronize_session=False)
+
+    last_id = ""
+    while True:
+        q = db.query(Order).filter(Order.status.in_(SOLD_STATUSES), Order.id > last_id)
+        if vendor_id:
+            q = q.filter(Order.vendor_id == vendor_id)
+        batch = q.order_by(Order.id).limit(batch_size).all()
+        if not batch:
+            break
+        for o in batch:
+            record_order_paid(db, o)
+            if o.status in SHIPPED_STATUSES:
+                record_order_shipped(db, o.vendor_id)
+        last_id = batch[-1].id
+        db.expunge_all()
+
+    q = (db.query(Payout.vendor_id, Payout.currency, func.sum(Payout.amount_cents))
+         .filter(Payout.status == "PENDING"))
+    if vendor_id:
+        q = q.filter(Payout.vendor_id == vendor_id)
+    for vid, currency, amount in q.group_by(Payout.vendor_id, Payout.currency):
+        record_payout_balance(db, vid, currency, amount or 0)
+    db.commit()
+
+
+if __name__ == "__main__":
+    from db import session_scope
+    with session_scope() as db:
+        rebuild_vendor_stats(db)
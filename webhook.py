@@ -0,0 +1,311 @@
+"""
+Stripe webhook server. Importable on its own (no Streamlit), so it can run
+under gunicorn: gunicorn -c gunicorn.conf.py webhook:app
+"""
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import Flask, Response, request, jsonify
+from sqlalchemy import and_, or_, case, update, bindparam, text
+from sqlalchemy import exc as sa_exc
+
+from config import STRIPE_WEBHOOK_SECRET
+from db import session_scope
+from cart import clear_cart
+from images import images_bp
+from instrumentation import METRICS_CONTENT_TYPE, render_metrics, span, traced
+from models import Checkout, Order, Product, WebhookEvent
+from page_cache import ADMIN, CATALOG, invalidate_on_commit, vendor_scope
+from payouts import create_payout
+from vendor_stats import order_units, record_order_paid
+
+# ------------------------------
+# Stripe event handling
+# ------------------------------
+webhook_log = logging.getLogger("webhook")
+
+def decrement_stock(db, quantities):
+    """
+    Take {product_id: qty} out of stock with conditional UPDATEs
+    (... SET stock = stock - qty WHERE id = ? AND stock >= qty), never reading
+    stock into Python first. Returns the product ids that did not have enough
+    stock; those rows are left untouched. Does not commit.
+    """
+    if not quantities:
+        return []
+    products = Product.__table__
+    if db.get_bind().dialect.update_returning:
+        # one statement for the whole order, RETURNING tells us which rows took the decrement
+        qty = case(quantities, value=products.c.id)
+        stmt = (update(products)
+                .where(products.c.id.in_(list(quantities)), products.c.stock >= qty)
+                .values(stock=products.c.stock - qty)
+                .returning(products.c.id))
+        done = {row[0] for row in db.execute(stmt)}
+    else:
+        stmt = (update(products)
+                .where(products.c.id == bindparam("pid"), products.c.stock >= bindparam("qty"))
+                .values(stock=products.c.stock - bindparam("qty")))
+        done = {pid for pid, q in quantities.items()
+                if db.execute(stmt, {"pid": pid, "qty": q}).rowcount}
+    return [pid for pid in quantities if pid not in done]
+
+def _settle_paid_orders(db, orders):
+    """
+    Stock, fulfillment, payout and vendor totals for orders that were just
+    claimed as PAID. Stock for all of them is decremented in one statement.
+    Does not commit.
+    """
+    units = {o.id: order_units(o) for o in orders}
+    quantities = {}
+    for order_qty in units.values():
+        for pid, qty in order_qty.items():
+            quantities[pid] = quantities.get(pid, 0) + qty
+    oversold = set(decrement_stock(db, quantities))
+    invalidate_on_commit(db, CATALOG, ADMIN, *(vendor_scope(o.vendor_id) for o in orders if o.vendor_id))
+    for order in orders:
+        mine = [pid for pid in units[order.id] if pid in oversold]
+        if mine:
+            webhook_log.warning("order %s oversold products %s", order.id, mine)
+            order.fulfillment = {"status": "OVERSOLD", "oversold": mine,
+                                 "notes": "Paid, but stock ran out for some items"}
+        else:
+            order.fulfillment = {"status":"QUEUED", "notes":"Ready for vendor fulfillment"}
+        create_payout(db, order)
+        record_order_paid(db, order)
+
+def finalize_paid_checkout(db, checkout_id, payment_data):
+    """
+    Mark the checkout and every per-vendor order in it PAID, then take the
+    items out of stock and queue one payout per vendor, all in a single
+    transaction. Returns False when the checkout is unknown or was already
+    finalized (duplicate or concurrent delivery).
+    """
+    claimed = (db.query(Checkout)
+               .filter(Checkout.id == checkout_id, Checkout.status != "PAID")
+               .update({Checkout.status: "PAID", Checkout.payment_metadata: payment_data},
+                       synchronize_session=False))
+    if not claimed:
+        db.rollback()
+        return False
+    orders = db.query(Order).filter(Order.checkout_id == checkout_id, Order.status == "PENDING").all()
+    # bought: drop those lines from the cart (anything added since stays)
+    user_id = db.query(Checkout.user_id).filter(Checkout.id == checkout_id).scalar()
+    if user_id:
+        clear_cart(db, user_id, {pid for o in orders for pid in order_units(o)})
+    (db.query(Order)
+     .filter(Order.id.in_([o.id for o in orders]), Order.status == "PENDING")
+     .update({Order.status: "PAID"}, synchronize_session="fetch"))
+    _settle_paid_orders(db, orders)
+    db.commit()
+    return True
+
+def finalize_paid_order(db, order_id, payment_data):
+    """
+    Single-order version of finalize_paid_checkout(), for Stripe sessions
+    created before checkouts were split per vendor.
+    """
+    claimed = (db.query(Order)
+               .filter(Order.id == order_id, Order.status != "PAID")
+               .update({Order.status: "PAID", Order.payment_metadata: payment_data},
+                       synchronize_session=False))
+    if not claimed:
+        db.rollback()
+        return False
+    _settle_paid_orders(db, [db.get(Order, order_id)])
+    db.commit()
+    return True
+
+def handle_stripe_event(db, event):
+    """Apply one verified Stripe event (a plain dict). Safe to run again for the same event."""
+    etype = event["type"]
+    data = event["data"]["object"]
+    if etype == "checkout.session.completed":
+        metadata = data.get("metadata") or {}
+        if metadata.get("checkout_id"):
+            finalize_paid_checkout(db, metadata["checkout_id"], dict(data))
+        elif metadata.get("order_id"):
+            finalize_paid_order(db, metadata["order_id"], dict(data))
+    elif etype == "payment_intent.payment_failed":
+        # handle failed payment if needed
+        pass
+
+# ------------------------------
+# Webhook inbox workers
+# ------------------------------
+# The endpoint only stores verified events in webhook_events; these threads
+# drain that table. A failed event is retried with exponential backoff and
+# parked as DEAD after WEBHOOK_MAX_ATTEMPTS. A PROCESSING row whose lease has
+# expired (worker died mid-event) is picked up again.
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "5"))  # seconds
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "3600"))
+WEBHOOK_LEASE_SECONDS = int(os.getenv("WEBHOOK_LEASE_SECONDS", "300"))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", "2"))
+
+_webhook_wakeup = threading.Event()
+_webhook_stop = threading.Event()
+_webhook_threads = []
+
+def _claimable(now):
+    return or_(
+        and_(WebhookEvent.status == "PENDING", WebhookEvent.next_attempt_at <= now),
+        and_(WebhookEvent.status == "PROCESSING",
+             WebhookEvent.locked_at < now - timedelta(seconds=WEBHOOK_LEASE_SECONDS)),
+    )
+
+def claim_webhook_event(db):
+    """Atomically move one due event to PROCESSING and return it (None when idle)."""
+    now = datetime.utcnow()
+    candidates = (db.query(WebhookEvent.id).filter(_claimable(now))
+                  .order_by(WebhookEvent.next_attempt_at).limit(WEBHOOK_WORKERS).all())
+    for (eid,) in candidates:
+        # conditional UPDATE: only one worker wins a given row
+        claimed = (db.query(WebhookEvent)
+                   .filter(WebhookEvent.id == eid, _claimable(now))
+                   .update({WebhookEvent.status: "PROCESSING", WebhookEvent.locked_at: now,
+                            WebhookEvent.attempts: WebhookEvent.attempts + 1},
+                           synchronize_session=False))
+        db.commit()
+        if claimed:
+            return db.get(WebhookEvent, eid)
+    return None
+
+def process_webhook_event(db, ev):
+    eid = ev.id
+    try:
+        handle_stripe_event(db, ev.payload)
+    except Exception as e:
+        db.rollback()
+        webhook_log.exception("webhook event %s failed", eid)
+        ev = db.get(WebhookEvent, eid)
+        ev.last_error = f"{type(e).__name__}: {e}"[:2000]
+        if ev.attempts >= WEBHOOK_MAX_ATTEMPTS:
+            ev.status = "DEAD"
+        else:
+            delay = min(WEBHOOK_BACKOFF_MAX, WEBHOOK_BACKOFF_BASE * 2 ** (ev.attempts - 1))
+            ev.status = "PENDING"
+            ev.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+    else:
+        ev = db.get(WebhookEvent, eid)
+        ev.status = "DONE"
+        ev.processed_at = datetime.utcnow()
+    ev.locked_at = None
+    db.commit()
+
+def _webhook_worker_loop():
+    while not _webhook_stop.is_set():
+        try:
+            with session_scope() as db:
+                ev = claim_webhook_event(db)
+                if ev is not None:
+                    with span("webhook_event"):
+                        process_webhook_event(db, ev)
+                    continue
+        except Exception:
+            webhook_log.exception("webhook worker error")
+        _webhook_wakeup.wait(WEBHOOK_POLL_INTERVAL)
+        _webhook_wakeup.clear()
+
+def start_webhook_workers():
+    if _webhook_threads:
+        return
+    _webhook_stop.clear()
+    for i in range(WEBHOOK_WORKERS):
+        t = threading.Thread(target=_webhook_worker_loop, name=f"webhook-worker-{i}", daemon=True)
+        t.start()
+        _webhook_threads.append(t)
+
+def stop_webhook_workers(timeout=10):
+    _webhook_stop.set()
+    _webhook_wakeup.set()
+    for t in _webhook_threads:
+        t.join(timeout)
+    _webhook_threads.clear()
+
+def requeue_dead_webhook_events(db):
+    invalidate_on_commit(db, ADMIN)
+    n = (db.query(WebhookEvent).filter_by(status="DEAD")
+         .update({WebhookEvent.status: "PENDING", WebhookEvent.attempts: 0,
+                  WebhookEvent.next_attempt_at: datetime.utcnow()}, synchronize_session=False))
+    db.commit()
+    _webhook_wakeup.set()
+    return n
+
+# ------------------------------
+# Embedded Flask webhook server
+# ------------------------------
+app = Flask("webhook_server")
+app.register_blueprint(images_bp)  # product images and thumbnails, see images.py
+
+@app.route("/webhook", methods=["POST"])
+@traced("webhook")
+def stripe_webhook():
+    payload = request.data
+    sig_header = request.headers.get("Stripe-Signature")
+    if not STRIPE_WEBHOOK_SECRET:
+        return jsonify({"error":"STRIPE_WEBHOOK_SECRET not configured"}), 400
+    import stripe  # on first use: it is by far the slowest import of this process
+    try:
+        event = stripe.Webhook.construct_event(payload, sig_header, STRIPE_WEBHOOK_SECRET)
+    except ValueError:
+        return jsonify({"error":"Invalid payload"}), 400
+    except stripe.error.SignatureVerificationError:
+        return jsonify({"error":"Invalid signature"}), 400
+
+    # persist and acknowledge; the inbox workers do the actual work
+    try:
+        with session_scope() as db:
+            db.add(WebhookEvent(id=event["id"], type=event["type"], payload=json.loads(payload)))
+            db.commit()
+    except sa_exc.IntegrityError:
+        # Stripe retry of an event we already have
+        return jsonify({"received": True, "duplicate": True}), 200
+    _webhook_wakeup.set()
+    return jsonify({"received": True}), 200
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # liveness: the process is up and serving requests
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # readiness: accepting traffic needs the DB (events are persisted before the 200)
+    if _webhook_stop.is_set():
+        return jsonify({"status": "shutting down"}), 503
+    try:
+        with session_scope() as db:
+            db.execute(text("SELECT 1"))
+    except Exception:
+        webhook_log.exception("readiness check failed")
+        return jsonify({"status": "database unavailable"}), 503
+    return jsonify({"status": "ready", "inbox_workers": sum(t.is_alive() for t in _webhook_threads)}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus scrape: spans, query latency, pool and page cache (see instrumentation.py)
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+def run_webhook_server():
+    start_webhook_workers()
+    # Development server (Flask threaded mode on port 5000); production runs gunicorn
+    app.run(port=5000, debug=False, use_reloader=False)
+
+_server_thread_lock = threading.Lock()
+_server_thread = None
+
+def start_webhook_thread_once():
+    # Streamlit re-executes app.py on every rerun; this module is imported once per process
+    global _server_thread
+    with _server_thread_lock:
+        if _server_thread is None:
+            _server_thread = threading.Thread(target=run_webhook_server, name="webhook-server", daemon=True)
+            _server_thread.start()
+
+if __name__ == "__main__":
+    run_webhook_server()